@@ -1,10 +1,13 @@
 import json
 import networkx as nx
+import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
 import re
 import sys 
 import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from src.modules.preprocessor.graph_store import save_graph_json
 def load_json_data(filepath):
     with open(filepath, 'r', encoding='utf-8') as f:
         return json.load(f)
@@ -14,16 +17,17 @@ def preprocess_abstract(abstract):
         return ""
     return re.sub(r'\s+', ' ', abstract.strip())
 
+EXPERIMENT_KEYWORDS = [
+    r'\bexperiment(s|al)?\b', r'\bevaluation\b', r'\bresults?\b',
+    r'\btest(s|ing)?\b', r'\bvalidat(e|ion)\b', r'\bperformanc(e|es)\b',
+    r'\bimplementation\b', r'\bdemonstrat(e|ion|ed)\b'
+]
+EXPERIMENT_PATTERN = re.compile('|'.join(EXPERIMENT_KEYWORDS))
+
 def detect_experiment_mention(abstract):
-    experiment_keywords = [
-        r'\bexperiment(s|al)?\b', r'\bevaluation\b', r'\bresults?\b',
-        r'\btest(s|ing)?\b', r'\bvalidat(e|ion)\b', r'\bperformanc(e|es)\b',
-        r'\bimplementation\b', r'\bdemonstrat(e|ion|ed)\b'
-    ]
     if not abstract:
         return False
-    pattern = '|'.join(experiment_keywords)
-    return bool(re.search(pattern, abstract.lower()))
+    return bool(EXPERIMENT_PATTERN.search(abstract.lower()))
 
 def create_paper_graph(seleceted_papers_path):
     # cited_papers = load_json_data(cited_papers_path)
@@ -41,7 +45,11 @@ def create_paper_graph(seleceted_papers_path):
     paper_ids = list(valid_papers.keys())
     abstracts = [valid_papers[pid] for pid in paper_ids]
     tfidf = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = tfidf.fit_transform(abstracts)
+    # rows are L2-normalized, so the cosine similarity of two papers is the dot product of their rows
+    tfidf_matrix = normalize(tfidf.fit_transform(abstracts), norm='l2', copy=False).tocsr()
+    id_to_row = {pid: row for row, pid in enumerate(paper_ids)}
+    # experiment bonus depends only on the cited paper, so detect it once per paper
+    experiment_bonus = np.array([0.2 if detect_experiment_mention(abstract) else 0.0 for abstract in abstracts])
     G = nx.DiGraph()
     for paper in survey_papers:
         pid = paper.get('id', None)
@@ -62,24 +70,33 @@ def create_paper_graph(seleceted_papers_path):
             keywords=paper.get('keywords', []),
             # is_new_direction = paper.get('is_new_direction', '0')
         )
+    # collect every (paper, cited) pair first, then weight them all in one sparse pass
+    edge_pairs = []
+    src_rows = []
+    dst_rows = []
     for paper in survey_papers:
         paper_id = paper['id']
-        if 'cited_by' not in paper:
+        if 'cited_by' not in paper or paper_id not in id_to_row:
             continue
         for cited in paper['cited_by']:
-            if cited['paperId'] is None:
-                continue
             cited_id = cited['paperId']
-            if paper_id not in valid_papers or cited_id not in valid_papers:
-                continue
-            try:
-                idx1 = paper_ids.index(paper_id)
-                idx2 = paper_ids.index(cited_id)
-                similarity = cosine_similarity(tfidf_matrix[idx1:idx1+1], tfidf_matrix[idx2:idx2+1])[0][0]
-                experiment_bonus = 0.2 if detect_experiment_mention(valid_papers[cited_id]) else 0
-                G.add_edge(paper_id, cited_id, weight=float(similarity + experiment_bonus))
-            except ValueError:
+            if cited_id is None or cited_id not in id_to_row:
                 continue
+            edge_pairs.append((paper_id, cited_id))
+            src_rows.append(id_to_row[paper_id])
+            dst_rows.append(id_to_row[cited_id])
+    if edge_pairs:
+        src_rows = np.asarray(src_rows)
+        dst_rows = np.asarray(dst_rows)
+        # row-wise dot product of the normalized rows = cosine similarity per edge
+        similarities = np.asarray(
+            tfidf_matrix[src_rows].multiply(tfidf_matrix[dst_rows]).sum(axis=1)
+        ).ravel()
+        weights = similarities + experiment_bonus[dst_rows]
+        G.add_edges_from(
+            (paper_id, cited_id, {'weight': float(weight)})
+            for (paper_id, cited_id), weight in zip(edge_pairs, weights)
+        )
     return G
 
 # def save_graph(G, output_path):
@@ -172,8 +189,8 @@ def save_graph(G, output_path):
         ]
     }
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(graph_data, f, ensure_ascii=False, indent=2)
+    # JSON plus its memory-mapped store, which the later stages load
+    save_graph_json(graph_data, output_path, ensure_ascii=False, indent=2)
     print(f"Graph Statistics:")
     print(f"Number of nodes: {G.number_of_nodes()}")
     print(f"Number of edges: {G.number_of_edges()}")
@@ -1,17 +1,25 @@
 import sys 
 import os 
-# sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv, find_dotenv
 from pathlib import Path
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+from src.modules.preprocessor.text_store import TextStore
+from src.models.LLM import http_client
+from src.models.LLM.rate_limiter import RateScheduler, wait_unless_rate_limited
+from src.configs.config import settings
+from src.modules.preprocessor.graph_store import GraphStore, save_graph_json
 
 load_dotenv(Path(".env"))
-SEMANTIC_SCHOLAR_API_KEY = os.getenv("SEMANTIC_SCHOLAR_API_KEY")
-if not SEMANTIC_SCHOLAR_API_KEY:
-    raise ValueError("SEMANTIC_SCHOLAR_API_KEY not found in environment variables")
 SEMANTIC_SCHOLAR_BATCH_URL = "https://api.semanticscholar.org/graph/v1/paper/batch"
 FIELDS = "paperId,title,authors,year,citationCount,abstract,url,venue,publicationDate,externalIds,openAccessPdf"
+# only what get_pdf_link needs; paperId is the merge key
+LINK_FIELDS = "paperId,externalIds,openAccessPdf"
+BATCH_SIZE = 500  # max ids per batch request
+BATCH_WORKERS = 4  # batch requests in flight, paced by the semantic_scholar rate budget
 PRESTIGIOUS_VENUES = ['nature', 'science', 'cell', 'neurips', 'icml', 'iclr', 'aaai', 'ijcai', 'acl', 'emnlp', 'cvf', 'cvpr']
 def load_cited_by_paper_ids(json_path):
     main_paper_id = load_main_paper_id(json_path)
@@ -29,9 +37,8 @@ def load_cited_by_paper_ids(json_path):
     return list({p['paperId'] for p in cited_by if 'paperId' in p and p['paperId'] not in main_paper_id})
 
 def load_main_paper_id(json_path):
-    with open(json_path, 'r') as f:
-        G = json.load(f)
-        papers = G['nodes']
+    G = GraphStore.open(json_path).to_json_data()
+    papers = G['nodes']
     if isinstance(papers, list) and len(papers) > 0:
         return papers, G, list({p['id'] for p in papers if 'id' in p})
     return None
@@ -41,79 +48,66 @@ def load_all_paper_id(json_path):
     if isinstance(papers, list) and len(papers) > 0:
         return papers, list({p['id'] for p in papers if 'id' in p})
     return None
-def fetch_batch_info(paper_ids):
-    if not paper_ids:
-        print("No paper IDs found in cited_by.")
-        return []
-    payload = {
-        "ids": paper_ids
-    }
-    params = {
-        "fields": FIELDS
-    }
-    response = requests.post(SEMANTIC_SCHOLAR_BATCH_URL, json=payload, params=params, timeout=60)
-    if response.status_code == 200:
-        return response.json().get('data', [])
-    else:
-        print(f"Batch API error: {response.status_code}")
-        print(response.text)
-        return []
 
-
-def fetch_batch_info_batched(paper_ids, batch_size=500):
-    all_results = []
-    for i in range(0, len(paper_ids), batch_size):
-        batch = paper_ids[i:i+batch_size]
-        print(f"Fetching batch {i//batch_size+1} ({len(batch)} papers)...")
-        # Use the working query format for Semantic Scholar
-        headers = {"x-api-key": SEMANTIC_SCHOLAR_API_KEY}
-        response = requests.post(
+@retry(
+    stop=stop_after_attempt(6),
+    wait=wait_unless_rate_limited(wait_exponential(min=1, max=60)),
+    retry=retry_if_exception_type(requests.RequestException),
+    reraise=True,
+)
+def _post_batch(batch, fields):
+    """POST one batch of ids; 429 / 5xx / network errors are retried (429 waits on the scheduler's cooldown)."""
+    headers = {"x-api-key": settings.SEMANTIC_SCHOLAR_API_KEY}
+    with RateScheduler.default().slot("semantic_scholar") as slot:
+        # shared keep-alive pool of the LLM clients
+        response = http_client.post(
             SEMANTIC_SCHOLAR_BATCH_URL,
-            params={'fields': FIELDS},
+            params={'fields': fields},
             json={"ids": batch},
             timeout=120, 
             headers=headers
         )
+        slot.observe(response.status_code, response.headers)
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+    return response
 
-        if response.status_code == 200:
-            resp_json = response.json()
-            if isinstance(resp_json, dict) and 'data' in resp_json:
-                all_results.extend(resp_json['data'])
-            elif isinstance(resp_json, list):
-                all_results.extend(resp_json)
-            else:
-                print("Unexpected response format.")
-        else:
-            print(f"Batch API error: {response.status_code}")
-            print(response.text)
-    return all_results
+def _fetch_batch(index, batch, fields):
+    print(f"Fetching batch {index+1} ({len(batch)} papers)...")
+    try:
+        response = _post_batch(batch, fields)
+    except requests.RequestException as e:
+        print(f"Batch API error: {e}")
+        return []
+    if response.status_code == 200:
+        resp_json = response.json()
+        if isinstance(resp_json, dict) and 'data' in resp_json:
+            return resp_json['data']
+        elif isinstance(resp_json, list):
+            return resp_json
+        print("Unexpected response format.")
+    else:
+        print(f"Batch API error: {response.status_code}")
+        print(response.text)
+    return []
 
+def fetch_batch_info_batched(paper_ids, batch_size=BATCH_SIZE, fields=FIELDS, max_workers=BATCH_WORKERS):
+    """
+    Fetch paper info for `paper_ids` in chunks of `batch_size`, several chunks at a time.
+    Results keep the order of the chunks; ids the API does not know come back as None.
+    """
+    batches = [paper_ids[i:i+batch_size] for i in range(0, len(paper_ids), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = executor.map(lambda item: _fetch_batch(item[0], item[1], fields), enumerate(batches))
+        return [info for batch_result in results for info in batch_result]
 
-def extract_intro_method(text):
-    """Extract introduction and methodology sections from text."""
-    import re
-    # Lowercase for section matching
-    text_lower = text.lower()
-    # Find introduction
-    intro_start = text_lower.find('introduction')
-    method_start = text_lower.find('methodology')
-    method_alt_start = text_lower.find('methods')
-    # Find next section after introduction
-    next_section = re.search(r'\n[a-z ]{3,20}\n', text_lower[intro_start+12:])
-    intro_end = intro_start + 12 + next_section.start() if next_section else None
-    # Find next section after methodology/methods
-    if method_start != -1:
-        method_end_search = re.search(r'\n[a-z ]{3,20}\n', text_lower[method_start+10:])
-        method_end = method_start + 10 + method_end_search.start() if method_end_search else None
-        method_section = text[method_start:method_end] if method_end else text[method_start:]
-    elif method_alt_start != -1:
-        method_end_search = re.search(r'\n[a-z ]{3,20}\n', text_lower[method_alt_start+7:])
-        method_end = method_alt_start + 7 + method_end_search.start() if method_end_search else None
-        method_section = text[method_alt_start:method_end] if method_end else text[method_alt_start:]
-    else:
-        method_section = ''
-    intro_section = text[intro_start:intro_end] if intro_start != -1 and intro_end else text[intro_start:] if intro_start != -1 else ''
-    return intro_section.strip() + '\n' + method_section.strip()
+def extract_intro_method(pdf_path, extract, text_store=None):
+    """
+    Introduction and methodology sections of a PDF, read from the TextStore.
+    `extract(path) -> str` is only called when the PDF is not in the store yet.
+    """
+    record = (text_store or TextStore()).get_or_extract(pdf_path, extract)
+    return record.section('introduction').strip() + '\n' + record.section('method').strip()
 
 def get_pdf_link(paper):
     pdf_url = None
@@ -128,6 +122,10 @@ def get_pdf_link(paper):
     doi = external_ids.get('DOI') if isinstance(external_ids, dict) else None
     if doi and not pdf_url:
         pdf_url = f"https://doi.org/{doi}"
+    # Fall back to the open-access PDF reported by Semantic Scholar
+    open_access_pdf = paper.get('openAccessPdf')
+    if not pdf_url and isinstance(open_access_pdf, dict):
+        pdf_url = open_access_pdf.get('url') or None
     return pdf_url
 
 def main():
@@ -137,6 +135,7 @@ def main():
         return
     
     query = sys.argv[1]
+    settings.require("SEMANTIC_SCHOLAR_API_KEY")  # fail before any work if the key is missing
     json_path = f"paper_data/{query.replace(' ', '_').replace(':', '')}/info/paper_citation_graph.json"
     all_paper_path = f"paper_data/{query.replace(' ', '_').replace(':', '')}/info/crawl_papers.json"
 
@@ -148,17 +147,16 @@ def main():
         print("Papers already have externalIds, skipping fetch.")
     else:
         print("Fetching batch info for main papers...")
-        batch_info = fetch_batch_info_batched(main_paper_ids)
+        batch_info = fetch_batch_info_batched(main_paper_ids, fields=LINK_FIELDS)
         print(f"Fetched info for {len(batch_info)} main papers.")
+        info_by_id = {info.get('paperId'): info for info in batch_info if info}
         for paper in selected_papers:
-            pid = paper.get('id')
-            for info in batch_info:
-                if info.get('paperId') == pid:
-                    paper['externalIds'] = info.get('externalIds', {})
-                    paper['pdf_link'] = get_pdf_link(info)
+            info = info_by_id.get(paper.get('id'))
+            if info is not None:
+                paper['externalIds'] = info.get('externalIds', {})
+                paper['pdf_link'] = get_pdf_link(info)
         G['nodes'] = selected_papers
-        with open(json_path, 'w') as f:
-            json.dump(G, f, indent=2)
+        save_graph_json(G, json_path)
     
     all_papers = load_all_paper_id(all_paper_path)
     print(f"Found {len(all_papers)} crawl paper IDs.")
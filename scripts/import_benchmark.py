@@ -0,0 +1,118 @@
+"""
+Cold-start benchmark for the pipeline entry scripts (the steps of run.sh).
+
+Each script is loaded in a fresh interpreter without running its __main__ block and the
+wall time of the whole process is compared with the script's budget. The API keys are
+removed from the child environment, so a module that validates keys at import fails here.
+
+Usage: python scripts/import_benchmark.py [--repeat N] [--importtime] [script ...]
+Exits with 1 when a script is over budget or cannot be loaded.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+
+# seconds, median of --repeat fresh interpreters with the full requirements installed
+COLD_START_BUDGETS = {
+    "scripts/survey_crawler.py": 1.5,
+    "scripts/create_survey_graph.py": 2.5,
+    "scripts/fetch_cited_by_batch.py": 1.0,
+    "scripts/pdf_downloader.py": 1.5,
+    "writing/summarize.py": 3.0,
+    "scripts/traversal.py": 3.0,
+    "writing/writing_survey.py": 4.0,
+}
+DEFAULT_REPEAT = 3
+SLOWEST_IMPORTS = 10
+# validated on first use (src.configs.config.settings), never needed to load a script
+KEY_ENV_VARS = ("OPENAI_API_KEY", "API_KEY", "EMBED_TOKEN", "SEMANTIC_SCHOLAR_API_KEY")
+
+# same sys.path as `python <script>`, but run_name != "__main__" so main() is not called
+CHILD_CODE = (
+    "import runpy, sys\n"
+    "sys.path.insert(0, {script_dir!r})\n"
+    "runpy.run_path({path!r}, run_name='__import_benchmark__')\n"
+)
+
+
+def child_env():
+    env = dict(os.environ)
+    for name in KEY_ENV_VARS:
+        env.pop(name, None)
+    return env
+
+
+def load_script(script, extra_args=()):
+    """Load `script` in a new interpreter; returns (seconds, completed process)."""
+    path = os.path.join(BASE_DIR, script)
+    code = CHILD_CODE.format(script_dir=os.path.dirname(path), path=path)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *extra_args, "-c", code],
+        cwd=BASE_DIR, env=child_env(), capture_output=True, text=True,
+    )
+    return time.perf_counter() - start, result
+
+
+def slowest_imports(script, top=SLOWEST_IMPORTS):
+    """Top-level imports with the largest cumulative time (microseconds), from -X importtime."""
+    _, result = load_script(script, ("-X", "importtime"))
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # nested imports are indented by two extra spaces
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def benchmark(scripts, repeat=DEFAULT_REPEAT, importtime=False):
+    """Print one line per script; returns the scripts that failed or are over budget."""
+    failed = []
+    for script in scripts:
+        budget = COLD_START_BUDGETS.get(script)
+        timings = []
+        for _ in range(repeat):
+            seconds, result = load_script(script)
+            if result.returncode != 0:
+                error = (result.stderr.strip().splitlines() or ["no output"])[-1]
+                print(f"❌ {script}: failed to load: {error}")
+                failed.append(script)
+                break
+            timings.append(seconds)
+        else:
+            median = statistics.median(timings)
+            over = budget is not None and median > budget
+            budget_text = f"{budget:.2f}s" if budget is not None else "no budget"
+            print(f"{'❌' if over else '✅'} {script}: {median:.2f}s (budget {budget_text}, "
+                  f"min {min(timings):.2f}s over {repeat} runs)")
+            if over:
+                failed.append(script)
+        if importtime:
+            for cumulative, name in slowest_imports(script):
+                print(f"      {cumulative / 1e6:6.2f}s  {name}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark for the entry scripts.")
+    parser.add_argument("scripts", nargs="*", help="paths relative to the repository root (default: all budgeted scripts)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="fresh interpreters per script")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest top-level imports")
+    args = parser.parse_args()
+
+    failed = benchmark(args.scripts or list(COLD_START_BUDGETS), max(1, args.repeat), args.importtime)
+    if failed:
+        print(f"\n{len(failed)} script(s) failed or over budget: {', '.join(failed)}")
+        sys.exit(1)
+    print("\nAll scripts within their cold-start budget")
+
+
+if __name__ == "__main__":
+    main()
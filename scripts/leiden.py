@@ -1,4 +1,3 @@
-import networkx as nx
 import matplotlib.pyplot as plt
 import numpy as np
 from collections import Counter
@@ -7,103 +6,256 @@ from networkx.algorithms.community import quality
 import re
 import sys
 import os
+import random
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
 
 from numpy import sqrt 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
-import json
-import networkx as nx
 from src.models.LLM.ChatAgent import ChatAgent
+from src.modules.preprocessor.graph_store import GraphStore
 
 import igraph as ig
-import networkx as nx
-import json
 from collections import Counter
 
 import igraph as ig
-import networkx as nx
-import json
 from collections import Counter
 
+# papers kept per community (the best ones by COMMUNITY_SCORE_ATTRIBUTE) for the summary prompt
+MAX_COMMUNITY_PAPERS = 31
+COMMUNITY_SCORE_ATTRIBUTE = 'citation_count'
+
+LEIDEN_RESOLUTION = 0.5
+LEIDEN_ITERATIONS = 5
+LEIDEN_BETA = 0.01
+# sweep mode: every (resolution, seed) pair is one Leiden run on the process pool
+SWEEP_RESOLUTIONS = (0.25, 0.5, 0.75, 1.0, 1.25, 1.5)
+SWEEP_SEEDS = (0, 1, 2, 3, 4)
+# resolutions whose mean modularity is further than this share below the best one are not
+# selected: one giant community is perfectly stable but useless
+SWEEP_MODULARITY_TOLERANCE = 0.1
+MIN_COMMUNITY_SIZE = 5
+
+_sweep_graph = None
+
+
+def _init_sweep_worker(n_vertices, edges):
+    """Build the graph once per worker process instead of pickling it for every run"""
+    global _sweep_graph
+    _sweep_graph = ig.Graph(n=n_vertices, edges=edges, directed=False)
+
+
+def _leiden_run(task):
+    resolution, seed = task
+    random.seed(seed)  # igraph draws from Python's random module
+    membership = _sweep_graph.community_leiden(
+        objective_function='modularity',
+        resolution=resolution,
+        n_iterations=LEIDEN_ITERATIONS,
+        beta=LEIDEN_BETA
+    ).membership
+    return resolution, seed, membership, _sweep_graph.modularity(membership)
+
+
+def partition_agreement(a, b):
+    """Mean of NMI and ARI between two memberships (1.0 = identical partitions)"""
+    nmi = ig.compare_communities(a, b, method='nmi')
+    ari = ig.compare_communities(a, b, method='adjusted_rand')
+    if np.isnan(ari):  # both partitions are a single community
+        ari = 1.0 if a == b else 0.0
+    return nmi, ari
+
+
+def leiden_sweep(graph, resolutions=SWEEP_RESOLUTIONS, seeds=SWEEP_SEEDS, max_workers=None):
+    """
+    Run Leiden for every resolution x seed on a process pool and pick the most stable partition.
+
+    Each resolution is scored by the mean modularity of its runs and the mean pairwise
+    agreement (NMI, ARI) between its seeds. Among the resolutions within
+    SWEEP_MODULARITY_TOLERANCE of the best modularity, the most stable one wins (ties by
+    modularity), and its medoid run (highest agreement with the other seeds) is returned.
+
+    Returns (membership, report): report has one dict per resolution, the chosen one first.
+    """
+    if graph.ecount() == 0:
+        # modularity is undefined without edges (igraph returns NaN): keep every vertex on its own
+        membership = list(range(graph.vcount()))
+        return membership, [{
+            'resolution': None, 'modularity': 0.0, 'nmi': 1.0, 'ari': 1.0, 'stability': 1.0,
+            'seed': None, 'num_communities': len(membership), 'membership': membership,
+        }]
+    tasks = [(resolution, seed) for resolution in resolutions for seed in seeds]
+    edges = graph.get_edgelist()
+    workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+    if workers <= 1:
+        _init_sweep_worker(graph.vcount(), edges)
+        runs = [_leiden_run(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep_worker,
+                                 initargs=(graph.vcount(), edges)) as executor:
+            runs = list(executor.map(_leiden_run, tasks))
+
+    runs_by_resolution = defaultdict(list)
+    for resolution, seed, membership, modularity in runs:
+        runs_by_resolution[resolution].append((seed, membership, modularity))
+    report = []
+    for resolution, resolution_runs in runs_by_resolution.items():
+        agreement = np.zeros(len(resolution_runs))
+        nmis, aris = [], []
+        for (i, run_a), (j, run_b) in combinations(enumerate(resolution_runs), 2):
+            nmi, ari = partition_agreement(run_a[1], run_b[1])
+            nmis.append(nmi)
+            aris.append(ari)
+            agreement[i] += (nmi + ari) / 2
+            agreement[j] += (nmi + ari) / 2
+        modularities = [modularity for _, _, modularity in resolution_runs]
+        medoid = max(range(len(resolution_runs)), key=lambda k: (agreement[k], modularities[k]))
+        seed, membership, modularity = resolution_runs[medoid]
+        report.append({
+            'resolution': resolution,
+            'modularity': float(np.mean(modularities)),
+            'nmi': float(np.mean(nmis)) if nmis else 1.0,
+            'ari': float(np.mean(aris)) if aris else 1.0,
+            'stability': float((np.mean(nmis) + np.mean(aris)) / 2) if nmis else 1.0,
+            'seed': seed,
+            'num_communities': len(set(membership)),
+            'membership': membership,
+        })
+
+    best_modularity = max(entry['modularity'] for entry in report)
+    threshold = best_modularity - SWEEP_MODULARITY_TOLERANCE * abs(best_modularity)
+    candidates = [entry for entry in report if entry['modularity'] >= threshold]
+    chosen = max(candidates, key=lambda entry: (entry['stability'], entry['modularity']))
+    report.sort(key=lambda entry: entry is not chosen)
+    return chosen['membership'], report
+
+
+def merge_small_communities(graph, membership, min_size=MIN_COMMUNITY_SIZE):
+    """
+    Fold every community smaller than `min_size` (smallest first) into the neighbouring
+    community it shares the most edges with; communities without outside edges stay as they are.
+    Returns the membership relabelled 0..k-1 by decreasing size.
+    """
+    membership = np.asarray(membership, dtype=np.int64)
+    sizes = np.bincount(membership).tolist() if membership.size else []
+    edges = np.asarray(graph.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    source, target = membership[edges[:, 0]], membership[edges[:, 1]]
+    cross = source != target
+    pairs = np.concatenate((np.stack((source[cross], target[cross]), axis=1),
+                            np.stack((target[cross], source[cross]), axis=1)))
+    links = defaultdict(Counter)
+    if pairs.size:
+        unique_pairs, counts = np.unique(pairs, axis=0, return_counts=True)
+        for (a, b), count in zip(unique_pairs.tolist(), counts.tolist()):
+            links[a][b] = count
+
+    merged_into = list(range(len(sizes)))
+    alive = {c for c, size in enumerate(sizes) if size}
+    while True:
+        small = [c for c in alive if sizes[c] < min_size and links[c]]
+        if not small:
+            break
+        c = min(small, key=lambda c: (sizes[c], c))
+        into = max(links[c], key=lambda d: (links[c][d], sizes[d], -d))
+        sizes[into] += sizes[c]
+        alive.discard(c)
+        merged_into[c] = into
+        for d, count in links.pop(c).items():
+            links[d].pop(c, None)
+            if d != into:
+                links[into][d] += count
+                links[d][into] += count
+
+    def root(c):
+        while merged_into[c] != c:
+            c = merged_into[c]
+        return c
+
+    roots = np.array([root(c) for c in range(len(sizes))], dtype=np.int64)
+    merged = roots[membership] if membership.size else membership
+    # relabel by decreasing size, ties by first vertex
+    labels, first_vertex, counts = np.unique(merged, return_index=True, return_counts=True)
+    order = np.lexsort((first_vertex, -counts))
+    relabel = np.empty(labels.max() + 1 if labels.size else 0, dtype=np.int64)
+    relabel[labels[order]] = np.arange(labels.size)
+    return relabel[merged].tolist() if membership.size else []
+
 class Leiden_summarizer:
     def __init__(self, graph_path):
-        self.G = self.load_graph(graph_path)
-        self.g_ig = self.nx_to_ig(self.G)
+        store = GraphStore.open(graph_path)
+        self.G = store.to_networkx()
+        # undirected for Leiden, built in one call from the store's edge arrays
+        node_attributes = [name for name in store.node_columns if name != 'id']
+        self.g_ig = store.to_igraph(directed=False, node_attributes=node_attributes)
 
     def load_graph(self, json_path):
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        G = nx.DiGraph()  # Load as directed graph
-        for node in data['nodes']:
-            G.add_node(node['id'], **node)
-        for edge in data['edges']:
-            G.add_edge(edge['source'], edge['target'], **edge)
-        return G
+        return GraphStore.open(json_path).to_networkx()  # directed graph, read through the graph store
 
     def nx_to_ig(self, nx_graph):
-        """Convert NetworkX graph to igraph"""
-        # Get edges and nodes
-        edges = list(nx_graph.edges())
+        """Convert NetworkX graph to an undirected igraph, copying attributes column by column"""
         nodes = list(nx_graph.nodes())
-        
-        # Create mapping from node ID to index
         node_mapping = {node: idx for idx, node in enumerate(nodes)}
-        
-        # Create igraph as undirected for Leiden algorithm
-        g_ig = ig.Graph(directed=False)  # Changed to undirected
-        g_ig.add_vertices(len(nodes))
-        
+        edges = list(nx_graph.edges(data=True))
+        indexed_edges = np.array([(node_mapping[u], node_mapping[v]) for u, v, _ in edges], dtype=np.int64).reshape(-1, 2)
+
+        g_ig = ig.Graph(n=len(nodes), edges=indexed_edges.tolist(), directed=False)
         # Store original node IDs as 'name' attribute
         g_ig.vs["name"] = nodes
-        
-        # Add node attributes
-        for node, idx in node_mapping.items():
-            for attr_name, attr_value in nx_graph.nodes[node].items():
-                if attr_name != 'id':  # Skip 'id' since we already stored it as 'name'
-                    g_ig.vs[idx][attr_name] = attr_value
-        
-        # Convert edges to use integer indices
-        indexed_edges = [(node_mapping[u], node_mapping[v]) for u, v in edges]
-        g_ig.add_edges(indexed_edges)
-        
-        # Add edge attributes
-        for u, v, data in nx_graph.edges(data=True):
-            # Since we're making it undirected, we need to check if edge exists
-            try:
-                idx = g_ig.get_eid(node_mapping[u], node_mapping[v])
-                for attr_name, attr_value in data.items():
-                    if attr_name not in ('source', 'target'):  # Skip source/target as they're already in the edge
-                        g_ig.es[idx][attr_name] = attr_value
-            except igraph.InternalError:
-                # Edge might not exist if it was a duplicate in undirected graph
-                pass
-        
+        node_data = [nx_graph.nodes[node] for node in nodes]
+        for attr_name in dict.fromkeys(name for data in node_data for name in data):
+            if attr_name != 'id':  # Skip 'id' since we already stored it as 'name'
+                g_ig.vs[attr_name] = [data.get(attr_name) for data in node_data]
+        # every directed edge keeps its own attributes, in nx edge order
+        for attr_name in dict.fromkeys(name for _, _, data in edges for name in data):
+            if attr_name not in ('source', 'target'):  # Skip source/target as they're already in the edge
+                g_ig.es[attr_name] = [data.get(attr_name) for _, _, data in edges]
         return g_ig
+
+    @staticmethod
+    def group_communities(membership, scores=None, top_n=MAX_COMMUNITY_PAPERS):
+        """
+        Vertex indices of each community (ordered by community id), in one argsort pass.
+        With `scores`, every community is sorted by score (highest first, ties by vertex
+        index) and cut to its `top_n` best vertices; missing scores rank last.
+        """
+        membership = np.asarray(membership, dtype=np.int64)
+        if membership.size == 0:
+            return []
+        counts = np.bincount(membership)
+        if scores is None:
+            order = np.argsort(membership, kind='stable')
+        else:
+            scores = np.array([np.nan if score is None else score for score in scores], dtype=float)
+            scores = np.where(np.isnan(scores), -np.inf, scores)
+            order = np.lexsort((-scores, membership))
+        if top_n is not None:
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            rank = np.arange(order.size) - starts[membership[order]]
+            order = order[rank < top_n]
+            counts = np.minimum(counts, top_n)
+        groups = np.split(order, np.cumsum(counts)[:-1])
+        return [group for group in groups if group.size]
     
-    def leiden_algorithm(self, layer=None, min_community_size=5):
+    def leiden_algorithm(self, layer=None, min_community_size=MIN_COMMUNITY_SIZE, top_n=MAX_COMMUNITY_PAPERS,
+                         score_attribute=COMMUNITY_SCORE_ATTRIBUTE, sweep=False,
+                         resolutions=SWEEP_RESOLUTIONS, seeds=SWEEP_SEEDS, max_workers=None):
         """Run Leiden algorithm, optionally on a specific layer
         
         Args:
             layer: If specified, only process nodes with this layer value
+            top_n: Papers kept per community, highest `score_attribute` first (None keeps all)
+            sweep: Run the resolution x seed sweep (see leiden_sweep) instead of a single run,
+                merge communities below `min_community_size` into their neighbours and
+                drop the ones that are still that small
         """
         if layer is not None:
-            # Get node IDs from NetworkX graph that have the specified layer
-            layer_node_ids = [node_id for node_id, attrs in self.G.nodes(data=True) 
-                             if attrs.get('layer') == layer]
-            
-            if not layer_node_ids:
-                print(f"No nodes found with layer '{layer}'")
-                return
-            
-            # Map node IDs to igraph vertex indices using the 'name' attribute
-            # Create a mapping from node ID to index in igraph
-            name_to_index = {name: idx for idx, name in enumerate(self.g_ig.vs["name"])}
-            
-            # Get igraph indices for the layer nodes
-            layer_indices = [name_to_index[node_id] for node_id in layer_node_ids 
-                            if node_id in name_to_index]
+            # igraph vertices that have the specified layer
+            layers = self.g_ig.vs["layer"] if "layer" in self.g_ig.vs.attributes() else []
+            layer_indices = [idx for idx, node_layer in enumerate(layers) if node_layer == layer]
             
             if not layer_indices:
-                print(f"No matching nodes found in igraph graph for layer '{layer}'")
+                print(f"No nodes found with layer '{layer}'")
                 return
             
             # Create subgraph with only nodes from this layer
@@ -114,48 +266,53 @@ class Leiden_summarizer:
             print("Running Leiden on entire graph")
         
         # Run Leiden algorithm
-        
-        resolution = 0.5
-        leiden_communities = subgraph.community_leiden(
-            objective_function='modularity',
-            resolution=resolution,
-            n_iterations=5,
-            beta=0.01
-        )
-        print("Running leiden with resolution: ", resolution)
-
-        # Get community membership
-        leiden_membership = leiden_communities.membership
+        if sweep:
+            leiden_membership, report = leiden_sweep(subgraph, resolutions, seeds, max_workers)
+            print(f"Leiden sweep over {len(resolutions)} resolutions x {len(seeds)} seeds")
+            for entry in sorted(report, key=lambda entry: entry['resolution'] or 0):
+                print(f"  resolution {entry['resolution']}: modularity {entry['modularity']:.4f}, "
+                      f"NMI {entry['nmi']:.3f}, ARI {entry['ari']:.3f}, {entry['num_communities']} communities")
+            print(f"Most stable partition: resolution {report[0]['resolution']} (seed {report[0]['seed']})")
+            leiden_membership = merge_small_communities(subgraph, leiden_membership, min_community_size)
+            modularity_score = subgraph.modularity(leiden_membership) if subgraph.ecount() else 0.0
+        else:
+            resolution = LEIDEN_RESOLUTION
+            leiden_communities = subgraph.community_leiden(
+                objective_function='modularity',
+                resolution=resolution,
+                n_iterations=LEIDEN_ITERATIONS,
+                beta=LEIDEN_BETA
+            )
+            print("Running leiden with resolution: ", resolution)
+
+            # Get community membership
+            leiden_membership = leiden_communities.membership
+            modularity_score = leiden_communities.modularity
 
         # Create a mapping from igraph vertex index to original node ID
         node_mapping = {idx: node_id for idx, node_id in enumerate(subgraph.vs["name"])}
         
         # Add community labels to NetworkX graph
-        for idx, community_id in enumerate(leiden_membership):
-            node_id = node_mapping[idx]
+        for node_id, community_id in zip(subgraph.vs["name"], leiden_membership):
             self.G.nodes[node_id]['community'] = community_id
 
-        # Calculate modularity score
-        modularity_score = leiden_communities.modularity
         print(f"Leiden algorithm found {len(set(leiden_membership))} communities")
         print(f"Modularity score: {modularity_score:.4f}")
 
         # Count nodes per community
-        community_sizes = Counter(leiden_membership)
+        community_sizes = np.bincount(leiden_membership)
         print("\nCommunity sizes:")
-        for comm_id, size in sorted(community_sizes.items()):
-            print(f"Community {comm_id}: {size} nodes")
-        # Return communities
-        communities = []
-        for comm_id in sorted(set(leiden_membership)):
-            # Get all node indices in this community
-            node_indices = [idx for idx, cid in enumerate(leiden_membership) if cid == comm_id]
-            # Convert indices to node IDs
-            community_nodes = [node_mapping[idx] for idx in node_indices]
-            community_nodes = community_nodes[:31]
-            communities.append(community_nodes)
-            
-        return communities
+        for comm_id, size in enumerate(community_sizes.tolist()):
+            if size:
+                print(f"Community {comm_id}: {size} nodes")
+        # Return communities: the top_n most cited papers of each
+        scores = subgraph.vs[score_attribute] if score_attribute in subgraph.vs.attributes() else None
+        groups = self.group_communities(leiden_membership, scores, top_n)
+        if sweep:
+            # after the merge only isolated fragments are still this small, no LLM summary for them
+            groups = [group for comm_id, group in enumerate(groups)
+                      if community_sizes[comm_id] >= min_community_size]
+        return [[node_mapping[idx] for idx in group.tolist()] for group in groups]
         
     
 def main():
@@ -1,76 +1,254 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import os
 import re
 import urllib.parse
-import sys 
-import json 
+import sys
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from selenium_crawler import download_with_selenium
-def _download_pdf_content(url, file_path, headers):
-    """
-    Internal helper function to download a PDF file from a given URL.
-    It checks for a successful response and streams the content to a file.
-    """
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from src.modules.preprocessor.graph_store import GraphStore
 
-    try:    
-        response = requests.get(url, headers=headers, stream=True, timeout=30)
-        response.raise_for_status()
+DOWNLOAD_WORKERS = 16          # papers downloaded at the same time
+PER_HOST_CONCURRENCY = 4       # requests in flight per host (publishers block aggressive clients)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+FAILURE_BACKOFF = 3600         # seconds before retrying a failed link, doubled on every failure
+MAX_FAILURE_BACKOFF = 7 * 24 * 3600
+PDF_MAGIC = b'%PDF'
+PDF_MAGIC_WINDOW = 1024        # some servers prepend a few junk bytes before the header
+MAX_REDIRECTS = 10
 
-        # if 'application/pdf' not in response.headers.get('content-type', ''):
-        #     print(f"Error: The URL does not point to a PDF. Content-Type is {response.headers.get('content-type')}")
-        #     return False
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Referer': 'https://www.google.com/',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br'
+}
 
-        with open(file_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print(f"Successfully downloaded: {file_path}")
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to download PDF from {url}: {e}")
+
+def is_valid_pdf(file_path):
+    """True if the file exists and starts with the %PDF header."""
+    try:
+        with open(file_path, 'rb') as f:
+            return PDF_MAGIC in f.read(PDF_MAGIC_WINDOW)
+    except OSError:
         return False
 
-def download_paper(filename, url):
+
+def _expected_size(response, offset=0):
     """
-    Downloads a PDF paper from either a direct URL or a DOI link.
+    Full size of the remote file: the total of Content-Range, else `offset` + Content-Length.
+    None when unknown (chunked or content-encoded bodies).
+    """
+    match = re.match(r'bytes (?:\d+-\d+|\*)/(\d+)', response.headers.get('Content-Range', ''))
+    if match:
+        return int(match.group(1))
+    length = response.headers.get('Content-Length', '')
+    if length.isdigit() and response.headers.get('Content-Encoding', 'identity') == 'identity':
+        return offset + int(length)
+    return None
 
-    Args:
-        url (str): The URL of the paper, which can be a direct PDF link or a DOI.
-        filename (str, optional): The name to save the PDF file as. 
-                                  If None, a name is generated from the URL.
+
+def _range_start(response):
+    match = re.match(r'bytes (\d+)-', response.headers.get('Content-Range', ''))
+    return int(match.group(1)) if match else None
+
+
+def _validator(response):
+    """Strong ETag or Last-Modified of a response, usable as If-Range (weak ETags are not)."""
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+
+class FailureManifest:
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36', 
-        'Referer': 'https://www.google.com/',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br'
-    }
-    
-    # Generate a default filename if none is provided
-    # if filename is None:
-    #     filename = os.path.basename(url)
-    #     if not filename or not filename.endswith('.pdf'):
-    #         filename = re.sub(r'[^a-zA-Z0-9\s_.-]', '', url).replace('httpsdoi.org', '').replace('http://', '').replace('/', '_').strip('_') + '.pdf'
-    if url is None: 
-        return
-    try:
-        if url.lower().endswith('.pdf') or 'arxiv.org/pdf/' in url.lower():
-            _download_pdf_content(url, filename, headers)
-            print(f"Downloaded directly from PDF link {filename}.")
+    Links that failed to download, with an exponential backoff, persisted as JSON so that
+    reruns skip known-dead links instead of resolving and scraping them again.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable download manifest {path}: {e}")
+
+    def should_skip(self, url):
+        with self._lock:
+            entry = self.entries.get(url)
+        return entry is not None and entry['next_retry'] > time.time()
+
+    def record_failure(self, url, error):
+        with self._lock:
+            failures = self.entries.get(url, {}).get('failures', 0) + 1
+            backoff = min(FAILURE_BACKOFF * 2 ** (failures - 1), MAX_FAILURE_BACKOFF)
+            self.entries[url] = {'failures': failures, 'next_retry': time.time() + backoff, 'error': str(error)}
+            self._save()
+
+    def record_success(self, url):
+        with self._lock:
+            if self.entries.pop(url, None) is not None:
+                self._save()
+
+    def _save(self):
+        if not self.path:
             return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class PDFDownloader:
+    """
+    Concurrent PDF downloader over one keep-alive connection pool.
+    - at most `per_host` requests in flight per host;
+    - downloads go to `<file>.part` and are renamed into place only once they are complete
+      and start with %PDF, so a crash never leaves a file that looks already downloaded;
+    - an interrupted `.part` file is resumed with an HTTP Range request, but only for the link
+      that started it and only while the remote file is unchanged: `<file>.part.json` keeps the
+      URL, the ETag / Last-Modified and the expected size, and a mismatch restarts from scratch;
+    - failed links are recorded in a `FailureManifest` and skipped until their backoff expires.
+    """
+
+    def __init__(self, max_workers=DOWNLOAD_WORKERS, per_host=PER_HOST_CONCURRENCY, manifest_path=None):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.manifest = FailureManifest(manifest_path)
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=per_host, pool_block=False)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._host_semaphores = {}
+        self._host_lock = threading.Lock()
+        # selenium downloads into the target directory and renames the newest PDF, one at a time
+        self._selenium_lock = threading.Lock()
+
+    @contextmanager
+    def _host_slot(self, url):
+        host = urllib.parse.urlparse(url).netloc.lower()
+        with self._host_lock:
+            semaphore = self._host_semaphores.setdefault(host, threading.BoundedSemaphore(self.per_host))
+        with semaphore:
+            yield
+
+    @contextmanager
+    def _get(self, url, **kwargs):
+        """
+        GET `url` following redirects hop by hop, each hop inside the slot of its own host, so
+        the per-host limit applies to the publishers behind doi.org and not to doi.org itself.
+        Yields the final response while still holding its host's slot.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            with self._host_slot(url):
+                response = self.session.get(url, allow_redirects=False, **kwargs)
+                location = self.session.get_redirect_target(response)
+                if location is None:
+                    with response:
+                        yield response
+                    return
+                response.close()
+            url = urllib.parse.urljoin(response.url, location)
+        raise requests.exceptions.TooManyRedirects(f"Exceeded {MAX_REDIRECTS} redirects", response=response)
+
+    @staticmethod
+    def _read_part_meta(meta_path):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _discard_part(part_path):
+        for path in (part_path, f"{part_path}.json"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _download_pdf_content(self, url, file_path):
+        """
+        Stream a PDF into `<file_path>.part` (resuming it if present) and rename it into place.
+        Raises on HTTP errors, incomplete bodies and content that is not a PDF.
+        """
+        part_path = f"{file_path}.part"
+        meta_path = f"{part_path}.json"
+        meta = self._read_part_meta(meta_path)
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset and meta.get('url') != url:
+            # bytes of another link (or of an unknown one): never splice two bodies together
+            self._discard_part(part_path)
+            meta, offset = {}, 0
+        # PDFs are already compressed; an identity encoding keeps byte offsets valid for Range
+        headers = {'Accept-Encoding': 'identity'}
+        if offset:
+            headers['Range'] = f"bytes={offset}-"
+            if meta.get('validator'):
+                # the server answers 200 with the whole new body if the file changed meanwhile
+                headers['If-Range'] = meta['validator']
+        restart = False
+        with self._get(url, headers=headers, stream=True, timeout=30) as response:
+            if response.status_code == 416 and offset:
+                # the .part file should already hold the whole body
+                total = _expected_size(response) or meta.get('total')
+                restart = total is not None and total != offset
+            else:
+                response.raise_for_status()
+                resumed = bool(offset) and response.status_code == 206
+                total = _expected_size(response, offset if resumed else 0)
+                if resumed and (_range_start(response) != offset
+                                or meta.get('total') not in (None, total)):
+                    restart = True  # a different range or a different file size: the .part is stale
+                else:
+                    with open(meta_path, 'w', encoding='utf-8') as f:
+                        json.dump({'url': url, 'validator': _validator(response), 'total': total}, f)
+                    with open(part_path, 'ab' if resumed else 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+        if restart:
+            print(f"Discarding stale partial download of {url}")
+            self._discard_part(part_path)
+            return self._download_pdf_content(url, file_path)
+        size = os.path.getsize(part_path)
+        if total is not None and size != total:
+            # the .part and its metadata stay, the next attempt resumes from here
+            raise ValueError(f"{url} ended after {size} of {total} bytes")
+        if not is_valid_pdf(part_path):
+            self._discard_part(part_path)
+            raise ValueError(f"{url} did not return a PDF")
+        os.replace(part_path, file_path)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        print(f"Successfully downloaded: {file_path}")
+
+    def resolve_pdf_url(self, url):
+        """
+        Resolve a DOI / landing page to a direct PDF link by scraping the page.
+        Returns (pdf_url, use_selenium); pdf_url is None if no link was found.
+        """
         # Step 1: Resolve the URL to its final destination
         print(f"Resolving URL: {url}...")
-        response = requests.get(url, headers=headers, allow_redirects=True, timeout=10)
-        response.raise_for_status()
+        with self._get(url, timeout=10) as response:
+            response.raise_for_status()
         final_url = response.url
         print(f"URL resolved to: {final_url}")
-    
+
         # Step 3: If not a direct PDF link, scrape the page for a PDF download link (DOI case).
-        # print("Final URL is not a direct PDF. Scraping for a PDF link...")
         if "mdpi" in final_url:
-            print("Trying to download with selenium crawler")
-            download_with_selenium(final_url, filename)
-            return
-            
+            return final_url, True
+
         soup = BeautifulSoup(response.text, 'html.parser')
         pdf_link_element = None
 
@@ -81,37 +259,108 @@ def download_paper(filename, url):
             pdf_link_element = soup.find('a', string=re.compile(r'PDF', re.I))  # Find by case-insensitive text "PDF"
         if not pdf_link_element:
             pdf_link_element = soup.find('a', href=re.compile(r'\.pdf$', re.I))  # Find by href ending in .pdf
-        
+
         if "ieeexplore.ieee.org" in final_url:
             pdf_link_element = soup.find('a', {'class': 'document-access-icon-pdf'})
-            if pdf_link_element:
-                pdf_url_path = pdf_link_element.get('href')
-                if pdf_url_path:
-                    # Construct the full PDF URL
-                    pdf_url = urllib.parse.urljoin(final_url, pdf_url_path)
-                    print(f"Found IEEE PDF URL: {pdf_url}")
-                    _download_pdf_content(pdf_url, filename, headers)
-                    return
-                
+            if pdf_link_element and pdf_link_element.get('href'):
+                # Construct the full PDF URL
+                pdf_url = urllib.parse.urljoin(final_url, pdf_link_element.get('href'))
+                print(f"Found IEEE PDF URL: {pdf_url}")
+                return pdf_url, False
+
         if not pdf_link_element or 'href' not in pdf_link_element.attrs:
             print(f"Could not find a PDF link on the page for {final_url}.")
-            return
-
-        pdf_link = pdf_link_element['href']
+            return None, False
 
         # Step 4: Handle relative URLs by joining them with the base URL
-        if not pdf_link.startswith('http'):
-            pdf_url = requests.compat.urljoin(final_url, pdf_link)
-        else:
-            pdf_url = pdf_link
-        
+        pdf_url = urllib.parse.urljoin(final_url, pdf_link_element['href'])
         print(f"Found PDF URL: {pdf_url}")
-        
-        # Step 5: Download the PDF from the found URL
-        _download_pdf_content(pdf_url, filename, headers)
+        return pdf_url, False
+
+    def download(self, file_path, url):
+        """
+        Download one paper from a direct PDF link or a DOI / landing page.
+        Returns True if a valid PDF is at `file_path` afterwards.
+        """
+        if url is None:
+            return False
+        if is_valid_pdf(file_path):
+            return True
+        if self.manifest.should_skip(url):
+            print(f"Skipping {url}: failed recently, see the download manifest.")
+            return False
+        try:
+            if url.lower().endswith('.pdf') or 'arxiv.org/pdf/' in url.lower():
+                self._download_pdf_content(url, file_path)
+                print(f"Downloaded directly from PDF link {file_path}.")
+            else:
+                pdf_url, use_selenium = self.resolve_pdf_url(url)
+                if pdf_url is None:
+                    raise ValueError("no PDF link found on the landing page")
+                if use_selenium:
+                    print("Trying to download with selenium crawler")
+                    with self._selenium_lock:
+                        download_with_selenium(pdf_url, file_path)
+                    if not is_valid_pdf(file_path):
+                        raise ValueError("selenium did not produce a PDF")
+                else:
+                    # Step 5: Download the PDF from the found URL
+                    self._download_pdf_content(pdf_url, file_path)
+        except (requests.exceptions.RequestException, OSError, ValueError) as e:
+            print(f"Error resolving URL or downloading PDF: {e}")
+            self.manifest.record_failure(url, e)
+            return False
+        self.manifest.record_success(url)
+        return True
+
+    def download_many(self, jobs):
+        """
+        Download (file_path, url) pairs concurrently.
+        Returns {file_path: True/False}.
+        """
+        jobs = [(file_path, url) for file_path, url in jobs if url]
+        results = {}
+        if not jobs:
+            return results
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.download, file_path, url): file_path for file_path, url in jobs}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        print(f"Downloaded {sum(results.values())}/{len(jobs)} papers")
+        return results
+
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error resolving URL or downloading PDF: {e}")
+_default_downloader = None
+_default_lock = threading.Lock()
+
+
+def get_downloader():
+    """Process-wide downloader shared by `download_paper` callers."""
+    global _default_downloader
+    with _default_lock:
+        if _default_downloader is None:
+            _default_downloader = PDFDownloader()
+        return _default_downloader
+
+
+def download_paper(filename, url):
+    """
+    Downloads a PDF paper from either a direct URL or a DOI link.
+
+    Args:
+        url (str): The URL of the paper, which can be a direct PDF link or a DOI.
+        filename (str): The path to save the PDF file as.
+    """
+    return get_downloader().download(filename, url)
+
+
+def download_papers(jobs, manifest_path=None):
+    """
+    Download many (filename, url) pairs concurrently with the same engine as `download_paper`.
+    With `manifest_path`, failures are remembered across runs.
+    """
+    downloader = PDFDownloader(manifest_path=manifest_path) if manifest_path else get_downloader()
+    return downloader.download_many(jobs)
 
 # # Example usage
 # if __name__ == "__main__":
@@ -136,6 +385,7 @@ def main():
     save_dir = f"paper_data/{query.replace(' ', '_').replace(':', '')}"
     save_dir_core = f"paper_data/{query.replace(' ', '_').replace(':', '')}/core_papers"
     metadata_path = f"paper_data/{query.replace(' ', '_').replace(':', '')}/info/metadata.json"
+    manifest_path = f"paper_data/{query.replace(' ', '_').replace(':', '')}/info/download_manifest.json"
     metadata = {}
     query = sys.argv[1]
     # crawl_paper_json_path = f"paper_data/{query.replace(' ', '_').replace(':', '')}/info/crawl_papers.json"
@@ -148,30 +398,31 @@ def main():
     # all_papers.extend(crawl_papers)
     # all_papers.extend(cited_papers)
     selected_papers_path = f"paper_data/{query.replace(' ', '_').replace(':', '')}/info/paper_citation_graph.json"
-    with open(selected_papers_path, "r") as f:
-        all_papers = json.load(f)
-    all_papers = all_papers['nodes']
+    all_papers = GraphStore.open(selected_papers_path).node_records()
+    jobs = []
     for paper in all_papers:
         id = paper.get('id', '')
         save_path = os.path.join(save_dir, f"{id}.pdf")
-        if os.path.exists(save_path):
+        if is_valid_pdf(save_path):
             print(f"PDF for paper ID {id} already exists, skipping download.")
-        else: download_paper(save_path, paper.get('pdf_link'))
+        else:
+            jobs.append((save_path, paper.get('pdf_link')))
         filename = f"{id}.pdf"
         paper_metadata = {
             "title": paper.get('title'),
             "authors": paper.get('authors', []),
             "published_date": str(paper.get('year', '')),
             "abstract": paper.get('abstract'),
-            "file_path": save_path, 
+            "file_path": save_path,
             "venue": paper.get('venue', ''),
-            "citationCount": paper.get('citationCount', 0), 
+            "citationCount": paper.get('citationCount', 0),
             "score": paper.get('score', 0)
         }
         metadata[filename] = paper_metadata
+    download_papers(jobs, manifest_path=manifest_path)
 
     with open(metadata_path, 'w', encoding='utf-8') as f:
         json.dump(metadata, f, indent=4)
     print(f"Saved {len(metadata)} papers to {metadata_path}")
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -322,17 +322,13 @@ Outline to evaluate:
 
 #Remember to drop <think> tags after generating subsections
 
-        self.WRITE_INITIAL_SUBSECTION_PROMPT = """
-Write a comprehensive literature review subsection titled "[SUBSECTION_TITLE]" in LaTeX format.
-
-**SUBSECTION SPECIFIC FOCUS:** [SUBSECTION_FOCUS]
-**Community summaries:** [COMMUNITY_SUMMARY] 
-**Development directions:** [DEVELOPMENT_DIRECTION]
-
-**Papers to reference (sorted chronologically):**
-
-[PAPER_INFO]
+        # Subsection prompts come in two parts: *_CONTEXT holds the content shared by every
+        # subsection of a review (outline and instructions) and goes first as the cached prefix,
+        # *_PROMPT holds what changes per subsection.
+        self.WRITE_INITIAL_SUBSECTION_CONTEXT = """
+You are writing a comprehensive literature review in LaTeX format, one subsection at a time.
 
+For each subsection you are given its title, its SUBSECTION SPECIFIC FOCUS, community summaries, development directions and the papers to reference.
 Each paper follows this format:
 [citation_key] Title (Year)
 Summary: [Description of the paper's content]
@@ -380,16 +376,24 @@ Now consider the following guidelines carefully while writing the subsection:
 - Cherry-picking: Only citing results that support a narrative, ignoring contradictory evidence
 """
 
-        self.EVALUATE_SUBSECTION_PROMPT = """
-You are a grumpy expert academic researcher carefully evaluating this literature review subsection.
+        self.WRITE_INITIAL_SUBSECTION_PROMPT = """
+Write a comprehensive literature review subsection titled "[SUBSECTION_TITLE]" in LaTeX format.
+
+**SUBSECTION SPECIFIC FOCUS:** [SUBSECTION_FOCUS]
+**Community summaries:** [COMMUNITY_SUMMARY] 
+**Development directions:** [DEVELOPMENT_DIRECTION]
+
+**Papers to reference (sorted chronologically):**
+
+[PAPER_INFO]
+"""
+
+        self.EVALUATE_SUBSECTION_CONTEXT = """
+You are a grumpy expert academic researcher carefully evaluating the subsections of a literature review, one at a time.
 
-**Previous subsection if any:** [PRE_SUBSECTION]
-**Subsection Title**: [SUBSECTION_TITLE]
-**Expected Focus**: [SUBSECTION_FOCUS]
 **Overall Review Context: Outline**: [OUTLINE]
-**Subsection Content**: [SUBSECTION_CONTENT]
 
-Evaluate this subsection holistically as an expert academic reviewer would assess a literature review section.
+Evaluate each subsection holistically as an expert academic reviewer would assess a literature review section.
 
 **IMPORTANT**: 
 - Return ONLY valid JSON without any markdown formatting or code blocks
@@ -407,6 +411,15 @@ Evaluate this subsection holistically as an expert academic reviewer would asses
   "improvement_needed": ["specific actionable improvements with concrete suggestions"],
   "suggested_queries": ["suggested search queries to find additional relevant papers to address gaps or weaknesses"]
 }}
+"""
+
+        self.EVALUATE_SUBSECTION_PROMPT = """
+**Previous subsection if any:** [PRE_SUBSECTION]
+**Subsection Title**: [SUBSECTION_TITLE]
+**Expected Focus**: [SUBSECTION_FOCUS]
+**Subsection Content**: [SUBSECTION_CONTENT]
+
+Evaluate this subsection and return the JSON described above.
 """
         
         self.CHECK_RAG_RESULT_PROMPT = """
@@ -442,35 +455,17 @@ Summary: [paper content summary]
 }}
 """
 
-        self.SUBSECTION_IMPROVE_PROMPT = """
-Improve the following literature review subsection based on evaluation feedback and additional papers.
+        self.SUBSECTION_IMPROVE_CONTEXT = """
+You are improving the subsections of a literature review, one at a time, based on evaluation feedback and additional papers.
 
-**Previous subsection if any:** [PRE_SUBSECTION]
-**Subsection Title**: [SUBSECTION_TITLE]
-**Subsection Focus**: [SUBSECTION_FOCUS]
 **Overall Review Context: Outline**: [OUTLINE]
 
-**Current Subsection Content**:
-[CURRENT_CONTENT]
-
-**Evaluation Feedback**:
-- Overall Score: [OVERALL_SCORE]
-- Synthesis Quality: [SYNTHESIS_SCORE] (Target: 4.5+)
-- Critical Analysis: [CRITICAL_SCORE] (Target: 4.5+)
-- Strengths: [STRENGTH]
-- Weaknesses: [WEAKNESS]
-- Redundancy check: [REDUNDANCY]
-- Specific Improvements Needed: [IMPROVEMENT_NEEDED]
-
-**Additional Papers Retrieved**:
-[ADDITIONAL_INFO]
-
 **MANDATORY IMPROVEMENT ACTIONS:**
 
  **Improvement Instructions**:
   1. Address the specific weaknesses identified in the evaluation
   2. Incorporate relevant information from the additional papers
-  3. Ensure the content stays focused on: [SUBSECTION_FOCUS]
+  3. Ensure the content stays focused on the Subsection Focus given below
   4. Maintain academic writing style
   5. Use proper LaTeX citations (\\cite{{citation_key}})
   6. Remove redundant information with previous subsection. Try to write different aspects of similar papers in previous subsection.
@@ -491,6 +486,29 @@ Improve the following literature review subsection based on evaluation feedback
   - Analytical depth beyond mere description
   - Critical comparison of approaches with justified assessments
   - Discussion of WHY limitations exist, not just WHAT they are
+"""
+
+        self.SUBSECTION_IMPROVE_PROMPT = """
+Improve the following literature review subsection.
+
+**Previous subsection if any:** [PRE_SUBSECTION]
+**Subsection Title**: [SUBSECTION_TITLE]
+**Subsection Focus**: [SUBSECTION_FOCUS]
+
+**Current Subsection Content**:
+[CURRENT_CONTENT]
+
+**Evaluation Feedback**:
+- Overall Score: [OVERALL_SCORE]
+- Synthesis Quality: [SYNTHESIS_SCORE] (Target: 4.5+)
+- Critical Analysis: [CRITICAL_SCORE] (Target: 4.5+)
+- Strengths: [STRENGTH]
+- Weaknesses: [WEAKNESS]
+- Redundancy check: [REDUNDANCY]
+- Specific Improvements Needed: [IMPROVEMENT_NEEDED]
+
+**Additional Papers Retrieved**:
+[ADDITIONAL_INFO]
 
 Write the improved subsection content only (no meta-commentary):
 """
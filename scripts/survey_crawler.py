@@ -20,7 +20,6 @@ Key improvements:
 import sys
 import os 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
-import time
 import requests
 import json
 from typing import Dict, List, Tuple, Set, Optional, Any
@@ -30,15 +29,15 @@ from pathlib import Path
 import re
 import math
 import hashlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv, find_dotenv
 from pathlib import Path
 
 load_dotenv(Path(".env"))
-SEMANTIC_SCHOLAR_API_KEY = os.getenv("SEMANTIC_SCHOLAR_API_KEY")
-if not SEMANTIC_SCHOLAR_API_KEY:
-    raise ValueError("SEMANTIC_SCHOLAR_API_KEY not found in environment variables")
 from dataclasses import dataclass
+from src.configs.config import settings
 from src.models.LLM.ChatAgent import ChatAgent
+from src.models.LLM.rate_limiter import RateScheduler
 
 @dataclass
 class SearchKeywords:
@@ -90,7 +89,11 @@ class SurveyOptimizedCrawler:
             'quality_score_threshold': 0.6,
             
             # Search parameters
-            'max_results_per_query': 50
+            'max_results_per_query': 50,
+            'page_size': 100,              # Semantic Scholar search limit per request
+            'max_search_offset': 1000,     # the search endpoint returns at most the first 1000 hits
+            'crawler_workers': 8,          # concurrent page requests (paced by the rate scheduler)
+            'pages_in_flight': 4           # pages fetched ahead per (tier, query)
         }
         
         # Paper storage and deduplication
@@ -100,6 +103,8 @@ class SurveyOptimizedCrawler:
         
         self._log("Survey-Optimized Crawler initialized")
         self.chat_agent = ChatAgent()
+        # Semantic Scholar quota (1 req/s with an API key) is paced by the shared scheduler
+        self.scheduler = RateScheduler.default()
     def _create_keyword_prompt(self, topic,user_keywords, max_keywords):
         """Create prompt for keyword generation"""
         # field_context = f" in the field of {field}" if field else ""
@@ -200,31 +205,20 @@ class SurveyOptimizedCrawler:
         self._log(f"     Recent: {recent_target} papers (last 3 years, some citations)")
         self._log(f"     Trending: {trending_target} papers (citation growth, emerging)")
         
-        # Collect papers by tier
-        # Track total collected papers to avoid unnecessary API calls
-        total_collected = 0
+        # Collect all tiers concurrently: every tier / query / page offset shares the
+        # Semantic Scholar budget instead of waiting for the previous tier to finish
+        self._log(f"\n  Collecting foundational, recent and trending tiers concurrently")
+        tiers = {
+            'foundational': (expanded_queries, foundational_target),
+            'recent': (expanded_queries, recent_target),
+            'trending': (expanded_queries, trending_target),
+        }
+        tier_papers = self._collect_tiers(tiers)
         all_papers = []
-
-        # Tier 1: Foundational Papers
-        self._log(f"\n  TIER 1: Foundational Papers")
-        foundational_papers = self._collect_foundational_papers(expanded_queries, foundational_target)
-        print("Found foundation papers: ",len(foundational_papers))
-        all_papers.extend(foundational_papers)
-        total_collected += len(foundational_papers)
-
-        # Tier 2: Recent Papers
-        self._log(f"\n  TIER 2: Recent Papers")
-        recent_papers = self._collect_recent_papers(expanded_queries, min(recent_target, target_papers - total_collected))
-        print("Found recent papers: ", len(recent_papers))
-        all_papers.extend(recent_papers)
-        total_collected += len(recent_papers)
-
-        # Tier 3: Trending Papers
-        self._log(f"\n  TIER 3: Trending Papers")
-        trending_papers = self._collect_trending_papers(expanded_queries, min(trending_target, target_papers - total_collected))
-        print("Found trending papers: ", len(trending_papers))
-        all_papers.extend(trending_papers)
-        total_collected += len(trending_papers)
+        for tier in ('foundational', 'recent', 'trending'):
+            papers = self._finalize_tier(tier, tier_papers[tier], tiers[tier][1])
+            print(f"Found {tier} papers: ", len(papers))
+            all_papers.extend(papers)
         
         # deduplicate papers
         all_papers = self._deduplicate_papers(all_papers)
@@ -268,173 +262,147 @@ class SurveyOptimizedCrawler:
         if doi and not pdf_url:
             pdf_url = f"https://doi.org/{doi}"
         return pdf_url
-    def _collect_foundational_papers(self, queries: List[str], target: int) -> List[Dict]:
-        """Collect foundational papers (highly cited, established work)"""
-        papers = []
+    def _tier_search_params(self, tier: str) -> Tuple[Tuple[int, int], int]:
+        """Year range and minimum citation count of a tier"""
         current_year = datetime.now().year
-        
-        for i, query in enumerate(queries):
-            if len(papers) >= target:
-                break
-                
-            self._log(f"   Query {i+1}/{len(queries)}: '{query}'")
-            
-            # Define foundational year range (2-15 years old)
-            end_year = current_year - self.config['foundational_age_range'][0]
-            start_year = current_year - self.config['foundational_age_range'][1]
-            
-            # Search across available sources
-            query_papers = self._search_all_sources(
-                query, 
-                year_range=(start_year, end_year),
-                min_citations=self.config['foundational_min_citations'],
-                # max_results=max(100, target//len(query) * 5)
-                max_results=100, 
-            )
-            papers.extend(query_papers)
-            offset = 0
-            while len(papers) < target:
-                offset += len(papers)
-                query_papers = self._search_all_sources(
-                    query, 
-                    year_range=(start_year, end_year),
-                    min_citations=self.config['foundational_min_citations'],
-                    # max_results=max(100, target//len(query) * 5)
-                    max_results=100, 
-                    offset = offset
-                )
-                papers.extend(query_papers)
-                if len(query_papers) == 0:
-                    break
+        min_age, max_age = self.config[f'{tier}_age_range']
+        # recent papers run up to the current year
+        end_year = current_year if tier == 'recent' else current_year - min_age
+        return (current_year - max_age, end_year), self.config[f'{tier}_min_citations']
 
-        papers = self._deduplicate_papers(papers)
+    def _finalize_tier(self, tier: str, papers: List[Dict], target: int) -> List[Dict]:
+        """Keep the first `target` deduplicated papers of a tier, then score and rank them"""
+        # pages are fetched whole, so the last one usually overshoots the target
+        papers = papers[:target]
         # calculate score = citation_count * (1 / max(1, (2025 - year))) and take top 20% base on calculated score
         for paper in papers:
             # Calculate score
-            year = int(paper.get('year', 2025))
-            citations = paper.get('citationCount', 0)
+            year = int(paper.get('year') or 2025)
+            citations = paper.get('citationCount') or 0
             score = citations * (1 / max(1, (2025 - year)))
             paper['score'] = score
         
         papers.sort(key=lambda x: x.get('score', 0), reverse=True)
         # papers = papers[:max(1, int(len(papers) * 0.2))]
 
-        self._log(f" Collected {len(papers)} foundational papers")
+        self._log(f" Collected {len(papers)} {tier} papers")
         return papers
+
+    def _collect_tiers(self, tiers: Dict[str, Tuple[List[str], int]]) -> Dict[str, List[Dict]]:
+        """
+        Fetch search pages for every tier and query concurrently.
+        
+        Args:
+            tiers: tier name -> (queries, target number of papers)
+            
+        Returns:
+            tier name -> deduplicated papers, in (query, offset, position) order
+        
+        The first page of each (tier, query) is requested right away; its `next` and `total`
+        fields decide which further offsets exist, and up to `pages_in_flight` of them are
+        fetched ahead while the papers collected plus the pages in flight (page_size each)
+        do not cover the tier's target yet. Pages are merged into the tier's
+        title-signature index as they arrive, keeping the earliest (query, offset, position)
+        hit, so the result does not depend on arrival order.
+        """
+        page_size = self.config['page_size']
+        max_offset = self.config['max_search_offset']
+        pages_in_flight = self.config['pages_in_flight']
+        # tier -> title signature -> (rank, paper)
+        collected = {tier: {} for tier in tiers}
+        streams = {}
+        futures = {}
+
+        # tier -> search pages requested but not returned yet, over all its queries
+        tier_in_flight = {tier: 0 for tier in tiers}
+
+        def tier_done(tier):
+            return len(collected[tier]) >= tiers[tier][1]
+
+        def tier_covered(tier):
+            return len(collected[tier]) + tier_in_flight[tier] * page_size >= tiers[tier][1]
+
+        with ThreadPoolExecutor(max_workers=self.config['crawler_workers']) as executor:
+            def submit(tier, q, offset):
+                year_range, _ = self._tier_search_params(tier)
+                future = executor.submit(self._fetch_search_page, tiers[tier][0][q], year_range, offset, page_size)
+                futures[future] = (tier, q, offset)
+                streams[(tier, q)]['in_flight'] += 1
+                tier_in_flight[tier] += 1
+
+            def top_up(tier, q):
+                stream = streams[(tier, q)]
+                while (not tier_covered(tier) and stream['next'] is not None
+                       and stream['next'] < stream['end'] and stream['in_flight'] < pages_in_flight):
+                    submit(tier, q, stream['next'])
+                    stream['next'] += page_size
+
+            for tier, (queries, target) in tiers.items():
+                for q in range(len(queries)):
+                    # 'next' / 'end' are known once the first page returns
+                    streams[(tier, q)] = {'next': None, 'end': 0, 'in_flight': 0}
+                    if target > 0:
+                        submit(tier, q, 0)
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tier, q, offset = futures.pop(future)
+                    stream = streams[(tier, q)]
+                    stream['in_flight'] -= 1
+                    tier_in_flight[tier] -= 1
+                    if future.cancelled():
+                        continue
+                    try:
+                        page, total, next_offset = future.result()
+                    except Exception as e:
+                        self._log(f" Semantic Scholar error ({tier}, offset {offset}): {e}")
+                        stream['next'] = None
+                        continue
+                    if offset == 0:
+                        stream['end'] = min(total, max_offset)
+                        stream['next'] = next_offset
+                    if next_offset is None:
+                        # no results past this page
+                        stream['end'] = min(stream['end'], offset + 1)
+                    _, min_citations = self._tier_search_params(tier)
+                    for position, raw_paper in enumerate(page):
+                        paper = self._standardize_paper(raw_paper, min_citations)
+                        if paper is None:
+                            continue
+                        title = paper['title'].lower().strip()
+                        if len(title) <= 10:
+                            continue
+                        signature = self._create_title_signature(title)
+                        rank = (q, offset, position)
+                        if signature not in collected[tier] or rank < collected[tier][signature][0]:
+                            collected[tier][signature] = (rank, paper)
+                    self._log(f" [{tier}] offset {offset}: {len(page)} results, "
+                              f"{len(collected[tier])}/{tiers[tier][1]} papers")
+
+                for tier, q in streams:
+                    top_up(tier, q)
+                # pages still queued for a tier that reached its target are not needed
+                for future, (tier, _, _) in futures.items():
+                    if tier_done(tier):
+                        future.cancel()
+
+        return {
+            tier: [paper for _, paper in sorted(index.values(), key=lambda item: item[0])]
+            for tier, index in collected.items()
+        }
+
+    def _collect_foundational_papers(self, queries: List[str], target: int) -> List[Dict]:
+        """Collect foundational papers (highly cited, established work)"""
+        return self._finalize_tier('foundational', self._collect_tiers({'foundational': (queries, target)})['foundational'], target)
     
     def _collect_recent_papers(self, queries: List[str], target: int) -> List[Dict]:
         """Collect recent papers with some citation traction"""
-        papers = []
-        current_year = datetime.now().year
-        
-        for i, query in enumerate(queries):
-            if len(papers) >= target:
-                break
-                
-            self._log(f" Query {i+1}/{len(queries)}: '{query}'")
-            
-            # Define recent year range 
-            start_year = current_year - self.config['recent_age_range'][1]
-            end_year = current_year
-            
-            # Search with lower citation threshold for recent work
-            query_papers = self._search_all_sources(
-                query, 
-                year_range=(start_year, end_year),
-                min_citations=self.config['recent_min_citations'],
-                # max_results=max(100, target//len(query) * 5)
-                max_results=100, 
-            )
-            papers.extend(query_papers)
-            while len(papers) < target:
-                offset = 100
-                query_papers = self._search_all_sources(
-                    query, 
-                    year_range=(start_year, end_year),
-                    min_citations=self.config['recent_min_citations'],
-                    # max_results=max(100, target//len(query) * 5)
-                    max_results=100, 
-                    offset = offset
-                )
-                offset += len(papers)
-                papers.extend(query_papers)
-                if len(query_papers) == 0:
-                    break
-        papers = self._deduplicate_papers(papers)
-        # calculate score = citation_count * (1 / max(1, (2025 - year))) and take top 20% base on calculated score
-        for paper in papers:
-            # Calculate score
-            year = paper.get('year', 2025)
-            citations = paper.get('citationCount', 0)
-            score = citations * (1 / max(1, (2025 - year)))
-            paper['score'] = score
-        
-        papers.sort(key=lambda x: x.get('score', 0), reverse=True)
-        # papers = papers[:max(1, int(len(papers) * 0.2))]
-        
-        self._log(f" Collected {len(papers)} recent papers")
-        return papers
+        return self._finalize_tier('recent', self._collect_tiers({'recent': (queries, target)})['recent'], target)
     
     def _collect_trending_papers(self, queries: List[str], target: int) -> List[Dict]:
         """Collect trending papers (showing citation growth)"""
-        papers = []
-        current_year = datetime.now().year
-        
-        for i, query in enumerate(queries):
-            if len(papers) >= target:
-                break
-                
-            self._log(f" Query {i+1}/{len(queries)}: '{query}'")
-            
-            # Define trending year range 
-            start_year = current_year - self.config['trending_age_range'][1]
-            end_year = current_year - self.config['trending_age_range'][0]
-            
-            # Search for papers
-            query_papers = self._search_all_sources(
-                query, 
-                year_range=(start_year, end_year),
-                min_citations=self.config['trending_min_citations'],
-                # max_results=max(100, target//len(query) * 5)
-                max_results=100, 
-            )
-            papers.extend(query_papers)
-            while len(papers) < target:
-                offset = 100
-                query_papers = self._search_all_sources(
-                    query, 
-                    year_range=(start_year, end_year),
-                    min_citations=self.config['trending_min_citations'],
-                    # max_results=max(100, target//len(query) * 5)
-                    max_results=100, 
-                    offset = offset
-                )
-                offset += len(papers)
-                papers.extend(query_papers)
-                if len(query_papers) == 0:
-                    break
-            # query_papers = self._search_all_sources(
-            #     query,
-            #     year_range=(start_year, end_year),
-            #     min_citations=self.config['trending_min_citations'],
-            #     # max_results=min(100, target//len(query) * 5)
-            #     max_results=100
-            # )
-            # papers.extend(query_papers)
-        papers = self._deduplicate_papers(papers)
-        # calculate score = citation_count * (1 / max(1, (2025 - year))) and take top 20% base on calculated score
-        for paper in papers:
-            # Calculate score
-            year = paper.get('year', 2025)
-            citations = paper.get('citationCount', 0)
-            score = citations * (1 / max(1, (2025 - year)))
-            paper['score'] = score
-        
-        papers.sort(key=lambda x: x.get('score', 0), reverse=True)
-        # papers = papers[:max(1, int(len(papers) * 0.2))]
-        
-        self._log(f" Collected {len(papers)} trending papers")
-        return papers
+        return self._finalize_tier('trending', self._collect_tiers({'trending': (queries, target)})['trending'], target)
     
     def _search_all_sources(self, query: str, year_range: Tuple[int, int] = None, 
                            min_citations: int = 0, max_results: int = 100, offset=0) -> List[Dict]:
@@ -454,14 +422,15 @@ class SurveyOptimizedCrawler:
         # deduplicated = self._deduplicate_papers(all_results)
         # return deduplicated[:max_results]
     
-    def _search_semantic_scholar(self, query: str, year_range: Tuple[int, int] = None, 
-                                min_citations: int = 0, limit=100, offset=0) -> List[Dict]:
-        """Search Semantic Scholar with enhanced metadata collection"""
-        results = []
-        
+    def _fetch_search_page(self, query: str, year_range: Tuple[int, int] = None,
+                           offset: int = 0, limit: int = 100) -> Tuple[List[Dict], int, Optional[int]]:
+        """
+        One page of the Semantic Scholar search endpoint.
+        Returns (raw papers, server `total`, server `next` offset or None on the last page).
+        """
         # Semantic Scholar API endpoint
         api_url = "https://api.semanticscholar.org/graph/v1/paper/search"
-        headers = {"x-api-key": SEMANTIC_SCHOLAR_API_KEY}
+        headers = {"x-api-key": settings.SEMANTIC_SCHOLAR_API_KEY}
           
         # Build query parameters
         params = {
@@ -473,54 +442,60 @@ class SurveyOptimizedCrawler:
         if year_range:
             params['year'] = f"{year_range[0]}-{year_range[1]}"
         
-        try:
-            response = self.session.get(api_url, params=params, timeout=60, headers=headers)
-            while response.status_code == 429:
-                self._log("Rate limit exceeded")
-                # retry 
-                time.sleep(60)
+        while True:
+            # on 429 the scheduler pauses the budget (Retry-After aware) before the retry
+            with self.scheduler.slot("semantic_scholar") as slot:
                 response = self.session.get(api_url, params=params, timeout=60, headers=headers)
-                self._log(response.status_code)
-            if response.status_code == 200:
-                data = response.json()
-                papers = data.get('data', [])
-                
-                # Handle case where papers might be None
-                if not papers:
-                    return results
-                
-                for paper in papers:
-                    if not paper:  # Skip None papers
-                        continue
-                        
-                    citations = paper.get('citationCount', 0)
-                    if citations >= min_citations:
-                        # Handle potential None values safely
-                        title = paper.get('title', '') or ''
-                        abstract = paper.get('abstract', '') or ''
-                        authors = paper.get('authors', [])
-                        if not isinstance(authors, list):
-                            authors = []
-                        pdf_url = self.get_pdf_link(paper)
-                        standardized = {
-                            'id': paper.get('paperId', '') or '',
-                            'title': title,
-                            'authors': [author.get('name', '') for author in authors if isinstance(author, dict)],
-                            'year': paper.get('year'),
-                            'citationCount': citations,
-                            'abstract': abstract,
-                            'url': paper.get('url', '') or '',
-                            'pdf_url': pdf_url,
-                            'venue': paper.get('venue', '') or '',
-                            'publicationDate': paper.get('publicationDate', '') or '',
-                            'externalIds': paper.get('externalIds', {}),
-                            'references': paper.get('references', []) or [],
-                            'cited_by': paper.get('citations', []) or []
-                        }
-                        results.append(standardized)
-                        print('Collected: ', len(results), end='\r')
-            time.sleep(1)  # Rate limiting
-            
+                slot.observe(response.status_code, response.headers)
+            if response.status_code != 429:
+                break
+            self._log("Rate limit exceeded")
+        if response.status_code != 200:
+            self._log(f"Semantic Scholar API error: HTTP {response.status_code}")
+            return [], 0, None
+        data = response.json()
+        return data.get('data') or [], data.get('total') or 0, data.get('next')
+
+    def _standardize_paper(self, paper: Optional[Dict], min_citations: int = 0) -> Optional[Dict]:
+        """Survey metadata of a search result, None if it is empty or below `min_citations`"""
+        if not paper:  # Skip None papers
+            return None
+        citations = paper.get('citationCount', 0)
+        if (citations or 0) < min_citations:
+            return None
+        # Handle potential None values safely
+        title = paper.get('title', '') or ''
+        abstract = paper.get('abstract', '') or ''
+        authors = paper.get('authors', [])
+        if not isinstance(authors, list):
+            authors = []
+        pdf_url = self.get_pdf_link(paper)
+        return {
+            'id': paper.get('paperId', '') or '',
+            'title': title,
+            'authors': [author.get('name', '') for author in authors if isinstance(author, dict)],
+            'year': paper.get('year'),
+            'citationCount': citations,
+            'abstract': abstract,
+            'url': paper.get('url', '') or '',
+            'pdf_url': pdf_url,
+            'venue': paper.get('venue', '') or '',
+            'publicationDate': paper.get('publicationDate', '') or '',
+            'externalIds': paper.get('externalIds', {}),
+            'references': paper.get('references', []) or [],
+            'cited_by': paper.get('citations', []) or []
+        }
+
+    def _search_semantic_scholar(self, query: str, year_range: Tuple[int, int] = None, 
+                                min_citations: int = 0, limit=100, offset=0) -> List[Dict]:
+        """Search Semantic Scholar with enhanced metadata collection"""
+        results = []
+        try:
+            papers, _, _ = self._fetch_search_page(query, year_range, offset, limit)
+            for paper in papers:
+                standardized = self._standardize_paper(paper, min_citations)
+                if standardized is not None:
+                    results.append(standardized)
         except Exception as e:
             self._log(f"Semantic Scholar API error: {e}")
         
@@ -626,6 +601,9 @@ def main():
         target_papers = 100
         print(f"Error: Invalid count '{target_papers_arg}'. Target paper count must be an integer. Using default (300).")
     
+    # Validate the API key up front; page errors are only logged once crawling runs
+    settings.require("SEMANTIC_SCHOLAR_API_KEY")
+
     # Initialize crawler
     crawler = SurveyOptimizedCrawler(verbose=True)
     
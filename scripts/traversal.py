@@ -1,12 +1,16 @@
 import re
 import sys
 import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from numpy import sqrt 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
 import json
-import networkx as nx
 from src.models.LLM.ChatAgent import ChatAgent
+from src.modules.preprocessor.graph_store import load_citation_graph
+from src.models.LLM.prompt_packer import pack_paper_text
 import requests
 from pdf_downloader import download_paper
 from leiden import Leiden_summarizer
@@ -34,10 +38,14 @@ class Config:
     ADVANCED_GEMINI_MODEL = "gemini-2.5-pro"
     DEFAULT_GEMINI_MODEL = "gemini-2.5-flash"
 
+    # Community / seed-direction summaries are independent LLM calls run on a thread pool
+    SUMMARY_WORKERS = 8
+    # Leiden resolution x seed sweep: only stable communities (merged to >= 5 papers) are summarized.
+    # Off by default: it changes which communities (and how many) reach the summary prompts
+    LEIDEN_SWEEP = False
+
 # Load the graph from JSON
 def load_graph(json_path, node_info_path):
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
     with open(node_info_path, 'r', encoding='utf-8') as f:
         node_info = json.load(f)
     id2node_info = {}
@@ -46,20 +54,26 @@ def load_graph(json_path, node_info_path):
         info = node["metadata"]
         info['citation_key'] = node['citation_key']
         id2node_info[node_id] = info
-    G = nx.DiGraph()
-    for node in data['nodes']:
-        node_id = node['id']
-        info = {**node, **id2node_info[node_id]}
-        G.add_node(node_id, **info)
-    for edge in data['edges']:
-        G.add_edge(edge['source'], edge['target'], **edge)
-    return G
+    return load_citation_graph(json_path, id2node_info)
 
 # Collect papers with new_direction=1 for each layer
 def get_layer_seeds(G, layer):
     return [n for n, attr in G.nodes(data=True) if attr.get('layer') == layer]
+_chat_agent = None
+_chat_agent_lock = threading.Lock()
+# prompt logs are appended from several worker threads
+_prompt_log_lock = threading.Lock()
+
+def get_chat_agent():
+    """One ChatAgent (and its connection pool / rate limits) shared by every LLM call."""
+    global _chat_agent
+    with _chat_agent_lock:
+        if _chat_agent is None:
+            _chat_agent = ChatAgent()
+        return _chat_agent
+
 def llm_call_with_retry(prompt, placeholder="LLM summary placeholder", temperature=0.3, model=Config.DEFAULT_GEMINI_MODEL):
-    chat_agent = ChatAgent()
+    chat_agent = get_chat_agent()
     finish_generated = False
     tries = 0
     summary = placeholder
@@ -72,22 +86,18 @@ def llm_call_with_retry(prompt, placeholder="LLM summary placeholder", temperatu
             print(f"Error occurred while summarizing direction: {e}")
     return summary
 def get_paper_text(paper_infos):
-    papers_text = ''
-    for info in paper_infos:
-        try:
-            if info['summary'] != info['abstract'] and info['summary'] != '':
-                papers_text += f"[{info['citation_key']}] {info['title']} ({info['year']})\nSummary: {info['summary']}\n\n"
-        except: papers_text += f"[{info['citation_key']}] {info['title']} ({info['year']})\nSummary: {info['abstract']}\n\n"
-    return papers_text
+    # at most MAX_CONTEXT_PAPERS papers, within the model's token budget (summary -> abstract -> title);
+    # returns (text, number of papers in it)
+    return pack_paper_text(paper_infos, model=Config.DEFAULT_GEMINI_MODEL, max_papers=Config.MAX_CONTEXT_PAPERS)
 # Call Gemini LLM to summarize
 def summarize_development_path(query,paper_infos, path, previous_context=''):
     # Compose a prompt for taxonomy of a direction, showing the traversal path
-    papers_text = get_paper_text(paper_infos)
+    papers_text, number_of_papers = get_paper_text(paper_infos)
     if previous_context == '':
         prompt = prompt_helper.generate_prompt(prompt_helper.BFS_PROMPT_1_touch, 
                                             paras={
                                                 'QUERY': query,
-                                                'NUMBER_OF_PAPERS': str(len(paper_infos)),
+                                                'NUMBER_OF_PAPERS': str(number_of_papers),
                                                 'PAPER_INFO': papers_text,
                                                 # 'PREVIOUS_CONTEXT': ("PREVIOUS CONTEXT:" + chr(10) + previous_context + chr(10)) if previous_context else ""                
                                                 })
@@ -95,14 +105,14 @@ def summarize_development_path(query,paper_infos, path, previous_context=''):
         prompt = prompt_helper.generate_prompt(prompt_helper.BFS_PROMPT_2_touch, 
                                             paras={
                                                 'QUERY': query,
-                                                'NUMBER_OF_PAPERS': str(len(paper_infos)),
+                                                'NUMBER_OF_PAPERS': str(number_of_papers),
                                                 'PAPER_INFO': papers_text,
                                                 'PREVIOUS_CONTEXT': ("PREVIOUS CONTEXT:" + chr(10) + previous_context + chr(10)) if previous_context else ""                
                                                 })
     
     summary = llm_call_with_retry(prompt, "LLM summary placeholder for direction.")
     summary = parse_remove_think(summary)
-    with open('test_prompts.txt', "a") as f:
+    with _prompt_log_lock, open('test_prompts.txt', "a") as f:
         f.write(f"DEVELOPMENT PATH PROMPT:\n {prompt}")
         f.write(f'DEVELOPMENT SUMMARY\n{summary}')
     return summary
@@ -128,11 +138,13 @@ def summarize_layer_method_groups(query, G, layer):
             'abstract': attr.get('abstract', ''),
             'summary': attr.get('summary', ''),
             'year': attr.get('year', 0),
-            'citation_key': attr.get('citation_key', '')
+            'citation_key': attr.get('citation_key', ''),
+            'citation_count': attr.get('citation_count', 0),
+            'layer': attr.get('layer')
         })
     # Compose prompt for LLM
     # layer_desc = {1: 'foundational papers', 2: 'development papers', 3: 'recent and trending papers'}
-    papers_info = get_paper_text(infos)
+    papers_info, _ = get_paper_text(infos)
     # prompt = prompt_helper.generate_prompt(prompt_helper.LAYER_PROMPT, 
     #                                        paras={
     #                                            'QUERY': query,
@@ -166,10 +178,12 @@ def summarize_community(query, G, papers):
             'abstract': attr.get('abstract', ''),
             'summary': attr.get('summary', ''),
             'year': attr.get('year', 0), 
-            'citation_key': attr.get('citation_key', '')
+            'citation_key': attr.get('citation_key', ''),
+            'citation_count': attr.get('citation_count', 0),
+            'layer': attr.get('layer')
         })
     # Compose prompt for LLM
-    paper_info = get_paper_text(infos)
+    paper_info, _ = get_paper_text(infos)
     prompt = prompt_helper.generate_prompt(prompt_helper.COMMUNITY_PROMPT,
                                            paras={
                                                'QUERY': query,
@@ -177,7 +191,7 @@ def summarize_community(query, G, papers):
                                            })
     summary = llm_call_with_retry(prompt)
     summary = parse_remove_think(summary)
-    with open('test_prompts.txt', "a") as f:
+    with _prompt_log_lock, open('test_prompts.txt', "a") as f:
         f.write(f"COMMUNITY PROMPT:\n {prompt}")
         f.write(f'COMMUNITY SUMMARY:\n {summary}')
     return summary, papers
@@ -330,6 +344,7 @@ def bfs_from_seed(query, graph, seed, max_development_paper=20, max_frontier_pap
     info = []
     path = []
     queue = deque()
+    edge_weights = {}  # node -> weight of the edge it was reached by, used to rank prompt papers
     
     # Separate papers by layer
     layer1_papers = []
@@ -351,7 +366,9 @@ def bfs_from_seed(query, graph, seed, max_development_paper=20, max_frontier_pap
         'abstract': attr.get('abstract', ''),
         'summary': attr.get('summary', ''),
         'year': attr.get('year', 0), 
-        'citation_key': attr.get('citation_key', '')
+        'citation_key': attr.get('citation_key', ''),
+        'citation_count': attr.get('citation_count', 0),
+        'layer': attr.get('layer')
     }
     info.append(paper_info)
     layer1_papers.append(paper_info)
@@ -365,6 +382,7 @@ def bfs_from_seed(query, graph, seed, max_development_paper=20, max_frontier_pap
         layer = attr.get('layer', None)
         if neighbor not in visited and layer == 2:
             visited.add(neighbor)
+            edge_weights[neighbor] = graph.edges[seed, neighbor].get('weight', 0)
             queue.append((neighbor, 2))  # All these neighbors are at layer 2
     
     # Process layers 2 and 3
@@ -379,7 +397,10 @@ def bfs_from_seed(query, graph, seed, max_development_paper=20, max_frontier_pap
             'abstract': attr.get('abstract', ''),
             'summary': attr.get('summary', ''),
             'year': attr.get('year', 0),
-            'citation_key': attr.get('citation_key', '')
+            'citation_key': attr.get('citation_key', ''),
+            'citation_count': attr.get('citation_count', 0),
+            'layer': attr.get('layer'),
+            'weight': edge_weights.get(node, 0)
         }
         info.append(paper_info)
         
@@ -401,6 +422,7 @@ def bfs_from_seed(query, graph, seed, max_development_paper=20, max_frontier_pap
                 layer = attr.get('layer', None)
                 if neighbor not in visited and layer == 3:
                     visited.add(neighbor)
+                    edge_weights[neighbor] = graph.edges[node, neighbor].get('weight', 0)
                     queue.append((neighbor, 3))  # These neighbors are at layer 3
         
         # Process layer 3 nodes
@@ -436,6 +458,94 @@ def bfs_from_seed(query, graph, seed, max_development_paper=20, max_frontier_pap
         path_taxonomy
     ]
 
+# what llm_call_with_retry / ChatAgent return instead of a summary when the call failed
+FAILED_SUMMARY_PREFIXES = ("LLM summary placeholder", "Gemini API Error", "Error:")
+
+def is_failed_summary(summary):
+    return not isinstance(summary, str) or summary.strip().startswith(FAILED_SUMMARY_PREFIXES)
+
+def checkpoint_version(*settings):
+    """Short hash of everything that shapes a summary (model, prompts, limits), appended to checkpoint keys."""
+    return hashlib.md5(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()[:8]
+
+def run_with_checkpoints(items, worker, checkpoint_dir, max_workers=Config.SUMMARY_WORKERS, failed=None):
+    """
+    Run worker(arg) for every (key, arg) in `items` on a bounded thread pool and return the
+    results in input order. Each result is saved to `checkpoint_dir/<key>.json` as soon as it
+    finishes, and loaded instead of recomputed on the next run, so a crash only loses the
+    items that were in flight. A result for which `failed(result)` is true (a placeholder or
+    error string) is returned as is but not saved, so the pipeline goes on and the next run
+    retries that item.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def run_item(key, arg):
+        checkpoint_path = os.path.join(checkpoint_dir, f"{key}.json")
+        if os.path.exists(checkpoint_path):
+            try:
+                with open(checkpoint_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring broken checkpoint {checkpoint_path}: {e}")
+        result = worker(arg)
+        if failed is not None and failed(result):
+            print(f"LLM summary failed for {key}: keeping the placeholder, not checkpointed, the next run retries it")
+            return result
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, checkpoint_path)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [executor.submit(run_item, key, arg) for key, arg in items]
+        return [future.result() for future in futures]
+
+def summarize_communities(query, G, communities, checkpoint_dir, max_workers=Config.SUMMARY_WORKERS):
+    """summarize_community for every Leiden community concurrently, keyed as in communities_summary.json."""
+    version = checkpoint_version(query, Config.DEFAULT_GEMINI_MODEL, prompt_helper.COMMUNITY_PROMPT, Config.MAX_CONTEXT_PAPERS)
+    items = [
+        (f"community_{hashlib.md5(','.join(sorted(map(str, community))).encode()).hexdigest()[:12]}_{version}", community)
+        for community in communities
+    ]
+    results = run_with_checkpoints(
+        items, lambda community: list(summarize_community(query, G, community)), checkpoint_dir, max_workers,
+        failed=lambda result: is_failed_summary(result[0])
+    )
+    community_summaries = {}
+    for i, (summary, papers) in enumerate(results):
+        community_summaries[f"community_{i}"] = {
+            "summary": summary,
+            "papers": papers
+        }
+    return community_summaries
+
+def summarize_seed_directions(query, G, seeds, checkpoint_dir, max_workers=Config.SUMMARY_WORKERS,
+                              max_development_paper=Config.MAX_DEVELOPMENT_PAPERS, max_frontier_paper=Config.MAX_FRONTIER_PAPERS):
+    """
+    bfs_from_seed for every layer-1 seed concurrently.
+    Returns (all_text, all_json, all_paths) as written to layer1_seed_taxonomy.txt / .json.
+    """
+    version = checkpoint_version(query, Config.DEFAULT_GEMINI_MODEL, prompt_helper.BFS_PROMPT_1_touch, prompt_helper.BFS_PROMPT_2_touch,
+                                 Config.MAX_CONTEXT_PAPERS, max_development_paper, max_frontier_paper)
+    items = [(f"seed_{re.sub(r'[^A-Za-z0-9_-]', '_', str(seed))}_{version}", seed) for seed in seeds]
+    results = run_with_checkpoints(
+        items,
+        lambda seed: bfs_from_seed(query, G, seed, max_development_paper=max_development_paper, max_frontier_paper=max_frontier_paper),
+        checkpoint_dir, max_workers,
+        # result[5] / result[6]: layer-2 and path taxonomy summaries
+        failed=lambda result: any(summary is not None and is_failed_summary(summary) for summary in result[5:7])
+    )
+    all_text = []
+    all_json = {}
+    all_paths = []
+    for seed, (paper_infos, path, layer1_papers, layer2_papers, layer3_papers, layer2_summary, summary) in zip(seeds, results):
+        all_paths.extend(path)
+        seed_title = G.nodes[seed].get('title', '')
+        all_text.append(f"Seed: {seed_title}\nDevelopment direction taxonomy summary:\n{summary}\nPath: {path}\n")
+        all_json[seed] = {"seed_title": seed_title, "summary": summary, "path": path, "layer1_papers": layer1_papers, "layer2_papers": layer2_papers, "layer3_papers": layer3_papers, "layer2_summary": layer2_summary}
+    return all_text, all_json, all_paths
+
 def main():
     if len(sys.argv) < 2:
         print("Usage: python scripts/traversal.py \"your research query\"")
@@ -460,6 +570,7 @@ def main():
     seed_taxonomy_output_path = f"{save_dir}/layer1_seed_taxonomy.json"
     layer_summary_output_path = f"{save_dir}/layer_method_group_summary.json"
     community_summary_output_path = f"{save_dir}/communities_summary.json"
+    checkpoint_dir = f"{save_dir}/checkpoints"
     save_outline_dir = f"paper_data/{query.replace(' ', '_').replace(':', '')}/literature_review_output{ablation_study}"
     os.makedirs(save_outline_dir, exist_ok=True)
     survey_outline_path = f"{save_outline_dir}/survey_outline{ablation_study}.json"
@@ -474,30 +585,16 @@ def main():
     print(f"Layer counts: {layer_counts}")
     # # # --- Layer 1 seed direction summaries ---
     # seeds = get_layer_seeds(G, 1)  # Only layer 1 seeds with new_direction=1
-    # all_text = []
-    # all_json = {}
-    # all_paths = []
-    # for seed in seeds:
-    #     paper_infos, path, layer1_papers, layer2_papers, layer3_papers, layer2_summary, summary = bfs_from_seed(query, G, seed, max_development_paper=20, max_frontier_paper=30)
-    #     all_paths.extend(path)
-    #     seed_title = G.nodes[seed].get('title', '')
-    #     seed_text = f"Seed: {seed_title}\nDevelopment direction taxonomy summary:\n{summary}\nPath: {path}\n"
-    #     # print(seed_text)
-    #     all_text.append(seed_text)
-    #     all_json[seed] = {"seed_title": seed_title, "summary": summary, "path": path, "layer1_papers": layer1_papers, "layer2_papers": layer2_papers, "layer3_papers": layer3_papers, "layer2_summary": layer2_summary}
+    # all_text, all_json, all_paths = summarize_seed_directions(query, G, seeds, checkpoint_dir)
     # with open(output_txt_path, "w", encoding="utf-8") as f:
     #     f.write("\n".join(all_text))
     # with open(seed_taxonomy_output_path, "w", encoding="utf-8") as f:
     #     json.dump(all_json, f, ensure_ascii=False, indent=2)
     # print(f"All layer 1 seed taxonomy summaries saved to {output_txt_path} and {seed_taxonomy_output_path}")
 
-    # # for node_id in all_paths:
-    # #     paper_attr = G.nodes[node_id]
-    # #     save_path = os.path.join(save_dir_core_paper, f"{node_id}.pdf")
-    # #     if os.path.exists(save_path):
-    # #         print(f"PDF for paper ID {node_id} already exists, skipping download.")
-    # #         continue
-    # #     download_paper(save_path, paper_attr.get('pdf_link'))
+    # # download_papers(
+    # #     [(os.path.join(save_dir_core_paper, f"{node_id}.pdf"), G.nodes[node_id].get('pdf_link')) for node_id in all_paths]
+    # # )
 
     # # --- Layer method group summaries ---
     # layer_method_group_txt = ""
@@ -525,15 +622,9 @@ def main():
     #     json.dump(layer_method_group_json, f, ensure_ascii=False, indent=2)
     # print(f"Layer method group summaries saved to {layer_summary_output_path}")
 
-    community_summaries = {}
     ls = Leiden_summarizer(graph_path)
-    communities = ls.leiden_algorithm()
-    for i, community in enumerate(communities):
-        summary, papers = summarize_community(query, G, community)
-        community_summaries[f"community_{i}"] = {
-            "summary": summary,
-            "papers": papers
-        }
+    communities = ls.leiden_algorithm(sweep=Config.LEIDEN_SWEEP)
+    community_summaries = summarize_communities(query, G, communities, checkpoint_dir)
     with open(community_summary_output_path, "w", encoding="utf-8") as f:
         json.dump(community_summaries, f, ensure_ascii=False, indent=2)
     print(f"Layer method group summaries saved to {community_summary_output_path}")
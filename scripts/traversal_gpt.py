@@ -5,8 +5,9 @@ import os
 from numpy import sqrt 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
 import json
-import networkx as nx
 from src.models.LLM.ChatAgent import ChatAgent
+from src.modules.preprocessor.graph_store import load_citation_graph
+from src.models.LLM.prompt_packer import pack_paper_text
 import requests
 from pdf_downloader import download_paper
 from leiden import Leiden_summarizer
@@ -37,8 +38,6 @@ class Config:
     ADVANCED_GPT_MODEL = "gpt-4o"
 # Load the graph from JSON
 def load_graph(json_path, node_info_path):
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
     with open(node_info_path, 'r', encoding='utf-8') as f:
         node_info = json.load(f)
     id2node_info = {}
@@ -47,14 +46,7 @@ def load_graph(json_path, node_info_path):
         info = node["metadata"]
         info['citation_key'] = node['citation_key']
         id2node_info[node_id] = info
-    G = nx.DiGraph()
-    for node in data['nodes']:
-        node_id = node['id']
-        info = {**node, **id2node_info[node_id]}
-        G.add_node(node_id, **info)
-    for edge in data['edges']:
-        G.add_edge(edge['source'], edge['target'], **edge)
-    return G
+    return load_citation_graph(json_path, id2node_info)
 
 # Collect papers with new_direction=1 for each layer
 def get_layer_seeds(G, layer):
@@ -73,22 +65,18 @@ def llm_call_with_retry(prompt, placeholder="LLM summary placeholder", temperatu
             print(f"Error occurred while summarizing direction: {e}")
     return summary
 def get_paper_text(paper_infos):
-    papers_text = ''
-    for info in paper_infos:
-        try:
-            if info['summary'] != info['abstract'] and info['summary'] != '':
-                papers_text += f"[{info['citation_key']}] {info['title']} ({info['year']})\nSummary: {info['summary']}\n\n"
-        except: papers_text += f"[{info['citation_key']}] {info['title']} ({info['year']})\nSummary: {info['abstract']}\n\n"
-    return papers_text
+    # at most MAX_CONTEXT_PAPERS papers, within the model's token budget (summary -> abstract -> title);
+    # returns (text, number of papers in it)
+    return pack_paper_text(paper_infos, model=Config.GPT_MODEL, max_papers=Config.MAX_CONTEXT_PAPERS)
 # Call Gemini LLM to summarize
 def summarize_development_path(query,paper_infos, path, previous_context=''):
     # Compose a prompt for taxonomy of a direction, showing the traversal path
-    papers_text = get_paper_text(paper_infos)
+    papers_text, number_of_papers = get_paper_text(paper_infos)
     if previous_context == '':
         prompt = prompt_helper.generate_prompt(prompt_helper.BFS_PROMPT_1_touch, 
                                             paras={
                                                 'QUERY': query,
-                                                'NUMBER_OF_PAPERS': str(len(paper_infos)),
+                                                'NUMBER_OF_PAPERS': str(number_of_papers),
                                                 'PAPER_INFO': papers_text,
                                                 # 'PREVIOUS_CONTEXT': ("PREVIOUS CONTEXT:" + chr(10) + previous_context + chr(10)) if previous_context else ""                
                                                 })
@@ -96,7 +84,7 @@ def summarize_development_path(query,paper_infos, path, previous_context=''):
         prompt = prompt_helper.generate_prompt(prompt_helper.BFS_PROMPT_2_touch, 
                                             paras={
                                                 'QUERY': query,
-                                                'NUMBER_OF_PAPERS': str(len(paper_infos)),
+                                                'NUMBER_OF_PAPERS': str(number_of_papers),
                                                 'PAPER_INFO': papers_text,
                                                 'PREVIOUS_CONTEXT': ("PREVIOUS CONTEXT:" + chr(10) + previous_context + chr(10)) if previous_context else ""                
                                                 })
@@ -129,11 +117,13 @@ def summarize_layer_method_groups(query, G, layer):
             'abstract': attr.get('abstract', ''),
             'summary': attr.get('summary', ''),
             'year': attr.get('year', 0),
-            'citation_key': attr.get('citation_key', '')
+            'citation_key': attr.get('citation_key', ''),
+            'citation_count': attr.get('citation_count', 0),
+            'layer': attr.get('layer')
         })
     # Compose prompt for LLM
     # layer_desc = {1: 'foundational papers', 2: 'development papers', 3: 'recent and trending papers'}
-    papers_info = get_paper_text(infos)
+    papers_info, _ = get_paper_text(infos)
     # prompt = prompt_helper.generate_prompt(prompt_helper.LAYER_PROMPT, 
     #                                        paras={
     #                                            'QUERY': query,
@@ -167,10 +157,12 @@ def summarize_community(query, G, papers):
             'abstract': attr.get('abstract', ''),
             'summary': attr.get('summary', ''),
             'year': attr.get('year', 0), 
-            'citation_key': attr.get('citation_key', '')
+            'citation_key': attr.get('citation_key', ''),
+            'citation_count': attr.get('citation_count', 0),
+            'layer': attr.get('layer')
         })
     # Compose prompt for LLM
-    paper_info = get_paper_text(infos)
+    paper_info, _ = get_paper_text(infos)
     prompt = prompt_helper.generate_prompt(prompt_helper.COMMUNITY_PROMPT,
                                            paras={
                                                'QUERY': query,
@@ -331,6 +323,7 @@ def bfs_from_seed(query, graph, seed, max_development_paper=20, max_frontier_pap
     info = []
     path = []
     queue = deque()
+    edge_weights = {}  # node -> weight of the edge it was reached by, used to rank prompt papers
     
     # Separate papers by layer
     layer1_papers = []
@@ -352,7 +345,9 @@ def bfs_from_seed(query, graph, seed, max_development_paper=20, max_frontier_pap
         'abstract': attr.get('abstract', ''),
         'summary': attr.get('summary', ''),
         'year': attr.get('year', 0), 
-        'citation_key': attr.get('citation_key', '')
+        'citation_key': attr.get('citation_key', ''),
+        'citation_count': attr.get('citation_count', 0),
+        'layer': attr.get('layer')
     }
     info.append(paper_info)
     layer1_papers.append(paper_info)
@@ -366,6 +361,7 @@ def bfs_from_seed(query, graph, seed, max_development_paper=20, max_frontier_pap
         layer = attr.get('layer', None)
         if neighbor not in visited and layer == 2:
             visited.add(neighbor)
+            edge_weights[neighbor] = graph.edges[seed, neighbor].get('weight', 0)
             queue.append((neighbor, 2))  # All these neighbors are at layer 2
     
     # Process layers 2 and 3
@@ -380,7 +376,10 @@ def bfs_from_seed(query, graph, seed, max_development_paper=20, max_frontier_pap
             'abstract': attr.get('abstract', ''),
             'summary': attr.get('summary', ''),
             'year': attr.get('year', 0),
-            'citation_key': attr.get('citation_key', '')
+            'citation_key': attr.get('citation_key', ''),
+            'citation_count': attr.get('citation_count', 0),
+            'layer': attr.get('layer'),
+            'weight': edge_weights.get(node, 0)
         }
         info.append(paper_info)
         
@@ -402,6 +401,7 @@ def bfs_from_seed(query, graph, seed, max_development_paper=20, max_frontier_pap
                 layer = attr.get('layer', None)
                 if neighbor not in visited and layer == 3:
                     visited.add(neighbor)
+                    edge_weights[neighbor] = graph.edges[node, neighbor].get('weight', 0)
                     queue.append((neighbor, 3))  # These neighbors are at layer 3
         
         # Process layer 3 nodes
@@ -492,13 +492,9 @@ def main():
     #     json.dump(all_json, f, ensure_ascii=False, indent=2)
     # print(f"All layer 1 seed taxonomy summaries saved to {output_txt_path} and {seed_taxonomy_output_path}")
 
-    # # for node_id in all_paths:
-    # #     paper_attr = G.nodes[node_id]
-    # #     save_path = os.path.join(save_dir_core_paper, f"{node_id}.pdf")
-    # #     if os.path.exists(save_path):
-    # #         print(f"PDF for paper ID {node_id} already exists, skipping download.")
-    # #         continue
-    # #     download_paper(save_path, paper_attr.get('pdf_link'))
+    # # download_papers(
+    # #     [(os.path.join(save_dir_core_paper, f"{node_id}.pdf"), G.nodes[node_id].get('pdf_link')) for node_id in all_paths]
+    # # )
 
     # # --- Layer method group summaries ---
     # layer_method_group_txt = ""
@@ -13,19 +13,49 @@ from pathlib import Path
 # Load from .env file
 load_dotenv(Path(".env"))
 
+## API keys: read and validated on first use (settings.TOKEN, ...), not at import,
+## so --help and steps that never call a provider start without them
+class Settings:
+    Keys = {
+        "TOKEN": ("OPENAI_API_KEY", "OPENAI_API_KEY not found in environment variables"),
+        "GEMINI_API_KEY": ("API_KEY", "API_KEY (Gemini) not found in environment variables"),
+        "EMBED_TOKEN": ("EMBED_TOKEN", "EMBED_TOKEN not found in environment variables"),
+        "SEMANTIC_SCHOLAR_API_KEY": ("SEMANTIC_SCHOLAR_API_KEY", "SEMANTIC_SCHOLAR_API_KEY not found in environment variables"),
+    }
+
+    def __getattr__(self, name):
+        if name not in self.Keys:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        env_name, message = self.Keys[name]
+        value = os.getenv(env_name)
+        if not value:
+            raise ValueError(message)
+        setattr(self, name, value)  # later reads skip __getattr__
+        return value
+
+    def require(self, *names):
+        """Validate the given keys now, raising ValueError for the first one missing."""
+        for name in names:
+            getattr(self, name)
+
+
+settings = Settings()
+
+
+def __getattr__(name):
+    # `from src.configs.config import TOKEN` still works, validating the key at that point
+    if name in Settings.Keys:
+        return getattr(settings, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # OpenAI Configuration
 REMOTE_URL = "https://api.openai.com/v1/chat/completions"
-TOKEN = os.getenv("OPENAI_API_KEY")
-if not TOKEN:
-    raise ValueError("OPENAI_API_KEY not found in environment variables")
 DEFAULT_CHATAGENT_MODEL = "gpt-4o-mini"
 # ADVANCED_CHATAGENT_MODEL = "gpt-4o"
 
 # Gemini Configuration
-GEMINI_API_KEY = os.getenv("API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("API_KEY (Gemini) not found in environment variables") 
 GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+GEMINI_CACHE_URL = "https://generativelanguage.googleapis.com/v1beta/cachedContents"
 DEFAULT_GEMINI_MODEL = "gemini-2.5-flash"
 ADVANCED_GEMINI_MODEL = "gemini-2.5-pro"
 
@@ -62,9 +92,6 @@ DEFAULT_EMBED_LOCAL_MODEL = "DEFAULT_EMBED_LOCAL_MODEL"
 ## for embedding model
 DEFAULT_EMBED_ONLINE_MODEL = "BAAI/bge-base-en-v1.5"
 EMBED_REMOTE_URL = "https://api.siliconflow.cn/v1/embeddings"
-EMBED_TOKEN = os.getenv("EMBED_TOKEN")
-if not EMBED_TOKEN:
-    raise ValueError("EMBED_TOKEN not found in environment variables")
 SPLITTER_WINDOW_SIZE = 6
 SPLITTER_CHUNK_SIZE = 2048
 
@@ -86,6 +113,63 @@ DEFAULT_PAPER_POOL_LIMIT = 1024
 DEFAULT_LLAMAINDEX_OPENAI_MODEL = "gpt-4o"
 # DEFAULT_OPENAI_MODEL = "gpt-3.5-turbo"
 CHAT_AGENT_WORKERS = 4
+ASYNC_CHAT_CONCURRENCY = 64  # in-flight requests for ChatAgent.abatch_chat
+
+## HTTP transport: one keep-alive connection pool shared by all LLM / embedding clients
+HTTP_POOL_CONNECTIONS = 10  # number of hosts whose pools are kept alive
+HTTP_POOL_MAXSIZE = 16  # default connections per host, >= the largest batch worker count
+HTTP_HOST_POOL_MAXSIZE = {
+    "api.openai.com": 32,
+    "generativelanguage.googleapis.com": 32,
+    "api.siliconflow.cn": 16,
+}
+HTTP_CONNECT_TIMEOUT = 10  # seconds
+HTTP_READ_TIMEOUT = 600  # seconds, long generations can take minutes
+
+## Rate limits per provider / model, shared by every client through RateScheduler
+## rpm = requests per minute, tpm = tokens per minute (None = not limited), "*" = any other model
+RATE_LIMITS = {
+    "openai": {
+        "gpt-4o-mini": {"rpm": 5000, "tpm": 2_000_000},
+        "gpt-4o": {"rpm": 5000, "tpm": 800_000},
+        "*": {"rpm": 500, "tpm": 200_000},
+    },
+    "gemini": {
+        "gemini-2.5-flash": {"rpm": 1000, "tpm": 1_000_000},
+        "gemini-2.5-pro": {"rpm": 150, "tpm": 2_000_000},
+        "*": {"rpm": 150, "tpm": 1_000_000},
+    },
+    "siliconflow": {"*": {"rpm": 2000, "tpm": 500_000}},
+    "semantic_scholar": {"*": {"rpm": 60, "tpm": None}},  # 1 request / second with an API key
+}
+RATE_LIMIT_INITIAL_CONCURRENCY = 8  # AIMD window each budget starts with
+RATE_LIMIT_MAX_CONCURRENCY = 64
+RATE_LIMIT_DEFAULT_BACKOFF = 5  # seconds to pause a budget on a 429 without Retry-After
+
+## Paper-context prompts: token budget of the packed paper block per model ("*" = any other model)
+PROMPT_PAPER_TOKEN_BUDGET = {
+    "gpt-4o-mini": 16000,
+    "gpt-4o": 16000,
+    "gemini-2.5-flash": 32000,
+    "gemini-2.5-pro": 32000,
+    "*": 12000,
+}
+PROMPT_TOKEN_CACHE_SIZE = 100_000  # token counts of paper snippets kept in memory
+
+## LLM response cache (opt-in, set LLM_CACHE_ENABLED=1 in .env)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "0").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+## Provider-side context caching of long, repeated prompt prefixes (cached_prefix in ChatAgent)
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+GEMINI_CONTEXT_CACHE_TTL = 3600  # seconds a Gemini cachedContent lives (storage is billed per hour)
+# Gemini rejects explicit caches below these sizes (tokens); shorter prefixes are sent inline
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = {
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 4096,
+    "*": 4096,
+}
+OPENAI_PROMPT_CACHE_KEY = True  # send prompt_cache_key so requests sharing a prefix hit the same cache
 
 ## survey generation
 COARSE_GRAINED_TOPK = 200
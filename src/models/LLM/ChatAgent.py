@@ -3,7 +3,12 @@
 1.发送本地图片： https://www.cnblogs.com/Vicrooor/p/18227547
 """
 
+import asyncio
+import base64
 import fcntl
+import hashlib
+from contextlib import asynccontextmanager
+import aiohttp
 import requests
 import json
 import pickle
@@ -12,6 +17,7 @@ import os
 
 from tenacity import (
     retry,
+    retry_if_exception,
     retry_if_exception_type,
     stop_after_attempt,
     wait_exponential,
@@ -22,27 +28,52 @@ from pathlib import Path
 from src.configs.config import (
     REMOTE_URL,
     LOCAL_URL,
-    TOKEN,
     BASE_DIR,
     DEFAULT_CHATAGENT_MODEL,
     CHAT_AGENT_WORKERS,
-    GEMINI_API_KEY,
+    ASYNC_CHAT_CONCURRENCY,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
     GEMINI_URL,
+    GEMINI_CACHE_URL,
     DEFAULT_GEMINI_MODEL,
     ADVANCED_GEMINI_MODEL,
     LLM_PROVIDER,
+    LLM_CACHE_ENABLED,
+    CONTEXT_CACHE_ENABLED,
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS,
+    OPENAI_PROMPT_CACHE_KEY,
     get_equivalent_model,
+    settings,
 )
 from src.configs.constants import OUTPUT_DIR
 
 from src.configs.logger import get_logger
+from src.models.LLM import http_client
 from src.models.LLM.utils import encode_image
+from src.models.LLM.response_cache import ResponseCache
+from src.models.LLM.context_cache import ContextCache
+from src.models.LLM.rate_limiter import (
+    RateScheduler,
+    estimate_tokens,
+    is_transient_error,
+    wait_unless_rate_limited,
+)
 from src.models.monitor.token_monitor import TokenMonitor
 
 logger = get_logger("src.models.LLM.ChatAgent")
 logger.debug(f"ChatAgent pid={os.getpid()}")
 
 
+class StaleContextCacheError(requests.HTTPError):
+    """the referenced Gemini cachedContent expired or was deleted; the retry sends the prefix again."""
+
+
+def _is_retryable_gemini_error(exc: BaseException) -> bool:
+    """429 / 5xx / network errors and stale context caches; other 4xx fail at once."""
+    return isinstance(exc, StaleContextCacheError) or is_transient_error(exc)
+
+
 class ChatAgent:
     Cost_file = Path(f"{OUTPUT_DIR}/tmp/cost.txt")
     Request_stats_file = Path(f"{OUTPUT_DIR}/tmp/request_stats.txt")
@@ -52,37 +83,80 @@ class ChatAgent:
     def __init__(
         self,
         token_monitor: TokenMonitor | None = None,
-        token: str = TOKEN,
+        token: str | None = None,
         remote_url: str = REMOTE_URL,
         local_url: str = LOCAL_URL,
+        response_cache: ResponseCache | None = None,
+        scheduler: RateScheduler | None = None,
+        context_cache: ContextCache | None = None,
     ) -> None:
         self.remote_url = remote_url
-        self.token = token
+        self._token = token
         self.local_url = local_url
-        self.header = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {token}",
-        }
         self.batch_workers = CHAT_AGENT_WORKERS
         self.token_monitor = token_monitor
+        # on-disk response cache, opt-in via LLM_CACHE_ENABLED or an explicit instance
+        if response_cache is None and LLM_CACHE_ENABLED:
+            response_cache = ResponseCache.default()
+        self.response_cache = response_cache
+        # RPM/TPM budgets and AIMD concurrency shared with every other client in the process
+        self.scheduler = scheduler or RateScheduler.default()
+        # provider-side caches of long prompt prefixes (`cached_prefix`), shared by the process
+        self.context_cache = context_cache or ContextCache.default()
 
-    @retry(
-        stop=stop_after_attempt(30),
-        wait=wait_exponential(min=1, max=300),
-        retry=retry_if_exception_type(requests.RequestException),
-    )
-    def remote_chat(
+    @property
+    def token(self) -> str:
+        """OpenAI key, defaults to settings.TOKEN (validated on first OpenAI request, not at init)."""
+        return self._token or settings.TOKEN
+
+    @property
+    def header(self) -> dict:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.token}",
+        }
+
+    @staticmethod
+    def _usage_tokens(response_text: str) -> int | None:
+        """total tokens billed for a response (OpenAI `usage` or Gemini `usageMetadata`)."""
+        try:
+            res = json.loads(response_text)
+            if "usage" in res:
+                return res["usage"]["total_tokens"]
+            if "usageMetadata" in res:
+                return res["usageMetadata"].get("promptTokenCount", 0)
+        except Exception:
+            pass
+        return None
+
+    def _cache_lookup(
+        self,
+        provider: str,
+        model: str,
+        temperature: float,
+        text_content: str,
+        image_urls: list[str] = None,
+        local_images: list[Path] = None,
+        bypass_cache: bool = False,
+    ) -> tuple[str | None, str | None]:
+        """return (cache_key, cached_response); cache_key is None when caching is off."""
+        if self.response_cache is None or bypass_cache:
+            return None, None
+        cache_key = ResponseCache.make_key(
+            provider, model, temperature, text_content, image_urls, local_images
+        )
+        return cache_key, self.response_cache.get(cache_key)
+
+    def _build_openai_payload(
         self,
         text_content: str,
         image_urls: list[str] = None,
         local_images: list[Path] = None,
         temperature: float = 0.5,
-        debug: bool = False,
         model=DEFAULT_CHATAGENT_MODEL,
-    ) -> str:
-        """chat with remote LLM, return result."""
-        url = self.remote_url
-        header = self.header
+        prompt_cache_key: str | None = None,
+    ) -> dict:
+        """request body for the OpenAI chat completions API."""
         # text content
         messages = [{"role": "user", "content": text_content}]
         # insert image urls ----
@@ -125,30 +199,25 @@ class ChatAgent:
             "temperature": temperature,
             "max_tokens": 4096  # Set reasonable default for OpenAI API
         }
+        if prompt_cache_key is not None:
+            # routes requests with the same prefix to the same prompt cache
+            payload["prompt_cache_key"] = prompt_cache_key
+        return payload
 
-        response = requests.post(url, headers=header, json=payload)
-
-        if response.status_code != 200:
-            logger.error(
-                f"chat response code: {response.status_code}\n{response.text[:500]}, retrying..."
-            )
-            status_code = 0 if response.status_code != 200 else 1
-
-            # 加了线程锁
-            self.update_record(
-                status_code=status_code,
-                response_code=response.status_code,
-                request=text_content,
-                response=response.text,
-            )
-            response.raise_for_status()
+    def _parse_openai_response(
+        self, response_text: str, model: str, cache_key: str | None = None
+    ) -> str:
+        """extract the reply text, record token usage and fill the cache."""
         try:
-            res = json.loads(response.text)
+            res = json.loads(response_text)
             res_text = res["choices"][0]["message"]["content"]
             input_tokens=res["usage"]["prompt_tokens"]
             output_tokens=res["usage"]["completion_tokens"]
             print("INPUT TOKEN: ", input_tokens)
             print("OUTPUT TOKEN: ", output_tokens)
+            cached_tokens = (res["usage"].get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+            if cached_tokens:
+                logger.debug(f"{model}: {cached_tokens}/{input_tokens} input tokens from the prompt cache")
             # 更新总开销
             # token monitor
             if self.token_monitor:
@@ -157,9 +226,77 @@ class ChatAgent:
                     input_tokens=res["usage"]["prompt_tokens"],
                     output_tokens=res["usage"]["completion_tokens"],
                 )
+            if cache_key is not None:
+                self.response_cache.put(cache_key, res_text)
         except Exception as e:
             res_text = f"Error: {e}"
             logger.error(f"There is an error: {e}")
+        return res_text
+
+    @retry(
+        stop=stop_after_attempt(30),
+        wait=wait_unless_rate_limited(wait_exponential(min=1, max=300)),
+        retry=retry_if_exception_type(requests.RequestException),
+    )
+    def remote_chat(
+        self,
+        text_content: str,
+        image_urls: list[str] = None,
+        local_images: list[Path] = None,
+        temperature: float = 0.5,
+        debug: bool = False,
+        model=DEFAULT_CHATAGENT_MODEL,
+        bypass_cache: bool = False,
+        cached_prefix: str | None = None,
+    ) -> str:
+        """
+        chat with remote LLM, return result.
+        `cached_prefix` is sent before `text_content`; OpenAI caches repeated prefixes
+        of 1024+ tokens on its own, prompt_cache_key keeps them on the same cache.
+        """
+        if cached_prefix:
+            text_content = cached_prefix + text_content
+        cache_key, cached = self._cache_lookup(
+            "openai", model, temperature, text_content, image_urls, local_images,
+            bypass_cache=bypass_cache or debug,
+        )
+        if cached is not None:
+            return cached
+        url = self.remote_url
+        header = self.header
+        prompt_cache_key = None
+        if cached_prefix and CONTEXT_CACHE_ENABLED and OPENAI_PROMPT_CACHE_KEY:
+            prompt_cache_key = hashlib.sha256(cached_prefix.encode("utf-8")).hexdigest()[:32]
+        payload = self._build_openai_payload(
+            text_content, image_urls, local_images, temperature, model, prompt_cache_key
+        )
+
+        # openai counts max_tokens against the TPM quota up front
+        tokens = estimate_tokens(text_content) + payload["max_tokens"]
+        with self.scheduler.slot("openai", model, tokens) as slot:
+            response = http_client.post(url, headers=header, json=payload)
+            slot.observe(
+                response.status_code,
+                response.headers,
+                response.text,
+                self._usage_tokens(response.text),
+            )
+
+        if response.status_code != 200:
+            logger.error(
+                f"chat response code: {response.status_code}\n{response.text[:500]}, retrying..."
+            )
+            status_code = 0 if response.status_code != 200 else 1
+
+            # 加了线程锁
+            self.update_record(
+                status_code=status_code,
+                response_code=response.status_code,
+                request=text_content,
+                response=response.text,
+            )
+            response.raise_for_status()
+        res_text = self._parse_openai_response(response.text, model, cache_key)
 
         status_code = 0 if response.status_code != 200 else 1
         self.update_record(
@@ -272,7 +409,7 @@ class ChatAgent:
             }
         )
         headers = {"Content-Type": "application/json"}
-        res = requests.request("POST", self.local_url, headers=headers, data=payload)
+        res = http_client.post(self.local_url, headers=headers, data=payload)
         if res.status_code != 200:
             logger.info("chat response code: {}".format(res.status_code), query[:20])
             return "chat response code: {}".format(res.status_code)
@@ -320,41 +457,28 @@ class ChatAgent:
         if stats_file.exists():
             logger.info(f"remove {stats_file}.")
 
-    @retry(
-        stop=stop_after_attempt(30),
-        wait=wait_exponential(min=1, max=300),
-        retry=retry_if_exception_type(requests.RequestException),
-    )
-    def gemini_chat(
+    def _build_gemini_payload(
         self,
         text_content: str,
-        image_urls: list[str] = None,
+        image_datas: list[str] = None,
         local_images: list[Path] = None,
         temperature: float = 0.5,
-        debug: bool = False,
-        model: str = DEFAULT_GEMINI_MODEL,
-    ) -> str:
-        """Chat with Gemini API, return result."""
-        url = GEMINI_URL.format(model=model)
-        headers = {
-            "Content-Type": "application/json",
-            "x-goog-api-key": GEMINI_API_KEY,
-        }
-
+        cached_content: str | None = None,
+    ) -> dict:
+        """request body for the Gemini generateContent API; `cached_content` is the prefix cache name."""
         # Prepare content parts
         parts = [{"text": text_content}]
 
-        # Add image URLs if provided
-        if image_urls is not None and isinstance(image_urls, list) and len(image_urls) > 0:
-            for url in image_urls:
-                parts.append(
-                    {
-                        "inline_data": {
-                            "mime_type": "image/jpeg",
-                            "data": self._get_image_data_from_url(url),
-                        }
+        # Add images fetched from URLs (already base64 encoded)
+        for image_data in image_datas or []:
+            parts.append(
+                {
+                    "inline_data": {
+                        "mime_type": "image/jpeg",
+                        "data": image_data,
                     }
-                )
+                }
+            )
 
         # Add local images if provided
         if local_images is not None and isinstance(local_images, list) and len(local_images) > 0:
@@ -370,40 +494,62 @@ class ChatAgent:
                 )
 
         payload = {
-            "contents": [{"parts": parts}],
+            "contents": [{"role": "user", "parts": parts}],
             "generationConfig": {
                 "temperature": temperature,
                 "maxOutputTokens": 102400,  # Increased from 4096 to reduce token limit issues
             },
         }
+        if cached_content is not None:
+            payload["cachedContent"] = cached_content
+        return payload
 
-        response = requests.post(url, headers=headers, json=payload)
-        
-        # Debug logging for problematic responses
+    def _create_gemini_cache(self, model: str, prefix: str, ttl: int, headers: dict) -> str | None:
+        """upload `prefix` as a Gemini cachedContent; None if Gemini refuses to cache it."""
+        payload = {
+            "model": f"models/{model}",
+            "contents": [{"role": "user", "parts": [{"text": prefix}]}],
+            "ttl": f"{ttl}s",
+        }
+        with self.scheduler.slot("gemini", model, estimate_tokens(prefix)) as slot:
+            response = http_client.post(GEMINI_CACHE_URL, headers=headers, json=payload)
+            slot.observe(response.status_code, response.headers, response.text)
         if response.status_code == 200:
-            try:
-                debug_res = json.loads(response.text)
-                if "error" in debug_res or "candidates" not in debug_res:
-                    logger.debug(f"Gemini response debug: {response.text[:1000]}")
-            except:
-                logger.debug(f"Gemini response debug (invalid JSON): {response.text[:500]}")
+            return response.json().get("name")
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()  # retried by gemini_chat
+        logger.warning(
+            f"Gemini context cache refused ({response.status_code}): {response.text[:300]}"
+        )
+        return None
 
-        if response.status_code != 200:
-            logger.error(
-                f"Gemini API response code: {response.status_code}\n{response.text[:500]}, retrying..."
-            )
-            status_code = 0 if response.status_code != 200 else 1
+    def release_context_caches(self) -> None:
+        """delete the Gemini caches created by this process instead of waiting for their TTL."""
+        headers = {"x-goog-api-key": settings.GEMINI_API_KEY}
+        for name in self.context_cache.release():
+            try:
+                http_client.request("DELETE", f"{GEMINI_CACHE_URL.rsplit('/', 1)[0]}/{name}", headers=headers)
+            except requests.RequestException as e:
+                logger.warning(f"Failed to delete Gemini context cache {name}: {e}")
 
-            self.update_record(
-                status_code=status_code,
-                response_code=response.status_code,
-                request=text_content,
-                response=response.text,
-            )
-            response.raise_for_status()
+    def _parse_gemini_response(
+        self, response_text: str, model: str, cache_key: str | None = None,
+        allow_truncated: bool = False,
+    ) -> str:
+        """
+        extract the reply text from a 200 response, record token usage and fill the cache.
+        With `allow_truncated`, a MAX_TOKENS reply returns its partial text (never cached).
+        """
+        # Debug logging for problematic responses
+        try:
+            debug_res = json.loads(response_text)
+            if "error" in debug_res or "candidates" not in debug_res:
+                logger.debug(f"Gemini response debug: {response_text[:1000]}")
+        except:
+            logger.debug(f"Gemini response debug (invalid JSON): {response_text[:500]}")
 
         try:
-            res = json.loads(response.text)
+            res = json.loads(response_text)
             
             # Check if response has error
             if "error" in res:
@@ -414,7 +560,13 @@ class ChatAgent:
                 
                 # Check finish reason first
                 finish_reason = candidate.get("finishReason", "")
-                if finish_reason == "MAX_TOKENS":
+                partial_text = "".join(
+                    part.get("text", "") for part in candidate.get("content", {}).get("parts", [])
+                )
+                if finish_reason == "MAX_TOKENS" and allow_truncated and partial_text:
+                    res_text = partial_text
+                    logger.warning(f"Gemini response hit token limit, returning {len(partial_text)} chars of partial text")
+                elif finish_reason == "MAX_TOKENS":
                     res_text = "Gemini API Error: Response truncated due to maximum token limit. Consider reducing input size or increasing maxOutputTokens."
                     logger.warning(f"Gemini response hit token limit: {finish_reason}")
                 elif finish_reason in ["SAFETY", "RECITATION"]:
@@ -425,6 +577,8 @@ class ChatAgent:
                     part = candidate["content"]["parts"][0]
                     if "text" in part:
                         res_text = part["text"]
+                        if cache_key is not None:
+                            self.response_cache.put(cache_key, res_text)
                     else:
                         res_text = f"Gemini API Error: No text in response part - {part}"
                         logger.error(f"No text in Gemini response part: {part}")
@@ -442,6 +596,9 @@ class ChatAgent:
                 res_text = f"Gemini API Error: No candidates in response - {res}"
                 logger.error(f"No candidates in Gemini response: {res}")
 
+            cached_tokens = res.get("usageMetadata", {}).get("cachedContentTokenCount", 0)
+            if cached_tokens:
+                logger.debug(f"{model}: {cached_tokens} input tokens from the context cache")
             # Token monitoring for Gemini (if available)
             if self.token_monitor and "usageMetadata" in res:
                 usage = res["usageMetadata"]
@@ -451,18 +608,104 @@ class ChatAgent:
                     output_tokens=usage.get("candidatesTokenCount", 0),
                 )
         except json.JSONDecodeError as e:
-            res_text = f"Gemini API Error: Invalid JSON response - {response.text[:200]}"
+            res_text = f"Gemini API Error: Invalid JSON response - {response_text[:200]}"
             logger.error(f"Gemini API JSON decode error: {e}")
         except Exception as e:
             res_text = f"Gemini API Error: {e}"
             logger.error(f"Gemini API error: {e}")
-            logger.error(f"Full response: {response.text[:500]}")
+            logger.error(f"Full response: {response_text[:500]}")
+        return res_text
+
+    @retry(
+        stop=stop_after_attempt(30),
+        wait=wait_unless_rate_limited(wait_exponential(min=1, max=300)),
+        retry=retry_if_exception(_is_retryable_gemini_error),
+        reraise=True,
+    )
+    def gemini_chat(
+        self,
+        text_content: str,
+        image_urls: list[str] = None,
+        local_images: list[Path] = None,
+        temperature: float = 0.5,
+        debug: bool = False,
+        model: str = DEFAULT_GEMINI_MODEL,
+        bypass_cache: bool = False,
+        cached_prefix: str | None = None,
+        allow_truncated: bool = False,
+    ) -> str:
+        """
+        Chat with Gemini API, return result.
+        A long `cached_prefix` is uploaded once as a cachedContent and referenced by every
+        request that starts with it; `text_content` is the part that follows the prefix.
+        `allow_truncated` returns the partial text of a reply cut at maxOutputTokens
+        instead of an error string.
+        """
+        full_text = (cached_prefix or "") + text_content
+        cache_key, cached = self._cache_lookup(
+            "gemini", model, temperature, full_text, image_urls, local_images,
+            bypass_cache=bypass_cache or debug,
+        )
+        if cached is not None:
+            return cached
+        url = GEMINI_URL.format(model=model)
+        headers = {
+            "Content-Type": "application/json",
+            "x-goog-api-key": settings.GEMINI_API_KEY,
+        }
+
+        cached_content = None
+        min_tokens = GEMINI_CONTEXT_CACHE_MIN_TOKENS.get(model, GEMINI_CONTEXT_CACHE_MIN_TOKENS["*"])
+        if cached_prefix and CONTEXT_CACHE_ENABLED and estimate_tokens(cached_prefix) >= min_tokens:
+            cached_content = self.context_cache.get_or_create(
+                model, cached_prefix,
+                lambda ttl: self._create_gemini_cache(model, cached_prefix, ttl, headers),
+            )
+
+        image_datas = [self._get_image_data_from_url(url_) for url_ in image_urls or []]
+        payload = self._build_gemini_payload(
+            text_content if cached_content else full_text,
+            image_datas, local_images, temperature, cached_content,
+        )
+
+        # gemini's TPM quota only counts input tokens
+        with self.scheduler.slot("gemini", model, estimate_tokens(full_text)) as slot:
+            response = http_client.post(url, headers=headers, json=payload)
+            slot.observe(
+                response.status_code,
+                response.headers,
+                response.text,
+                self._usage_tokens(response.text),
+            )
+
+        if response.status_code != 200:
+            logger.error(
+                f"Gemini API response code: {response.status_code}\n{response.text[:500]}, retrying..."
+            )
+            status_code = 0 if response.status_code != 200 else 1
+
+            self.update_record(
+                status_code=status_code,
+                response_code=response.status_code,
+                request=full_text,
+                response=response.text,
+            )
+            if cached_content and response.status_code in (400, 403, 404):
+                # expired or deleted cache: the retry uploads the prefix again
+                self.context_cache.invalidate(model, cached_prefix)
+                raise StaleContextCacheError(
+                    f"Gemini context cache {cached_content} rejected ({response.status_code})",
+                    response=response,
+                )
+            response.raise_for_status()
+
+        res_text = self._parse_gemini_response(response.text, model, cache_key, allow_truncated)
 
         status_code = 0 if response.status_code != 200 else 1
         self.update_record(
             status_code=status_code,
             response_code=response.status_code,
-            request=text_content,
+            request=full_text,
             response=res_text,
         )
 
@@ -473,15 +716,34 @@ class ChatAgent:
     def _get_image_data_from_url(self, url: str) -> str:
         """Helper method to get base64 encoded image data from URL."""
         try:
-            response = requests.get(url)
+            response = http_client.get(url)
             response.raise_for_status()
-            import base64
-
             return base64.b64encode(response.content).decode("utf-8")
         except Exception as e:
             logger.error(f"Failed to fetch image from URL {url}: {e}")
             return ""
 
+    @staticmethod
+    def _resolve_model(model: str | None, provider: str | None) -> str:
+        """default model for the provider, or the provider's equivalent of `model`."""
+        # Determine provider
+        # if provider is None:
+        #     provider = LLM_PROVIDER
+
+        # Determine model
+        if model is None:
+            if provider == "gemini":
+                model = DEFAULT_GEMINI_MODEL
+            else:
+                model = DEFAULT_CHATAGENT_MODEL
+        else:
+            # Convert model to appropriate provider if needed
+            if provider == "gemini" and model.startswith("gpt"):
+                model = get_equivalent_model(model, "gemini")
+            elif provider == "openai" and model.startswith("gemini"):
+                model = get_equivalent_model(model, "openai")
+        return model
+
     def chat(
         self,
         text_content: str,
@@ -491,6 +753,8 @@ class ChatAgent:
         debug: bool = False,
         model: str = None,
         provider: str = None,
+        bypass_cache: bool = False,
+        cached_prefix: str = None,
     ) -> str:
         """
         Universal chat method that routes to either OpenAI or Gemini based on configuration.
@@ -503,26 +767,13 @@ class ChatAgent:
             debug: Whether to return debug info
             model: Specific model to use (optional, will use defaults if not provided)
             provider: Force specific provider ("openai" or "gemini", optional)
+            bypass_cache: Skip the response cache for this call (optional)
+            cached_prefix: Stable content sent before text_content and cached by the provider (optional)
 
         Returns:
             Generated text response
         """
-        # Determine provider
-        # if provider is None:
-        #     provider = LLM_PROVIDER
-
-        # Determine model
-        if model is None:
-            if provider == "gemini":
-                model = DEFAULT_GEMINI_MODEL
-            else:
-                model = DEFAULT_CHATAGENT_MODEL
-        else:
-            # Convert model to appropriate provider if needed
-            if provider == "gemini" and model.startswith("gpt"):
-                model = get_equivalent_model(model, "gemini")
-            elif provider == "openai" and model.startswith("gemini"):
-                model = get_equivalent_model(model, "openai")
+        model = self._resolve_model(model, provider)
 
         # Route to appropriate method
         if provider == "gemini":
@@ -533,6 +784,8 @@ class ChatAgent:
                 temperature=temperature,
                 debug=debug,
                 model=model,
+                bypass_cache=bypass_cache,
+                cached_prefix=cached_prefix,
             )
         else:
             print("using gpt\n ======================================================\n")
@@ -543,4 +796,252 @@ class ChatAgent:
                 temperature=temperature,
                 debug=debug,
                 model=model,
+                bypass_cache=bypass_cache,
+                cached_prefix=cached_prefix,
             )
+
+    # ---------------- asyncio API ----------------
+    def _aiohttp_session(
+        self, concurrency: int = ASYNC_CHAT_CONCURRENCY, timeout: float = None
+    ) -> aiohttp.ClientSession:
+        """keep-alive aiohttp session sized for `concurrency` in-flight requests."""
+        connector = aiohttp.TCPConnector(
+            limit=concurrency, limit_per_host=concurrency, keepalive_timeout=60
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=timeout or HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT
+            ),
+        )
+
+    @asynccontextmanager
+    async def _session_scope(
+        self, session: aiohttp.ClientSession | None, timeout: float = None
+    ):
+        """reuse the caller's session, or open a short-lived one."""
+        if session is not None:
+            yield session
+        else:
+            async with self._aiohttp_session(timeout=timeout) as own_session:
+                yield own_session
+
+    async def _apost(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        headers: dict,
+        payload: dict,
+        text_content: str,
+        provider: str,
+        model: str,
+        tokens: int,
+        timeout: float = None,
+    ) -> str:
+        """POST `payload` once the scheduler admits it, return the body; non-200 raises so the retry policy applies."""
+        request_kwargs = {"headers": headers, "json": payload}
+        if timeout:
+            request_kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        async with self.scheduler.aslot(provider, model, tokens) as slot:
+            async with session.post(url, **request_kwargs) as response:
+                response_text = await response.text()
+                slot.observe(
+                    response.status,
+                    response.headers,
+                    response_text,
+                    self._usage_tokens(response_text),
+                )
+                if response.status != 200:
+                    logger.error(
+                        f"async chat response code: {response.status}\n{response_text[:500]}, retrying..."
+                    )
+                    self.update_record(
+                        status_code=0,
+                        response_code=response.status,
+                        request=text_content,
+                        response=response_text,
+                    )
+                    response.raise_for_status()
+                return response_text
+
+    @retry(
+        stop=stop_after_attempt(30),
+        wait=wait_unless_rate_limited(wait_exponential(min=1, max=300)),
+        retry=retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError)),
+    )
+    async def aremote_chat(
+        self,
+        text_content: str,
+        image_urls: list[str] = None,
+        local_images: list[Path] = None,
+        temperature: float = 0.5,
+        model=DEFAULT_CHATAGENT_MODEL,
+        session: aiohttp.ClientSession | None = None,
+        timeout: float = None,
+        bypass_cache: bool = False,
+    ) -> str:
+        """async version of `remote_chat`."""
+        cache_key, cached = self._cache_lookup(
+            "openai", model, temperature, text_content, image_urls, local_images,
+            bypass_cache=bypass_cache,
+        )
+        if cached is not None:
+            return cached
+        payload = self._build_openai_payload(
+            text_content, image_urls, local_images, temperature, model
+        )
+        async with self._session_scope(session, timeout) as session_:
+            response_text = await self._apost(
+                session_,
+                self.remote_url,
+                self.header,
+                payload,
+                text_content,
+                "openai",
+                model,
+                estimate_tokens(text_content) + payload["max_tokens"],
+                timeout,
+            )
+        res_text = self._parse_openai_response(response_text, model, cache_key)
+        self.update_record(
+            status_code=1, response_code=200, request=text_content, response=res_text
+        )
+        return res_text
+
+    async def _aget_image_data_from_url(
+        self, session: aiohttp.ClientSession, url: str
+    ) -> str:
+        try:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                return base64.b64encode(await response.read()).decode("utf-8")
+        except Exception as e:
+            logger.error(f"Failed to fetch image from URL {url}: {e}")
+            return ""
+
+    @retry(
+        stop=stop_after_attempt(30),
+        wait=wait_unless_rate_limited(wait_exponential(min=1, max=300)),
+        retry=retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError)),
+    )
+    async def agemini_chat(
+        self,
+        text_content: str,
+        image_urls: list[str] = None,
+        local_images: list[Path] = None,
+        temperature: float = 0.5,
+        model: str = DEFAULT_GEMINI_MODEL,
+        session: aiohttp.ClientSession | None = None,
+        timeout: float = None,
+        bypass_cache: bool = False,
+    ) -> str:
+        """async version of `gemini_chat`."""
+        cache_key, cached = self._cache_lookup(
+            "gemini", model, temperature, text_content, image_urls, local_images,
+            bypass_cache=bypass_cache,
+        )
+        if cached is not None:
+            return cached
+        headers = {
+            "Content-Type": "application/json",
+            "x-goog-api-key": settings.GEMINI_API_KEY,
+        }
+        async with self._session_scope(session, timeout) as session_:
+            image_datas = [
+                await self._aget_image_data_from_url(session_, url_)
+                for url_ in image_urls or []
+            ]
+            payload = self._build_gemini_payload(
+                text_content, image_datas, local_images, temperature
+            )
+            response_text = await self._apost(
+                session_,
+                GEMINI_URL.format(model=model),
+                headers,
+                payload,
+                text_content,
+                "gemini",
+                model,
+                estimate_tokens(text_content),
+                timeout,
+            )
+        res_text = self._parse_gemini_response(response_text, model, cache_key)
+        self.update_record(
+            status_code=1, response_code=200, request=text_content, response=res_text
+        )
+        return res_text
+
+    async def achat(
+        self,
+        text_content: str,
+        image_urls: list[str] = None,
+        local_images: list[Path] = None,
+        temperature: float = 0.5,
+        model: str = None,
+        provider: str = None,
+        session: aiohttp.ClientSession | None = None,
+        timeout: float = None,
+        bypass_cache: bool = False,
+    ) -> str:
+        """
+        async version of `chat`, routes to `agemini_chat` or `aremote_chat`.
+
+        Args:
+            session: aiohttp session to reuse (optional, a temporary one is opened otherwise)
+            timeout: per-request timeout in seconds (optional)
+        """
+        model = self._resolve_model(model, provider)
+        chat_fn = self.agemini_chat if provider == "gemini" else self.aremote_chat
+        return await chat_fn(
+            text_content=text_content,
+            image_urls=image_urls,
+            local_images=local_images,
+            temperature=temperature,
+            model=model,
+            session=session,
+            timeout=timeout,
+            bypass_cache=bypass_cache,
+        )
+
+    async def abatch_chat(
+        self,
+        prompt_l: list[str],
+        desc: str = "async batch chatting...",
+        concurrency: int = ASYNC_CHAT_CONCURRENCY,
+        temperature: float = 0.5,
+        model: str = None,
+        provider: str = None,
+        timeout: float = None,
+    ) -> list[str]:
+        """
+        Fan out prompts on one event loop with at most `concurrency` requests in flight.
+        Results keep the order of `prompt_l`; a prompt that still fails after the retry
+        policy yields an "Error: ..." string instead of aborting the whole batch.
+        Cancelling the awaiting task cancels every pending request.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        progress = tqdm(total=len(prompt_l), desc=desc, dynamic_ncols=True)
+
+        async with self._aiohttp_session(concurrency, timeout) as session:
+
+            async def _chat_one(prompt: str) -> str:
+                async with semaphore:
+                    try:
+                        return await self.achat(
+                            prompt,
+                            temperature=temperature,
+                            model=model,
+                            provider=provider,
+                            session=session,
+                            timeout=timeout,
+                        )
+                    except Exception as e:
+                        logger.error(f"async chat failed after retries: {e}")
+                        return f"Error: {e}"
+                    finally:
+                        progress.update(1)
+
+            try:
+                return list(await asyncio.gather(*(_chat_one(p) for p in prompt_l)))
+            finally:
+                progress.close()
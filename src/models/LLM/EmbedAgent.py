@@ -3,17 +3,17 @@ import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-import requests
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from tqdm import tqdm
 
 from src.configs.config import (
     DEFAULT_EMBED_LOCAL_MODEL,
     DEFAULT_EMBED_ONLINE_MODEL,
     EMBED_REMOTE_URL,
-    EMBED_TOKEN,
+    settings,
 )
 from src.configs.logger import get_logger
+from src.models.LLM import http_client
+from src.models.LLM.rate_limiter import RateScheduler, estimate_tokens
 
 logger = get_logger("src.models.LLM.EmbedAgent")
 
@@ -24,31 +24,58 @@ class EmbedAgent:
     Supports multi-threading for batch processing.
     """
 
-    def __init__(self, token=EMBED_TOKEN, remote_url=EMBED_REMOTE_URL) -> None:
+    def __init__(
+        self,
+        token=None,
+        remote_url=EMBED_REMOTE_URL,
+        scheduler: RateScheduler | None = None,
+    ) -> None:
         """
         Initialize the EmbedAgent.
 
         Args:
-            token (str): Authentication token for the remote API.
+            token (str, optional): Authentication token for the remote API,
+                defaults to settings.EMBED_TOKEN (validated on the first remote call).
             remote_url (str): URL of the remote embedding API.
+            scheduler (RateScheduler, optional): Rate budget shared with other clients.
         """
         self.remote_url = remote_url
-        self.token = token
-        self.header = {
+        self.scheduler = scheduler or RateScheduler.default()
+        self._token = token
+        self._local_embedding_model = None
+
+    @property
+    def token(self) -> str:
+        return self._token or settings.EMBED_TOKEN
+
+    @property
+    def header(self) -> dict:
+        return {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {token}",
+            "Authorization": f"Bearer {self.token}",
         }
-        try:
-            self.local_embedding_model = HuggingFaceEmbedding(
-                model_name=DEFAULT_EMBED_ONLINE_MODEL
-            )
-        except Exception as e:
-            logger.info(
-                f"{e}\nFailed to load embedding model {DEFAULT_EMBED_ONLINE_MODEL}, try to use local model {DEFAULT_EMBED_LOCAL_MODEL}."
-            )
-            self.local_embedding_model = HuggingFaceEmbedding(
-                model_name=DEFAULT_EMBED_LOCAL_MODEL
-            )
+
+    @property
+    def local_embedding_model(self):
+        """
+        HuggingFace embedding model, loaded on first local embedding call so that
+        remote-only use does not import torch / llama_index.
+        """
+        if self._local_embedding_model is None:
+            from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+            try:
+                self._local_embedding_model = HuggingFaceEmbedding(
+                    model_name=DEFAULT_EMBED_ONLINE_MODEL
+                )
+            except Exception as e:
+                logger.info(
+                    f"{e}\nFailed to load embedding model {DEFAULT_EMBED_ONLINE_MODEL}, try to use local model {DEFAULT_EMBED_LOCAL_MODEL}."
+                )
+                self._local_embedding_model = HuggingFaceEmbedding(
+                    model_name=DEFAULT_EMBED_LOCAL_MODEL
+                )
+        return self._local_embedding_model
 
     def remote_embed(
         self,
@@ -73,21 +100,23 @@ class EmbedAgent:
         json_data = json.dumps(
             {"model": model, "input": text, "encoding_format": "float"}
         )
-
-        try:
-            response = requests.post(url, headers=self.header, data=json_data)
-        except Exception as e:
-            logger.error(f"Initial request failed: {e}")
-            response = None
-            for attempt in range(max_try):
-                try:
-                    response = requests.post(url, headers=self.header, data=json_data)
-                    if response.status_code == 200:
-                        logger.info(f"Retry {attempt + 1}/{max_try} succeeded.")
-                        break
-                except Exception as e:
-                    logger.error(f"Retry {attempt + 1}/{max_try} failed: {e}")
-                    response = None
+        tokens = estimate_tokens(text)
+
+        # first attempt plus up to max_try retries on connection errors and 429s;
+        # after a 429 the scheduler holds the next attempt until the cooldown ends
+        response = None
+        for attempt in range(max_try + 1):
+            try:
+                response = self._post(url, json_data, model, tokens)
+            except Exception as e:
+                logger.error(f"Request {attempt + 1}/{max_try + 1} failed: {e}")
+                response = None
+                continue
+            if response.status_code != 429:
+                if attempt > 0 and response.status_code == 200:
+                    logger.info(f"Retry {attempt}/{max_try} succeeded.")
+                break
+            logger.warning(f"Request {attempt + 1}/{max_try + 1} rate limited.")
 
         if response is None:
             error_msg = "embed response code: 000"
@@ -114,6 +143,13 @@ class EmbedAgent:
                 return "JSON decoding failed", response
             return []
 
+    def _post(self, url: str, json_data: str, model: str, tokens: int):
+        """Send one embedding request through the shared rate budget of `model`."""
+        with self.scheduler.slot("siliconflow", model, tokens) as slot:
+            response = http_client.post(url, headers=self.header, data=json_data)
+            slot.observe(response.status_code, response.headers, response.text)
+        return response
+
     def __remote_embed_task(self, index: int, text: str):
         """
         Internal method to handle embedding tasks in threads.
@@ -0,0 +1,108 @@
+import hashlib
+import threading
+import time
+from typing import Callable
+
+from src.configs.config import GEMINI_CONTEXT_CACHE_TTL
+from src.configs.logger import get_logger
+
+logger = get_logger("src.models.LLM.ContextCache")
+
+# a cache is not handed out this close to its expiry, the request would race the TTL
+_EXPIRY_MARGIN = 60
+
+
+class ContextCache:
+    """
+    Registry of provider-side prompt caches (Gemini `cachedContents`), keyed by
+    (model, hash of the prefix). The first request with a prefix uploads it once; every
+    later request with the same prefix only references the returned name until the TTL
+    runs out. Creation is serialized per key, so parallel subsection writers share one
+    upload. Prefixes the provider refuses to cache are remembered and sent inline.
+    """
+
+    _default_instance = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, ttl: int = GEMINI_CONTEXT_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self.created = 0
+        self.hits = 0
+        self.refused = 0
+        self._entries = {}  # key -> (name, expires_at); name None = provider refused
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "ContextCache":
+        """Process-wide registry shared by every ChatAgent."""
+        with cls._default_lock:
+            if cls._default_instance is None:
+                cls._default_instance = cls()
+            return cls._default_instance
+
+    @staticmethod
+    def make_key(model: str, prefix: str) -> str:
+        return f"{model}:{hashlib.sha256(prefix.encode('utf-8')).hexdigest()}"
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _live(self, key: str):
+        """(found, name) for an entry that is not about to expire."""
+        entry = self._entries.get(key)
+        if entry is None or entry[1] - _EXPIRY_MARGIN <= time.time():
+            return False, None
+        return True, entry[0]
+
+    def get_or_create(self, model: str, prefix: str, create: Callable[[int], str | None]) -> str | None:
+        """
+        Name of the cache holding `prefix` for `model`, calling `create(ttl)` on a miss.
+        `create` returns the provider's cache name, or None if the prefix cannot be cached.
+        """
+        key = self.make_key(model, prefix)
+        with self._lock:
+            found, name = self._live(key)
+        if not found:
+            with self._key_lock(key):
+                with self._lock:
+                    found, name = self._live(key)
+                if not found:
+                    name = create(self.ttl)
+                    with self._lock:
+                        self._entries[key] = (name, time.time() + self.ttl)
+                        if name is None:
+                            self.refused += 1
+                        else:
+                            self.created += 1
+                    logger.info(f"Context cache for {model} ({len(prefix)} chars): {name or 'sent inline'}")
+                    return name
+        if name is not None:
+            with self._lock:
+                self.hits += 1
+        return name
+
+    def invalidate(self, model: str, prefix: str) -> None:
+        """Forget the cache of a prefix, e.g. after the provider reported it missing."""
+        with self._lock:
+            self._entries.pop(self.make_key(model, prefix), None)
+
+    def release(self) -> list[str]:
+        """Drop every entry; returns the names of caches that may still exist on the provider."""
+        with self._lock:
+            names = [name for name, expires_at in self._entries.values()
+                     if name is not None and expires_at > time.time()]
+            self._entries.clear()
+        return names
+
+    def stats(self) -> dict:
+        with self._lock:
+            live = sum(1 for name, expires_at in self._entries.values()
+                       if name is not None and expires_at > time.time())
+        return {
+            "created": self.created,
+            "hits": self.hits,
+            "refused": self.refused,
+            "live": live,
+        }
@@ -0,0 +1,81 @@
+"""
+Shared HTTP transport for the LLM / embedding clients: one process-wide
+`requests.Session` whose keep-alive pools are sized per host, so the worker
+threads of `batch_remote_chat` / `batch_remote_embed` reuse warm connections
+instead of paying a TCP+TLS handshake per request.
+"""
+
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.configs.config import (
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_HOST_POOL_MAXSIZE,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+)
+from src.configs.logger import get_logger
+
+logger = get_logger("src.models.LLM.http_client")
+
+DEFAULT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    # default adapter for any host, then a dedicated pool size for known API hosts
+    default_adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        pool_block=False,
+    )
+    session.mount("https://", default_adapter)
+    session.mount("http://", default_adapter)
+    for host, pool_maxsize in HTTP_HOST_POOL_MAXSIZE.items():
+        session.mount(
+            f"https://{host}/",
+            HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=False),
+        )
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the shared session, creating it on first use (thread-safe)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+                logger.debug("created shared HTTP session")
+    return _session
+
+
+def mount_host(url: str, pool_maxsize: int) -> None:
+    """Give the host of `url` its own pool of `pool_maxsize` connections."""
+    parts = urlsplit(url)
+    get_session().mount(
+        f"{parts.scheme}://{parts.netloc}/",
+        HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=False),
+    )
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """`requests.request` over the shared pool, with the default timeout applied."""
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_session().request(method, url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
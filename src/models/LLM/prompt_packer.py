@@ -0,0 +1,140 @@
+"""
+Token-budgeted packing of paper snippets into the PAPER_INFO block of a prompt.
+
+Each paper can be rendered as its summary, its abstract or its title only. Papers are
+ranked by priority (citation count, then edge weight, then layer), and each one gets the
+richest form that still fits the per-model budget (`PROMPT_PAPER_TOKEN_BUDGET`), so the
+prompt size stays bounded however large the community or BFS path is. Token counts come
+from tiktoken and are cached per snippet; when no encoding is available (e.g. offline and
+not in the tiktoken cache) the 4-characters-per-token estimate of the rate limiter is used.
+"""
+
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.configs.config import PROMPT_PAPER_TOKEN_BUDGET, PROMPT_TOKEN_CACHE_SIZE
+from src.configs.logger import get_logger
+from src.models.LLM.rate_limiter import estimate_tokens
+
+logger = get_logger("src.models.LLM.prompt_packer")
+
+_FALLBACK_ENCODING = "o200k_base"
+
+_token_counts: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """tiktoken encoding of the model (o200k_base for non-OpenAI models), None if unavailable."""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed, estimating prompt tokens from length")
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(_FALLBACK_ENCODING)
+    except Exception as e:  # the BPE file is downloaded on first use
+        logger.warning(f"tiktoken encoding for {model} unavailable ({e}), estimating prompt tokens from length")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Token count of `text` for `model`, cached (LRU, `PROMPT_TOKEN_CACHE_SIZE` entries)."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    key = (encoding.name, text)
+    with _token_counts_lock:
+        if key in _token_counts:
+            _token_counts.move_to_end(key)
+            return _token_counts[key]
+    count = len(encoding.encode(text, disallowed_special=()))
+    with _token_counts_lock:
+        _token_counts[key] = count
+        while len(_token_counts) > PROMPT_TOKEN_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return count
+
+
+def token_budget_for(model: str) -> int:
+    return PROMPT_PAPER_TOKEN_BUDGET.get(model, PROMPT_PAPER_TOKEN_BUDGET["*"])
+
+
+def paper_snippets(info: Dict) -> List[str]:
+    """Renderings of one paper from the richest to the shortest: summary, abstract, title."""
+    year = info.get('year') or info.get('published_date', '')
+    header = f"[{info.get('citation_key', '')}] {info.get('title', '')} ({year})\n"
+    summary = info.get('summary') or ''
+    abstract = info.get('abstract') or ''
+    snippets = []
+    if summary and summary != abstract:
+        snippets.append(f"{header}Summary: {summary}\n\n")
+    if abstract:
+        snippets.append(f"{header}Summary: {abstract}\n\n")
+    snippets.append(f"{header}\n")
+    return snippets
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def default_priority(info: Dict) -> Tuple[float, float, float]:
+    """Sort key, smaller first: most cited, then heaviest edge, then lowest layer."""
+    citations = info.get('citation_count', info.get('citationCount'))
+    layer = info.get('layer')
+    return (
+        -_number(citations),
+        -_number(info.get('weight')),
+        _number(layer) if layer is not None else float('inf'),
+    )
+
+
+def pack_paper_text(
+    paper_infos: Sequence[Dict],
+    model: str = "gpt-4o-mini",
+    token_budget: Optional[int] = None,
+    max_papers: Optional[int] = None,
+    priority: Callable[[Dict], Tuple] = default_priority,
+) -> Tuple[str, int]:
+    """
+    Concatenate paper snippets within `token_budget` tokens (default: the model's budget).
+
+    The `max_papers` highest-priority papers are considered; in priority order each takes
+    the richest snippet that fits the remaining budget, and papers whose title alone does
+    not fit are dropped. The selected papers keep their input order in the output.
+
+    Returns (text, number of papers included), so prompts can state the real paper count.
+    """
+    if token_budget is None:
+        token_budget = token_budget_for(model)
+    ranked = sorted(range(len(paper_infos)), key=lambda i: priority(paper_infos[i]))
+    if max_papers is not None:
+        ranked = ranked[:max_papers]
+
+    remaining = token_budget
+    chosen = {}
+    degraded = 0
+    for i in ranked:
+        snippets = paper_snippets(paper_infos[i])
+        for rank, snippet in enumerate(snippets):
+            tokens = count_tokens(snippet, model)
+            if tokens <= remaining:
+                chosen[i] = snippet
+                remaining -= tokens
+                degraded += rank > 0
+                break
+
+    if len(chosen) < len(paper_infos) or degraded:
+        logger.debug(f"Packed {len(chosen)}/{len(paper_infos)} papers ({degraded} shortened) "
+                     f"into {token_budget - remaining}/{token_budget} tokens for {model}")
+    return ''.join(chosen[i] for i in sorted(chosen)), len(chosen)
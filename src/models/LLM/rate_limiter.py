@@ -0,0 +1,343 @@
+"""
+Process-wide request scheduler shared by every remote API client (chat, embedding,
+Semantic Scholar). Each (provider, model) pair gets its own budget:
+
+- a requests-per-minute and a tokens-per-minute token bucket, so callers are paced
+  to the quota instead of bursting into it;
+- an AIMD concurrency window: +1 slot per window of successes, halved on a 429;
+- a cooldown that honors `Retry-After` (or Gemini's `retryDelay`) on a 429.
+
+Sync callers use `RateScheduler.slot(...)`, asyncio callers `RateScheduler.aslot(...)`;
+both share the same state, so threads and event loops draw from one budget.
+"""
+
+import asyncio
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+import requests
+from tenacity.wait import wait_base
+
+from src.configs.config import (
+    RATE_LIMITS,
+    RATE_LIMIT_INITIAL_CONCURRENCY,
+    RATE_LIMIT_MAX_CONCURRENCY,
+    RATE_LIMIT_DEFAULT_BACKOFF,
+)
+from src.configs.logger import get_logger
+
+logger = get_logger("src.models.LLM.rate_limiter")
+
+# how long a caller sleeps before re-checking a full concurrency window
+_POLL_INTERVAL = 0.05
+_GEMINI_RETRY_DELAY = re.compile(r'"retryDelay"\s*:\s*"([\d.]+)s"')
+
+
+def estimate_tokens(text: str) -> int:
+    """rough token count (~4 characters per token), used to reserve TPM budget."""
+    return max(1, len(text or "") // 4)
+
+
+def parse_retry_after(headers=None, body: str = None) -> float | None:
+    """
+    Seconds to wait according to a 429 response: `Retry-After` (seconds or HTTP date),
+    `retry-after-ms`, or the `retryDelay` field of a Gemini error body.
+    """
+    headers = headers or {}
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    if body:
+        match = _GEMINI_RETRY_DELAY.search(body)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def error_status(exc: BaseException | None) -> int | None:
+    """
+    HTTP status of a requests.HTTPError / aiohttp.ClientResponseError / google.api_core
+    error (Gemini SDK), None without a response.
+    """
+    if exc is None:
+        return None
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is None:
+        status = getattr(exc, "status", None)
+    if status is None:
+        code = getattr(exc, "code", None)
+        status = code if isinstance(code, int) else None
+    return status
+
+
+def is_rate_limit_error(exc: BaseException | None) -> bool:
+    """True for an HTTP error (see `error_status`) carrying a 429."""
+    return error_status(exc) == 429
+
+
+def is_transient_error(exc: BaseException | None) -> bool:
+    """
+    True if a retry can succeed: a 429, a 5xx, or a connection error / timeout that got
+    no response. A 4xx such as 400 (prompt too long) fails the same way every time.
+    """
+    if exc is None:
+        return False
+    status = error_status(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(exc, (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+        aiohttp.ClientConnectionError,
+        asyncio.TimeoutError,
+    ))
+
+
+class wait_unless_rate_limited(wait_base):
+    """
+    tenacity wait strategy: no extra sleep after a 429 (the scheduler's cooldown already
+    holds the next attempt back), `fallback` for every other error.
+    """
+
+    def __init__(self, fallback: wait_base) -> None:
+        self.fallback = fallback
+
+    def __call__(self, retry_state) -> float:
+        if retry_state.outcome is not None and is_rate_limit_error(
+            retry_state.outcome.exception()
+        ):
+            return 0.0
+        return self.fallback(retry_state)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second up to `capacity`.
+    A request larger than the capacity is let through once the bucket is full and
+    leaves it in debt, so oversized prompts are slowed down rather than blocked forever.
+    Not thread-safe on its own; `ModelBudget` guards it.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def wait_time(self, tokens: float, now: float) -> float:
+        """seconds until `tokens` can be taken, 0 if they can be taken now."""
+        self._refill(now)
+        need = min(tokens, self.capacity)
+        if self._tokens >= need:
+            return 0.0
+        return (need - self._tokens) / self.rate
+
+    def take(self, tokens: float) -> None:
+        self._tokens -= tokens
+
+    def give_back(self, tokens: float) -> None:
+        """correct a reservation once the real cost is known (negative = charge more)."""
+        self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def drain(self) -> None:
+        self._tokens = min(self._tokens, 0.0)
+
+
+class ModelBudget:
+    """RPM/TPM buckets, AIMD concurrency window and 429 cooldown of one (provider, model)."""
+
+    def __init__(
+        self,
+        name: str,
+        rpm: float | None,
+        tpm: float | None,
+        initial_concurrency: int = RATE_LIMIT_INITIAL_CONCURRENCY,
+        max_concurrency: int = RATE_LIMIT_MAX_CONCURRENCY,
+    ) -> None:
+        self.name = name
+        # capacity of one second of quota: smooth pacing instead of a burst per minute
+        self.rpm_bucket = TokenBucket(rpm / 60.0) if rpm else None
+        self.tpm_bucket = TokenBucket(tpm / 60.0) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(min(initial_concurrency, max_concurrency))
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.rate_limited_count = 0
+        self.success_count = 0
+        self._lock = threading.Lock()
+
+    def try_reserve(self, tokens: int) -> float:
+        """Reserve one request slot; return 0 on success, else the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.cooldown_until:
+                return self.cooldown_until - now
+            if self.in_flight >= int(self.concurrency):
+                return _POLL_INTERVAL
+            wait = 0.0
+            if self.rpm_bucket is not None:
+                wait = max(wait, self.rpm_bucket.wait_time(1, now))
+            if self.tpm_bucket is not None:
+                wait = max(wait, self.tpm_bucket.wait_time(tokens, now))
+            if wait > 0:
+                return wait
+            if self.rpm_bucket is not None:
+                self.rpm_bucket.take(1)
+            if self.tpm_bucket is not None:
+                self.tpm_bucket.take(tokens)
+            self.in_flight += 1
+            return 0.0
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def limit_rpm(self, rpm: float) -> None:
+        """lower the request rate to at most `rpm` (never raises it), e.g. for a caller-imposed delay."""
+        rate = rpm / 60.0
+        with self._lock:
+            if self.rpm_bucket is None:
+                self.rpm_bucket = TokenBucket(rate)
+            elif rate < self.rpm_bucket.rate:
+                self.rpm_bucket.rate = rate
+                self.rpm_bucket.capacity = max(1.0, rate)
+                self.rpm_bucket.give_back(0)  # clamp the tokens to the new capacity
+
+    def on_success(self, reserved_tokens: int, used_tokens: int | None = None) -> None:
+        """additive increase: about +1 slot once a full window has succeeded."""
+        with self._lock:
+            self.success_count += 1
+            self.concurrency = min(
+                self.max_concurrency, self.concurrency + 1.0 / self.concurrency
+            )
+            if self.tpm_bucket is not None and used_tokens is not None:
+                self.tpm_bucket.give_back(reserved_tokens - used_tokens)
+
+    def on_rate_limited(self, retry_after: float | None = None) -> None:
+        """multiplicative decrease and a cooldown for everyone sharing this budget."""
+        with self._lock:
+            now = time.monotonic()
+            self.rate_limited_count += 1
+            # a burst of 429s from the same window only counts once
+            if now >= self.cooldown_until:
+                self.concurrency = max(1.0, self.concurrency / 2)
+            pause = retry_after if retry_after is not None else RATE_LIMIT_DEFAULT_BACKOFF
+            self.cooldown_until = max(self.cooldown_until, now + pause)
+            if self.rpm_bucket is not None:
+                self.rpm_bucket.drain()
+        logger.warning(
+            f"{self.name}: rate limited, pausing {pause:.1f}s, "
+            f"concurrency -> {int(self.concurrency)}"
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "concurrency": int(self.concurrency),
+                "in_flight": self.in_flight,
+                "successes": self.success_count,
+                "rate_limited": self.rate_limited_count,
+                "cooling_down": max(0.0, round(self.cooldown_until - time.monotonic(), 2)),
+            }
+
+
+class Slot:
+    """One admitted request; report the outcome with `observe`."""
+
+    def __init__(self, budget: ModelBudget, tokens: int) -> None:
+        self.budget = budget
+        self.tokens = tokens
+
+    def observe(
+        self, status: int, headers=None, body: str = None, used_tokens: int | None = None
+    ) -> None:
+        """feed the HTTP status back: 429 shrinks the window, 2xx grows it."""
+        if status == 429:
+            self.budget.on_rate_limited(parse_retry_after(headers, body))
+        elif 200 <= status < 300:
+            self.budget.on_success(self.tokens, used_tokens)
+
+
+class RateScheduler:
+    """Registry of `ModelBudget`s built from `RATE_LIMITS`."""
+
+    _default_instance = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, limits: dict = RATE_LIMITS) -> None:
+        self.limits = limits
+        self._budgets: dict[tuple[str, str], ModelBudget] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "RateScheduler":
+        """Process-wide shared scheduler."""
+        with cls._default_lock:
+            if cls._default_instance is None:
+                cls._default_instance = cls()
+            return cls._default_instance
+
+    def budget(self, provider: str, model: str = "*") -> ModelBudget:
+        key = (provider, model)
+        with self._lock:
+            if key not in self._budgets:
+                provider_limits = self.limits.get(provider, {})
+                limit = provider_limits.get(model) or provider_limits.get("*") or {}
+                self._budgets[key] = ModelBudget(
+                    f"{provider}/{model}", limit.get("rpm"), limit.get("tpm")
+                )
+            return self._budgets[key]
+
+    @contextmanager
+    def slot(self, provider: str, model: str = "*", tokens: int = 1):
+        """Block until the budget admits a request of `tokens` tokens."""
+        budget = self.budget(provider, model)
+        while True:
+            wait = budget.try_reserve(tokens)
+            if wait == 0:
+                break
+            time.sleep(wait)
+        try:
+            yield Slot(budget, tokens)
+        finally:
+            budget.release()
+
+    @asynccontextmanager
+    async def aslot(self, provider: str, model: str = "*", tokens: int = 1):
+        """asyncio version of `slot`; waits without blocking the event loop."""
+        budget = self.budget(provider, model)
+        while True:
+            wait = budget.try_reserve(tokens)
+            if wait == 0:
+                break
+            await asyncio.sleep(wait)
+        try:
+            yield Slot(budget, tokens)
+        finally:
+            budget.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            budgets = dict(self._budgets)
+        return {budget.name: budget.stats() for budget in budgets.values()}
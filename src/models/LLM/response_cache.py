@@ -0,0 +1,154 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from src.configs.config import LLM_CACHE_MAX_BYTES
+from src.configs.constants import CACHE_DIR
+from src.configs.logger import get_logger
+
+logger = get_logger("src.models.LLM.ResponseCache")
+
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache for LLM responses backed by SQLite.
+    Entries are keyed by a hash of (provider, model, temperature, prompt, images)
+    and evicted least-recently-used first once the stored size exceeds `max_bytes`.
+    Safe to share between threads; WAL mode lets several processes read it.
+    """
+
+    DEFAULT_PATH = Path(f"{CACHE_DIR}/llm_response_cache.sqlite3")
+    _default_instance = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, path: Path = DEFAULT_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES) -> None:
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path (Path): Location of the SQLite file.
+            max_bytes (int): Upper bound on the total size of stored responses.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)"
+            )
+            self._conn.commit()
+            row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            self._total_bytes = row[0]
+        logger.info(f"LLM response cache: {self.path} ({self._total_bytes} bytes)")
+
+    @classmethod
+    def default(cls) -> "ResponseCache":
+        """Process-wide shared cache at the default location."""
+        with cls._default_lock:
+            if cls._default_instance is None:
+                cls._default_instance = cls()
+            return cls._default_instance
+
+    @staticmethod
+    def make_key(
+        provider: str,
+        model: str,
+        temperature: float,
+        text_content: str,
+        image_urls: list[str] = None,
+        local_images: list[Path] = None,
+    ) -> str:
+        """Hash a request into a cache key. Local images are keyed by file content."""
+        local_image_digests = []
+        for local_image in local_images or []:
+            with open(local_image, "rb") as fr:
+                local_image_digests.append(hashlib.sha256(fr.read()).hexdigest())
+        payload = json.dumps(
+            [provider, model, temperature, text_content, image_urls or [], local_image_digests],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response for `key`, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response and evict the least recently used entries if over budget."""
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time()),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop LRU entries until the cache fits in max_bytes. Caller holds the lock."""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process plus the current size of the cache."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
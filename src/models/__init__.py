@@ -1 +1,7 @@
-from .rag.modeling_llamaidx import LlamaIndexWrapper
+# LlamaIndexWrapper pulls in llama_index / openai, so it is imported on first access only
+def __getattr__(name):
+    if name == "LlamaIndexWrapper":
+        from .rag.modeling_llamaidx import LlamaIndexWrapper
+
+        return LlamaIndexWrapper
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -54,10 +54,10 @@ from src.configs.config import (
     DEFAULT_EMBED_LOCAL_MODEL,
     DEFAULT_EMBED_ONLINE_MODEL,
     DEFAULT_LLAMAINDEX_OPENAI_MODEL,
-    TOKEN,
     REMOTE_URL,
     SPLITTER_CHUNK_SIZE,
     SPLITTER_WINDOW_SIZE,
+    settings,
 )
 from src.configs.logger import get_logger
 from src.configs.constants import DEFAULT_SPLITTER_TYPE, OUTPUT_DIR
@@ -68,7 +68,7 @@ sys.path.append(BASE_DIR)
 
 
 class LlamaIndexWrapper(object):
-    Api_key = TOKEN
+    Api_key = None  # None = settings.TOKEN, read when the first LLM is built
     Api_base = REMOTE_URL
 
     def __init__(self, embed_model: str = None, llm_model: str = None):
@@ -112,7 +112,7 @@ class LlamaIndexWrapper(object):
     @classmethod
     def get_openai_llm(cls, model=DEFAULT_LLAMAINDEX_OPENAI_MODEL, temp=0):
         return OpenAI(
-            model=model, temperature=temp, api_base=cls.Api_base, api_key=cls.Api_key
+            model=model, temperature=temp, api_base=cls.Api_base, api_key=cls.Api_key or settings.TOKEN
         )
 
     def init_split_parser(self):
@@ -8,17 +8,28 @@ from dataclasses import dataclass, asdict
 from collections import defaultdict, Counter
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import re
-import spacy
+from functools import lru_cache
 from datetime import datetime
+from .metrics import (
+    DEFAULT_BETWEENNESS_DELTA,
+    DEFAULT_BETWEENNESS_EPSILON,
+    compute_betweenness,
+    compute_bridge_scores,
+    compute_pagerank,
+)
+from .similarity import label_incidence, normalize_rows, sparse_pairs
 
-# Load spaCy model for NLP tasks
-try:
-    nlp = spacy.load("en_core_web_sm")
-except IOError:
-    print("Warning: spaCy model 'en_core_web_sm' not found. Install with: python -m spacy download en_core_web_sm")
-    nlp = None
+@lru_cache(maxsize=None)
+def get_nlp():
+    """spaCy model for NLP tasks, loaded on the first concept extraction (None if not installed)."""
+    import spacy
+
+    try:
+        return spacy.load("en_core_web_sm")
+    except IOError:
+        print("Warning: spaCy model 'en_core_web_sm' not found. Install with: python -m spacy download en_core_web_sm")
+        return None
 
 @dataclass
 class PaperNode:
@@ -45,8 +56,17 @@ class PaperNode:
     influence_score: float = 0.0
 
 class HierarchicalKnowledgeGraph:
-    def __init__(self):
+    def __init__(self, metrics_mode: str = 'auto', betweenness_epsilon: float = DEFAULT_BETWEENNESS_EPSILON,
+                 betweenness_delta: float = DEFAULT_BETWEENNESS_DELTA):
+        """
+        metrics_mode: 'exact', 'approximate' (pivot-sampled betweenness within betweenness_epsilon
+        with probability 1 - betweenness_delta) or 'auto' (exact for small graphs).
+        """
         self.graph = nx.MultiDiGraph()
+        self.metrics_mode = metrics_mode
+        self.betweenness_epsilon = betweenness_epsilon
+        self.betweenness_delta = betweenness_delta
+        self._pagerank = None  # last PageRank vector, warm start for the next build
         self.papers = {}
         self.tier_nodes = {
             'foundational': set(),
@@ -106,7 +126,10 @@ class HierarchicalKnowledgeGraph:
         self._build_inter_tier_relationships()
         self._compute_graph_metrics()
     def _extract_concepts(self, text: str) -> List[str]:
-        if not nlp or not text:
+        if not text:
+            return []
+        nlp = get_nlp()
+        if not nlp:
             return []
         doc = nlp(text)
         concepts = []
@@ -175,7 +198,7 @@ class HierarchicalKnowledgeGraph:
             documents.append(doc_text)
             paper_ids.append(paper_id)
         try:
-            self.concept_matrix = self.concept_vectorizer.fit_transform(documents)
+            self.concept_matrix = normalize_rows(self.concept_vectorizer.fit_transform(documents))
             self.paper_id_to_idx = {pid: idx for idx, pid in enumerate(paper_ids)}
         except:
             print("Warning: Could not compute concept similarity matrix")
@@ -183,55 +206,88 @@ class HierarchicalKnowledgeGraph:
     def _build_intra_tier_relationships(self):
         for tier, paper_ids in self.tier_nodes.items():
             paper_list = list(paper_ids)
-            for i, paper1_id in enumerate(paper_list):
-                for paper2_id in paper_list[i+1:]:
-                    paper1 = self.papers[paper1_id]
-                    paper2 = self.papers[paper2_id]
-                    concept_sim = self._get_concept_similarity(paper1_id, paper2_id)
-                    domain_overlap = len(set(paper1.domains) & set(paper2.domains))
-                    max_domains = max(len(paper1.domains), len(paper2.domains), 1)
-                    method_overlap = len(set(paper1.methods) & set(paper2.methods))
-                    max_methods = max(len(paper1.methods), len(paper2.methods), 1)
-                    if concept_sim > 0.7:
-                        weight = 0.8 + 0.2 * (concept_sim - 0.7) / 0.3
-                        self._add_relationship(paper1_id, paper2_id, 'SIMILAR_APPROACH', weight=round(weight, 3))
-                    elif concept_sim > 0.5:
-                        weight = 0.5 + 0.3 * (concept_sim - 0.5) / 0.2
-                        self._add_relationship(paper1_id, paper2_id, 'COMPLEMENTARY', weight=round(weight, 3))
-                    if domain_overlap > 0:
-                        weight = 0.3 + 0.4 * (domain_overlap / max_domains)
-                        self._add_relationship(paper1_id, paper2_id, 'SAME_DOMAIN', weight=round(weight, 3))
-                    if method_overlap > 0:
-                        weight = 0.2 + 0.3 * (method_overlap / max_methods)
-                        self._add_relationship(paper1_id, paper2_id, 'METHOD_OVERLAP', weight=round(weight, 3))
+            if len(paper_list) < 2:
+                continue
+            papers = [self.papers[pid] for pid in paper_list]
+            batches = []
+            i, j, concept_sim = self._concept_similarity_pairs(paper_list, paper_list, 0.5, upper_triangle=True)
+            similar = concept_sim > 0.7
+            weight = np.where(similar, 0.8 + 0.2 * (concept_sim - 0.7) / 0.3, 0.5 + 0.3 * (concept_sim - 0.5) / 0.2)
+            batches.append((i, j, 0, np.where(similar, 'SIMILAR_APPROACH', 'COMPLEMENTARY'), np.round(weight, 3)))
+            for kind, rel_type, labels, base, scale in [
+                (1, 'SAME_DOMAIN', [paper.domains for paper in papers], 0.3, 0.4),
+                (2, 'METHOD_OVERLAP', [paper.methods for paper in papers], 0.2, 0.3),
+            ]:
+                incidence = label_incidence(labels)
+                i, j, overlap = sparse_pairs(incidence, incidence, 0, upper_triangle=True)
+                sizes = np.array([len(paper_labels) for paper_labels in labels])
+                max_labels = np.maximum(np.maximum(sizes[i], sizes[j]), 1)
+                batches.append((i, j, kind, rel_type, np.round(base + scale * (overlap / max_labels), 3)))
+            self._add_relationships_bulk(paper_list, paper_list, batches)
     def _build_inter_tier_relationships(self):
+        foundational_list = list(self.tier_nodes['foundational'])
+        foundational_years = np.array([self.papers[pid].year or 0 for pid in foundational_list])
         for source_tier in ['recent', 'trending']:
-            for source_id in self.tier_nodes[source_tier]:
-                for target_id in self.tier_nodes['foundational']:
-                    source_paper = self.papers[source_id]
-                    target_paper = self.papers[target_id]
-                    concept_sim = self._get_concept_similarity(source_id, target_id)
-                    if concept_sim > 0.6:
-                        if source_paper.year > target_paper.year + 2:
-                            self._add_relationship(source_id, target_id, 'BUILDS_UPON', weight=concept_sim)
-                        elif 'extends' in source_paper.abstract.lower():
-                            self._add_relationship(source_id, target_id, 'EXTENDS', weight=concept_sim)
-                        elif 'challenge' in source_paper.abstract.lower():
-                            self._add_relationship(source_id, target_id, 'CHALLENGES', weight=concept_sim)
-        for recent_id in self.tier_nodes['recent']:
-            for trending_id in self.tier_nodes['trending']:
-                recent_paper = self.papers[recent_id]
-                trending_paper = self.papers[trending_id]
-                concept_sim = self._get_concept_similarity(recent_id, trending_id)
-                if concept_sim > 0.5 and trending_paper.citation_velocity > recent_paper.citation_velocity:
-                    self._add_relationship(recent_id, trending_id, 'EVOLVES_TO', weight=concept_sim)
+            source_list = list(self.tier_nodes[source_tier])
+            if not source_list or not foundational_list:
+                continue
+            source_papers = [self.papers[pid] for pid in source_list]
+            i, j, concept_sim = self._concept_similarity_pairs(source_list, foundational_list, 0.6)
+            source_years = np.array([paper.year or 0 for paper in source_papers])
+            extends = np.array(['extends' in paper.abstract.lower() for paper in source_papers])[i]
+            challenges = np.array(['challenge' in paper.abstract.lower() for paper in source_papers])[i]
+            builds_upon = source_years[i] > foundational_years[j] + 2
+            keep = builds_upon | extends | challenges
+            rel_types = np.where(builds_upon, 'BUILDS_UPON', np.where(extends, 'EXTENDS', 'CHALLENGES'))
+            self._add_relationships_bulk(
+                source_list, foundational_list, [(i[keep], j[keep], 0, rel_types[keep], concept_sim[keep])]
+            )
+        recent_list = list(self.tier_nodes['recent'])
+        trending_list = list(self.tier_nodes['trending'])
+        if recent_list and trending_list:
+            i, j, concept_sim = self._concept_similarity_pairs(recent_list, trending_list, 0.5)
+            recent_velocity = np.array([self.papers[pid].citation_velocity for pid in recent_list], dtype=float)
+            trending_velocity = np.array([self.papers[pid].citation_velocity for pid in trending_list], dtype=float)
+            keep = trending_velocity[j] > recent_velocity[i]
+            self._add_relationships_bulk(
+                recent_list, trending_list, [(i[keep], j[keep], 0, 'EVOLVES_TO', concept_sim[keep])]
+            )
+    def _concept_similarity_pairs(self, source_ids: List[str], target_ids: List[str], threshold: float, upper_triangle: bool = False):
+        """(source_pos, target_pos, similarity) of every pair above threshold, from one sparse product."""
+        if self.concept_matrix is None or self.concept_matrix.shape[0] == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+        source_rows = self.concept_matrix[[self.paper_id_to_idx[pid] for pid in source_ids]]
+        target_rows = source_rows if upper_triangle else self.concept_matrix[[self.paper_id_to_idx[pid] for pid in target_ids]]
+        return sparse_pairs(source_rows, target_rows, threshold, upper_triangle=upper_triangle)
+    def _add_relationships_bulk(self, source_ids: List[str], target_ids: List[str], batches):
+        """
+        Add edges from batches of (source_pos, target_pos, kind, rel_type(s), weights) with one add_edges_from.
+        Edges keep the order of the former pairwise loop: by source, then target, then kind.
+        """
+        batches = [batch for batch in batches if len(batch[0])]
+        if not batches:
+            return
+        sources = np.concatenate([batch[0] for batch in batches])
+        targets = np.concatenate([batch[1] for batch in batches])
+        kinds = np.concatenate([np.full(len(batch[0]), batch[2]) for batch in batches])
+        rel_types = np.concatenate([np.broadcast_to(np.asarray(batch[3], dtype=object), len(batch[0])) for batch in batches])
+        weights = np.concatenate([np.asarray(batch[4], dtype=float) for batch in batches])
+        order = np.lexsort((kinds, targets, sources))
+        self.graph.add_edges_from(
+            (
+                source_ids[s], target_ids[t],
+                {'relationship_type': rel_type, 'weight': float(weight), 'description': self.relationship_types.get(rel_type, '')},
+            )
+            for s, t, rel_type, weight in zip(sources[order], targets[order], rel_types[order], weights[order])
+        )
     def _get_concept_similarity(self, paper1_id: str, paper2_id: str) -> float:
         if self.concept_matrix is None or getattr(self.concept_matrix, 'shape', [0])[0] == 0 or paper1_id not in self.paper_id_to_idx or paper2_id not in self.paper_id_to_idx:
             return 0.0
         idx1 = self.paper_id_to_idx[paper1_id]
         idx2 = self.paper_id_to_idx[paper2_id]
-        similarity = cosine_similarity(self.concept_matrix[idx1], self.concept_matrix[idx2])[0][0]
-        return similarity
+        # rows are L2-normalized, the dot product is the cosine similarity
+        return float(self.concept_matrix[idx1].multiply(self.concept_matrix[idx2]).sum())
     def _add_relationship(self, source_id: str, target_id: str, rel_type: str, weight: float = 1.0, **properties):
         self.graph.add_edge(
             source_id, target_id,
@@ -241,24 +297,18 @@ class HierarchicalKnowledgeGraph:
             **properties
         )
     def _compute_graph_metrics(self):
-        undirected_graph = self.graph.to_undirected()
-        centrality = nx.betweenness_centrality(undirected_graph)
-        pagerank = nx.pagerank(self.graph)
+        centrality = compute_betweenness(
+            self.graph, mode=self.metrics_mode, epsilon=self.betweenness_epsilon, delta=self.betweenness_delta
+        )
+        pagerank = compute_pagerank(self.graph, previous=self._pagerank)
+        self._pagerank = pagerank
+        bridge_scores = compute_bridge_scores(self.graph, {pid: paper.tier for pid, paper in self.papers.items()})
         for paper_id, paper in self.papers.items():
             paper.centrality_score = centrality.get(paper_id, 0.0)
             paper.influence_score = pagerank.get(paper_id, 0.0)
-            paper.bridge_score = self._compute_bridge_score(paper_id)
+            paper.bridge_score = bridge_scores.get(paper_id, 0.0)
             paper.novelty_score = self._compute_novelty_score(paper)
             self.graph.nodes[paper_id].update(asdict(paper))
-    def _compute_bridge_score(self, paper_id: str) -> float:
-        paper_tier = self.papers[paper_id].tier
-        cross_tier_edges = 0
-        total_edges = 0
-        for _, target, data in self.graph.edges(paper_id, data=True):
-            total_edges += 1
-            if self.papers[target].tier != paper_tier:
-                cross_tier_edges += 1
-        return cross_tier_edges / max(total_edges, 1)
     def _compute_novelty_score(self, paper: PaperNode) -> float:
         base_score = 0.0
         unique_concepts = len(set(paper.concepts))
@@ -0,0 +1,63 @@
+"""
+Batched similarity engine for hierarchical knowledge graph relationship building.
+Replaces per-pair cosine / set-intersection calls with blocked sparse products.
+"""
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+# rows per block of the sparse product, bounds the memory of one dense-ish block
+SIMILARITY_BLOCK_SIZE = 2048
+
+
+def normalize_rows(matrix) -> sparse.csr_matrix:
+    """L2-normalize rows so that a row-wise dot product is the cosine similarity."""
+    return normalize(sparse.csr_matrix(matrix, dtype=np.float64), norm='l2', copy=True)
+
+
+def label_incidence(label_lists: Sequence[Sequence[str]]) -> sparse.csr_matrix:
+    """Boolean paper x label incidence matrix (as float32) for overlap counting."""
+    vocabulary = {}
+    indptr = [0]
+    indices = []
+    for labels in label_lists:
+        for label in set(labels or []):
+            indices.append(vocabulary.setdefault(label, len(vocabulary)))
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    return sparse.csr_matrix(
+        (data, np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(label_lists), max(len(vocabulary), 1)),
+    )
+
+
+def sparse_pairs(
+    left: sparse.csr_matrix,
+    right: sparse.csr_matrix,
+    threshold: float,
+    upper_triangle: bool = False,
+    block_size: int = SIMILARITY_BLOCK_SIZE,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    All (i, j, value) with (left @ right.T)[i, j] > threshold, computed block by block.
+    With `upper_triangle`, `left` and `right` are the same rows and only i < j is kept.
+    """
+    right_t = right.T.tocsc()
+    rows_out: List[np.ndarray] = []
+    cols_out: List[np.ndarray] = []
+    vals_out: List[np.ndarray] = []
+    for start in range(0, left.shape[0], block_size):
+        block = (left[start:start + block_size] @ right_t).tocoo()
+        rows = block.row.astype(np.int64) + start
+        mask = block.data > threshold
+        if upper_triangle:
+            mask &= block.col > rows
+        rows_out.append(rows[mask])
+        cols_out.append(block.col[mask].astype(np.int64))
+        vals_out.append(block.data[mask])
+    if not rows_out:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    return np.concatenate(rows_out), np.concatenate(cols_out), np.concatenate(vals_out)
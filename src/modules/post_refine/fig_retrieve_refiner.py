@@ -3,6 +3,7 @@
 1. How to create llama index templates: https://blog.csdn.net/lovechris00/article/details/137782020
 """
 
+import asyncio
 import json
 import os
 import re
@@ -154,8 +155,8 @@ class FigRetrieveRefiner(RagRefiner):
                 origin_desc=origin_desc,
             )
             prompt_l.append(tile_desc_extraction_prompt)
-        res_l = self.chat_agent.batch_remote_chat(
-            prompt_l=prompt_l, desc="tile_desc_extraction..."
+        res_l = asyncio.run(
+            self.chat_agent.abatch_chat(prompt_l=prompt_l, desc="tile_desc_extraction...")
         )
 
         figure_list_with_desc = []
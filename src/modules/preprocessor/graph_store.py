@@ -0,0 +1,322 @@
+"""
+Compact on-disk form of paper_data/<topic>/info/paper_citation_graph.json.
+
+The graph is kept next to the JSON in a `paper_citation_graph.store/` directory:
+CSR adjacency (`indptr.npy`, `indices.npy`, ordered by source node), numeric node / edge
+attributes as `.npy` columns and the remaining attributes as JSON columns. Arrays are
+memory-mapped, so every stage of a run shares the same pages through the OS cache.
+The store records the size and mtime of the JSON it was built from and is rebuilt when
+the JSON changes, so the JSON stays the interchange format.
+
+Usage: python -m src.modules.preprocessor.graph_store paper_data/*/info/paper_citation_graph.json
+"""
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+GRAPH_STORE_VERSION = 1
+STORE_SUFFIX = '.store'
+_ENDPOINT_KEYS = ('source', 'target')
+
+
+def store_dir_for(json_path: Union[str, Path]) -> Path:
+    json_path = Path(json_path)
+    return json_path.with_suffix(STORE_SUFFIX)
+
+
+def _source_stamp(json_path: Union[str, Path]) -> Optional[Dict[str, int]]:
+    try:
+        stat = os.stat(json_path)
+    except OSError:
+        return None
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _column_kind(values: List[Any], present: int, total: int) -> str:
+    """'int' / 'float' for complete, single-typed numeric columns (stored as .npy), else 'json'."""
+    if present != total or not values:
+        return 'json'
+    types = {type(value) for value in values}
+    if types == {int}:
+        return 'int'
+    if types == {float}:
+        return 'float'
+    return 'json'
+
+
+def _build_columns(records: List[Dict[str, Any]], skip: Tuple[str, ...] = ()) -> Dict[str, Dict[str, Any]]:
+    """Attribute dicts -> {name: {'values', 'missing'}} in first-seen key order."""
+    columns: Dict[str, Dict[str, Any]] = {}
+    for i, record in enumerate(records):
+        for name in record:
+            if name not in skip and name not in columns:
+                columns[name] = {'values': [None] * i, 'missing': list(range(i))}
+        for name, column in columns.items():
+            if name in record:
+                column['values'].append(record[name])
+            else:
+                column['values'].append(None)
+                column['missing'].append(i)
+    return columns
+
+
+class GraphStore:
+    """
+    Read-only view of a stored citation graph. Node i has id `node_ids[i]`; its successors
+    are `indices[indptr[i]:indptr[i + 1]]`, in the order the edges appear in the JSON.
+    `to_networkx()` / `to_igraph()` build the graph objects the stages work with.
+    """
+
+    def __init__(self, store_dir: Union[str, Path]) -> None:
+        self.store_dir = Path(store_dir)
+        with open(self.store_dir / 'meta.json', 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != GRAPH_STORE_VERSION:
+            raise ValueError(f"Unsupported graph store version in {self.store_dir}")
+        with open(self.store_dir / 'columns.json', 'r', encoding='utf-8') as f:
+            columns = json.load(f)
+        self.node_ids: List[str] = columns['node_ids']
+        self.index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.num_declared = self.meta['num_declared']
+        self.indptr = self._array('indptr')
+        self.indices = self._array('indices')
+        self._node_columns = self._load_columns('node', columns['nodes'])
+        self._edge_columns = self._load_columns('edge', columns['edges'])
+
+    def _array(self, name: str) -> np.ndarray:
+        return np.load(self.store_dir / f"{name}.npy", mmap_mode='r')
+
+    def _load_columns(self, prefix: str, json_columns: Dict[str, Dict]) -> Dict[str, Tuple[Any, set]]:
+        """name -> (values, missing positions); numeric columns stay memory-mapped."""
+        loaded = {}
+        for name, kind in self.meta[f'{prefix}_columns'].items():
+            if kind == 'json':
+                column = json_columns[name]
+                loaded[name] = (column['values'], set(column['missing']))
+            else:
+                loaded[name] = (self._array(f"{prefix}_{self.meta[f'{prefix}_files'][name]}"), set())
+        return loaded
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return int(self.indptr[-1])
+
+    @property
+    def node_columns(self) -> List[str]:
+        """Names of the stored node attributes."""
+        return list(self._node_columns)
+
+    #region building
+    @classmethod
+    def write(cls, data: Dict[str, List[Dict]], store_dir: Union[str, Path],
+              source_stamp: Optional[Dict[str, int]] = None) -> 'GraphStore':
+        """
+        Store a graph given as {'nodes': [...], 'edges': [...]} (the JSON layout).
+        Edge endpoints missing from 'nodes' become attribute-less nodes, as with nx.add_edge.
+        The store is built in a temp directory and swapped in, readers keep their old mapping.
+        """
+        store_dir = Path(store_dir)
+        nodes = data.get('nodes', [])
+        edges = data.get('edges', [])
+        node_ids = [node['id'] for node in nodes]
+        index = {}
+        for i, node_id in enumerate(node_ids):
+            index.setdefault(node_id, i)
+        num_declared = len(node_ids)
+        for edge in edges:
+            for key in _ENDPOINT_KEYS:
+                if edge[key] not in index:
+                    index[edge[key]] = len(node_ids)
+                    node_ids.append(edge[key])
+
+        sources = np.fromiter((index[edge['source']] for edge in edges), dtype=np.int64, count=len(edges))
+        targets = np.fromiter((index[edge['target']] for edge in edges), dtype=np.int64, count=len(edges))
+        order = np.argsort(sources, kind='stable')  # CSR rows, JSON order within a row
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(node_ids)), out=indptr[1:])
+        ordered_edges = [edges[k] for k in order]
+
+        tmp_dir = store_dir.with_name(f"{store_dir.name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        np.save(tmp_dir / 'indptr.npy', indptr)
+        np.save(tmp_dir / 'indices.npy', targets[order])
+
+        meta = {
+            'version': GRAPH_STORE_VERSION,
+            'num_declared': num_declared,
+            'source': source_stamp,
+        }
+        json_columns = {'node_ids': node_ids}
+        for prefix, records, skip in (('node', nodes, ()), ('edge', ordered_edges, _ENDPOINT_KEYS)):
+            total = num_declared if prefix == 'node' else len(records)
+            kinds, files, columns = {}, {}, {}
+            for position, (name, column) in enumerate(_build_columns(records, skip).items()):
+                kind = _column_kind(column['values'], total - len(column['missing']), total)
+                kinds[name] = kind
+                if kind == 'json':
+                    columns[name] = column
+                else:
+                    # file names by position: attribute names are not always valid file names
+                    files[name] = str(position)
+                    dtype = np.int64 if kind == 'int' else np.float64
+                    np.save(tmp_dir / f"{prefix}_{position}.npy", np.asarray(column['values'], dtype=dtype))
+            meta[f'{prefix}_columns'] = kinds
+            meta[f'{prefix}_files'] = files
+            json_columns[f'{prefix}s'] = columns
+        with open(tmp_dir / 'columns.json', 'w', encoding='utf-8') as f:
+            json.dump(json_columns, f, ensure_ascii=False, separators=(',', ':'))
+        with open(tmp_dir / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+        old_dir = store_dir.with_name(f"{store_dir.name}.old-{os.getpid()}")
+        if store_dir.exists():
+            os.replace(store_dir, old_dir)
+        os.replace(tmp_dir, store_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return cls(store_dir)
+
+    @classmethod
+    def from_json(cls, json_path: Union[str, Path]) -> 'GraphStore':
+        """One-shot conversion of an existing paper_citation_graph.json."""
+        stamp = _source_stamp(json_path)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls.write(data, store_dir_for(json_path), stamp)
+
+    @classmethod
+    def open(cls, json_path: Union[str, Path]) -> 'GraphStore':
+        """The store of `json_path`, (re)built first if it is missing or older than the JSON."""
+        store_dir = store_dir_for(json_path)
+        stamp = _source_stamp(json_path)
+        try:
+            store = cls(store_dir)
+        except (OSError, ValueError, KeyError):
+            store = None
+        if store is not None and (stamp is None or store.meta.get('source') == stamp):
+            return store
+        return cls.from_json(json_path)
+    #endregion
+
+    #region views
+    def _records(self, columns: Dict[str, Tuple[Any, set]], count: int) -> List[Dict[str, Any]]:
+        as_lists = [
+            (name, values.tolist() if isinstance(values, np.ndarray) else values, missing)
+            for name, (values, missing) in columns.items()
+        ]
+        return [
+            {name: values[i] for name, values, missing in as_lists if i not in missing}
+            for i in range(count)
+        ]
+
+    def node_records(self) -> List[Dict[str, Any]]:
+        """Node dicts as in the JSON 'nodes' list (attribute-less endpoints are not included)."""
+        return self._records(self._node_columns, self.num_declared)
+
+    def edge_records(self) -> List[Dict[str, Any]]:
+        """Edge dicts with 'source' / 'target', in CSR order."""
+        sources, targets = self.edge_index()
+        records = self._records(self._edge_columns, self.num_edges)
+        return [
+            {'source': self.node_ids[u], 'target': self.node_ids[v], **record}
+            for u, v, record in zip(sources.tolist(), targets.tolist(), records)
+        ]
+
+    def to_json_data(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {'nodes': self.node_records(), 'edges': self.edge_records()}
+
+    def node_column(self, name: str, default: Any = None) -> List[Any]:
+        """Values of a node attribute for every node (`default` where it is missing)."""
+        values, missing = self._node_columns.get(name, ([], set()))
+        values = values.tolist() if isinstance(values, np.ndarray) else values
+        return [
+            values[i] if i < len(values) and i not in missing else default
+            for i in range(self.num_nodes)
+        ]
+
+    def edge_column(self, name: str, default: Any = None) -> Union[np.ndarray, List[Any]]:
+        """Edge attribute in CSR order; numeric columns come back as (memory-mapped) arrays."""
+        values, missing = self._edge_columns.get(name, ([default] * self.num_edges, set()))
+        if isinstance(values, np.ndarray):
+            return values
+        return [default if i in missing else value for i, value in enumerate(values)]
+
+    def edge_index(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(sources, targets) node indices of every edge, in CSR order."""
+        sources = np.repeat(np.arange(self.num_nodes, dtype=np.int64), np.diff(self.indptr))
+        return sources, np.asarray(self.indices)
+
+    def successors(self, node_id: str) -> List[str]:
+        i = self.index[node_id]
+        return [self.node_ids[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]].tolist()]
+
+    def to_networkx(self):
+        """nx.DiGraph with the same nodes, edges and attributes as the JSON loaders built."""
+        import networkx as nx
+
+        G = nx.DiGraph()
+        records = self.node_records()
+        G.add_nodes_from(zip(self.node_ids, records + [{} for _ in range(self.num_nodes - len(records))]))
+        G.add_edges_from((record['source'], record['target'], record) for record in self.edge_records())
+        return G
+
+    def to_igraph(self, directed: bool = True, node_attributes: Optional[Iterable[str]] = None):
+        """
+        igraph.Graph built in one call from the edge arrays. Vertex 'name' is the paper id;
+        node attributes (all by default) and edge attributes are copied as whole columns.
+        """
+        import igraph as ig
+
+        sources, targets = self.edge_index()
+        g = ig.Graph(n=self.num_nodes, edges=np.column_stack((sources, targets)).tolist(), directed=directed)
+        g.vs['name'] = list(self.node_ids)
+        names = self._node_columns if node_attributes is None else node_attributes
+        for name in names:
+            g.vs[name] = self.node_column(name)
+        for name in self._edge_columns:
+            column = self.edge_column(name)
+            g.es[name] = column.tolist() if isinstance(column, np.ndarray) else column
+        return g
+    #endregion
+
+
+def load_citation_graph(json_path: Union[str, Path], node_info: Optional[Dict[str, Dict[str, Any]]] = None):
+    """
+    paper_citation_graph.json as an nx.DiGraph, read through the store.
+    `node_info` (paper id -> metadata) is merged over the attributes of every node listed in
+    the JSON, so each of them must have an entry.
+    """
+    store = GraphStore.open(json_path)
+    G = store.to_networkx()
+    if node_info is not None:
+        for node_id in store.node_ids[:store.num_declared]:
+            G.nodes[node_id].update(node_info[node_id])
+    return G
+
+
+def save_graph_json(data: Dict[str, List[Dict]], json_path: Union[str, Path], **json_kwargs) -> GraphStore:
+    """Write the JSON atomically (indent=2 unless given) and rebuild its store from `data`."""
+    json_kwargs.setdefault('indent', 2)
+    tmp_path = f"{json_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **json_kwargs)
+    os.replace(tmp_path, json_path)
+    return GraphStore.write(data, store_dir_for(json_path), _source_stamp(json_path))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python -m src.modules.preprocessor.graph_store <paper_citation_graph.json> ...")
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        store = GraphStore.from_json(path)
+        print(f"{path} -> {store.store_dir} ({store.num_nodes} nodes, {store.num_edges} edges)")
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import re
@@ -92,8 +93,10 @@ class PaperFilter:
             for paper in papers
         ]
 
-        responses = self.chat_agent.batch_remote_chat(
-            prompt_l=prompts, desc="batch_remote_chat for fine grained sorting..."
+        responses = asyncio.run(
+            self.chat_agent.abatch_chat(
+                prompt_l=prompts, desc="abatch_chat for fine grained sorting..."
+            )
         )
 
         sorted_papers = []
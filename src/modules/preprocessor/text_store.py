@@ -0,0 +1,206 @@
+"""
+Content-addressed store for text extracted from paper PDFs.
+
+Records are keyed by the SHA-256 of the PDF bytes, so the same file under another
+topic folder, a re-download or an ablation run hits the same entry. Each record holds
+the raw extracted text, the cleaned text and character spans of the main sections
+(on the cleaned text), stored as gzip-compressed JSON under CACHE_DIR/text_store.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from src.configs.constants import CACHE_DIR
+
+TEXT_STORE_VERSION = 1
+_HEADING = re.compile(r'\n[a-z ]{3,20}\n')
+
+
+def abstract_span(text: str) -> Tuple[int, int]:
+    """From 'abstract' to the next 'introduction' (or 1000 chars); first 800 chars if no abstract."""
+    text_lower = text.lower()
+    start = text_lower.find('abstract')
+    if start == -1:
+        return 0, min(800, len(text))
+    end = text_lower.find('introduction', start)
+    if end == -1:
+        end = start + 1000
+    return start, min(end, len(text))
+
+
+def introduction_head_span(text: str) -> Tuple[int, int]:
+    """First 2000 chars from 'introduction'; chars 1000-2500 if there is no such heading."""
+    text_lower = text.lower()
+    start = text_lower.find('introduction')
+    if start == -1:
+        start = text_lower.find('1. introduction')
+    if start == -1:
+        return min(1000, len(text)), min(2500, len(text))
+    return start, min(start + 2000, len(text))
+
+
+def _heading_delimited_span(text: str, text_lower: str, start: int, skip: int) -> Tuple[int, int]:
+    """From `start` to the next short lowercase line that looks like a heading, or to the end."""
+    next_heading = _HEADING.search(text_lower[start + skip:])
+    end = start + skip + next_heading.start() if next_heading else len(text)
+    return start, end
+
+
+def introduction_span(text: str) -> Tuple[int, int]:
+    """The whole introduction, up to the next heading; (0, 0) if not found."""
+    text_lower = text.lower()
+    start = text_lower.find('introduction')
+    if start == -1:
+        return 0, 0
+    return _heading_delimited_span(text, text_lower, start, 12)
+
+
+def method_span(text: str) -> Tuple[int, int]:
+    """The 'methodology' (or 'methods') section, up to the next heading; (0, 0) if not found."""
+    text_lower = text.lower()
+    start = text_lower.find('methodology')
+    if start != -1:
+        return _heading_delimited_span(text, text_lower, start, 10)
+    start = text_lower.find('methods')
+    if start != -1:
+        return _heading_delimited_span(text, text_lower, start, 7)
+    return 0, 0
+
+
+def clean_text(text: str) -> str:
+    """Drop surrogate characters and U+FFFD left by broken PDF text layers."""
+    text = re.sub(r'[\ud800-\udfff]', '', text)
+    return text.replace('\ufffd', '')
+
+
+def find_section_spans(text: str) -> Dict[str, Tuple[int, int]]:
+    return {
+        'abstract': abstract_span(text),
+        'introduction_head': introduction_head_span(text),
+        'introduction': introduction_span(text),
+        'method': method_span(text),
+    }
+
+
+@dataclass
+class TextRecord:
+    digest: str
+    raw: str
+    cleaned: str
+    sections: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    backend: str = ''
+    version: int = TEXT_STORE_VERSION
+
+    def section(self, name: str) -> str:
+        """Text of a section of the cleaned text, '' if it was not found."""
+        start, end = self.sections.get(name, (0, 0))
+        return self.cleaned[start:end]
+
+
+class TextStore:
+    """
+    Read-through store: `get_or_extract` returns the stored record for a PDF, or runs the
+    extractor once, persists the result and returns it. Safe to share between threads and
+    processes (each record is written to a temp file and renamed into place).
+    """
+
+    DEFAULT_DIR = Path(f"{CACHE_DIR}/text_store")
+
+    def __init__(self, root: Union[str, Path] = DEFAULT_DIR) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # (path, size, mtime) -> digest, so unchanged files are hashed once per process
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def digest(self, file_path: Union[str, Path]) -> str:
+        """SHA-256 of the file content."""
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key in self._digests:
+                return self._digests[key]
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with self._lock:
+            self._digests[key] = digest
+        return digest
+
+    def _record_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.json.gz"
+
+    def contains(self, file_path: Union[str, Path]) -> bool:
+        try:
+            return self._record_path(self.digest(file_path)).exists()
+        except OSError:
+            return False
+
+    def get(self, file_path: Union[str, Path]) -> Optional[TextRecord]:
+        """Stored record for the file, or None."""
+        return self._load(self.digest(file_path))
+
+    def _load(self, digest: str) -> Optional[TextRecord]:
+        path = self._record_path(digest)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8', errors='surrogatepass') as f:
+                data = json.load(f)
+        except (OSError, EOFError, ValueError):
+            return None
+        if data.get('version') != TEXT_STORE_VERSION:
+            return None
+        data['sections'] = {name: tuple(span) for name, span in data.get('sections', {}).items()}
+        return TextRecord(**data)
+
+    def put(self, record: TextRecord) -> None:
+        # raw text may hold lone surrogates from broken PDFs; they round-trip through surrogatepass
+        path = self._record_path(record.digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = gzip.compress(json.dumps(asdict(record), ensure_ascii=False).encode('utf-8', 'surrogatepass'))
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get_or_extract(
+        self,
+        file_path: Union[str, Path],
+        extract: Callable[[str], str],
+        clean: Callable[[str], str] = clean_text,
+        backend: str = '',
+    ) -> TextRecord:
+        """
+        Return the stored record, extracting and storing it on a miss.
+        With a `backend`, a record extracted by another backend counts as a miss and is
+        replaced; without one, any stored record is returned.
+        Exceptions from `extract` (timeouts, broken PDFs) propagate and nothing is stored.
+        """
+        digest = self.digest(file_path)
+        record = self._load(digest)
+        if record is not None and (not backend or record.backend == backend):
+            return record
+        raw = extract(str(file_path))
+        cleaned = clean(raw)
+        record = TextRecord(
+            digest=digest,
+            raw=raw,
+            cleaned=cleaned,
+            sections=find_section_spans(cleaned),
+            backend=backend,
+        )
+        self.put(record)
+        return record
@@ -0,0 +1,79 @@
+"""
+Dependency-aware scheduler for writing survey subsections.
+
+Each subsection of the outline is a node. With the 'previous' context mode a subsection
+depends on the one before it in the same section (its text is the PRE_SUBSECTION context);
+with the 'focus' mode it is seeded with the outline-level focus of the previous subsection
+instead, so every subsection is independent. Ready nodes run on a bounded thread pool.
+"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple
+
+SUBSECTION_CONTEXT_PREVIOUS = 'previous'  # text of the previous subsection, sequential within a section
+SUBSECTION_CONTEXT_FOCUS = 'focus'  # outline focus of the previous subsection, fully parallel
+DEFAULT_SECTION_WORKERS = 4
+
+
+def build_subsection_dag(outline_json: List[Dict], context_mode: str = SUBSECTION_CONTEXT_PREVIOUS
+                         ) -> Dict[Tuple[int, int], List[Tuple[int, int]]]:
+    """
+    Map (section index, subsection index) -> the nodes it waits for.
+    Sections never depend on each other: the previous section is only used by the
+    (disabled) section overview.
+    """
+    if context_mode not in (SUBSECTION_CONTEXT_PREVIOUS, SUBSECTION_CONTEXT_FOCUS):
+        raise ValueError(f"Unknown subsection context mode: {context_mode}")
+    deps = {}
+    for s, section_data in enumerate(outline_json):
+        for i, _ in enumerate(section_data.get('subsections', [])):
+            if context_mode == SUBSECTION_CONTEXT_PREVIOUS and i > 0:
+                deps[(s, i)] = [(s, i - 1)]
+            else:
+                deps[(s, i)] = []
+    return deps
+
+
+def run_dag(deps: Dict[Hashable, Sequence[Hashable]],
+            run: Callable[[Hashable, Dict[Hashable, Any]], Any],
+            max_workers: int = DEFAULT_SECTION_WORKERS) -> Dict[Hashable, Any]:
+    """
+    Run `run(node, results)` for every node once all of its dependencies have finished,
+    at most `max_workers` at a time. `results` holds the return values of finished nodes.
+    An exception in a node stops scheduling new nodes and is re-raised once the running ones end.
+    """
+    remaining = {node: len(set(parents)) for node, parents in deps.items()}
+    children = {node: [] for node in deps}
+    for node, parents in deps.items():
+        for parent in set(parents):
+            if parent not in deps:
+                raise ValueError(f"{node} depends on unknown node {parent}")
+            children[parent].append(node)
+
+    results = {}
+    order = {node: k for k, node in enumerate(deps)}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        running = {}
+
+        def submit_ready(nodes):
+            # outline order, so with few workers early sections still finish first
+            for node in sorted(nodes, key=order.get):
+                running[executor.submit(run, node, results)] = node
+
+        submit_ready([node for node, count in remaining.items() if count == 0])
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            ready = []
+            for future in done:
+                node = running.pop(future)
+                # re-raises the node's exception; running nodes finish when the pool shuts down
+                results[node] = future.result()
+                for child in children[node]:
+                    remaining[child] -= 1
+                    if remaining[child] == 0:
+                        ready.append(child)
+            submit_ready(ready)
+
+    if len(results) != len(deps):
+        raise ValueError("Dependency cycle in section DAG: "
+                         f"{[node for node in deps if node not in results]}")
+    return results
@@ -5,9 +5,6 @@ import os
 import json
 import numpy as np
 from typing import Optional, List, Dict, Any, Tuple
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
 from datetime import datetime
 import hashlib
 import glob
@@ -20,30 +17,225 @@ from dotenv import load_dotenv, find_dotenv
 from pathlib import Path
 import random
 import string
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, CancelledError
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from collections import deque, OrderedDict
+from functools import partial
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../'))
+from src.modules.preprocessor.text_store import (
+    TextRecord, TextStore, abstract_span, introduction_head_span, clean_text as clean_extracted_text
+)
+from src.configs.config import LLM_CACHE_ENABLED
+from src.models.LLM.response_cache import ResponseCache
+from src.models.LLM.rate_limiter import (
+    RateScheduler, error_status, estimate_tokens, is_transient_error, wait_unless_rate_limited
+)
+
+DEFAULT_SUMMARIZE_WORKERS = 4
+# PDF extraction chạy trong process pool riêng, song song với các lời gọi LLM
+DEFAULT_PDF_BACKEND = 'auto'  # 'pymupdf' | 'pypdf2' | 'auto' (pymupdf nếu có)
+DEFAULT_PDF_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+DEFAULT_PDF_TIMEOUT = 120  # giây cho mỗi khối trang kể từ lúc worker nhận nó, tránh treo vì PDF lỗi
+PDF_PAGES_PER_TASK = 16
+PDF_QUEUE_POLL_INTERVAL = 0.1  # giây giữa hai lần kiểm tra khối trang còn nằm trong hàng đợi đã chạy chưa
+DEFAULT_EMBED_BATCH_SIZE = 64  # số văn bản encode / ghi ChromaDB mỗi lần
+QUERY_EMBEDDING_CACHE_SIZE = 2048  # số embedding truy vấn giữ lại (LRU) giữa các vòng cải thiện
+RRF_K = 60  # hằng số k của reciprocal-rank fusion
+
+#region Rate Limiting
+def _sdk_retry_after(exc: Exception) -> Optional[float]:
+    """Giây phải chờ theo RetryInfo trong lỗi 429 của Gemini SDK, None nếu không có"""
+    for detail in getattr(exc, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    return None
+#endregion
+
+#region PDF Extraction Backend
+def _import_pymupdf():
+    """PyMuPDF module (tên mới `pymupdf`, bản cũ chỉ có `fitz`), None nếu chưa cài"""
+    try:
+        import pymupdf
+        return pymupdf
+    except ImportError:
+        pass
+    try:
+        import fitz
+    except ImportError:
+        return None
+    return fitz if hasattr(fitz, 'open') else None
+
+def _extract_pdf_pages(file_path: str, backend: str, start: int, stop: int) -> Tuple[List[str], int]:
+    """Chạy trong worker process: trả về text của các trang [start, stop) và tổng số trang"""
+    if backend == 'pymupdf':
+        with _import_pymupdf().open(file_path) as doc:
+            total_pages = doc.page_count
+            return [doc.load_page(i).get_text() for i in range(start, min(stop, total_pages))], total_pages
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        total_pages = len(pdf_reader.pages)
+        return [pdf_reader.pages[i].extract_text() or "" for i in range(start, min(stop, total_pages))], total_pages
+
+class PDFTextExtractor:
+    """
+    Trích xuất text PDF trong process pool: mỗi file được chia thành các khối `pages_per_task` trang
+    xử lý song song, ghép lại bằng list buffer. `prefetch()` xếp file vào hàng đợi đọc trước (tối đa
+    `prefetch_window` file cùng lúc) để việc đọc PDF chạy chồng lên các lời gọi LLM.
+    Khối trang chạy quá `timeout` giây thì worker bị dừng hẳn; thời gian khối nằm chờ trong hàng
+    đợi của pool (sau khối của các file khác) không được tính.
+    """
+    def __init__(self, backend: str = DEFAULT_PDF_BACKEND, max_workers: int = DEFAULT_PDF_WORKERS,
+                 timeout: float = DEFAULT_PDF_TIMEOUT, pages_per_task: int = PDF_PAGES_PER_TASK,
+                 prefetch_window: Optional[int] = None):
+        if backend == 'auto':
+            backend = 'pymupdf' if _import_pymupdf() is not None else 'pypdf2'
+        self.backend = backend
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.pages_per_task = pages_per_task
+        # cửa sổ nhỏ để các khối trang còn lại của một file không phải xếp sau cả thư mục
+        self.prefetch_window = prefetch_window or 2 * self.max_workers
+        self._pool = None
+        self._queue = deque()
+        self._prefetched = {}
+        self._lock = threading.Lock()
+
+    def _submit(self, file_path: str, start: int):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            pool = self._pool
+        return pool.submit(_extract_pdf_pages, file_path, self.backend, start, start + self.pages_per_task)
+
+    def prefetch(self, file_path: str):
+        """Xếp file vào hàng đợi đọc trước, không chờ kết quả"""
+        with self._lock:
+            self._queue.append(file_path)
+        self._top_up()
+
+    def _top_up(self):
+        """Gửi khối trang đầu tiên của các file tiếp theo cho tới khi đủ `prefetch_window`"""
+        while True:
+            with self._lock:
+                if not self._queue or len(self._prefetched) >= self.prefetch_window:
+                    return
+                file_path = self._queue.popleft()
+                if file_path in self._prefetched:
+                    continue
+                # giữ chỗ trước khi submit để thread khác không gửi trùng
+                self._prefetched[file_path] = None
+            future = self._submit(file_path, 0)
+            with self._lock:
+                if file_path in self._prefetched:
+                    self._prefetched[file_path] = future
+
+    def extract(self, file_path: str) -> str:
+        """Text của toàn bộ file (mỗi trang kết thúc bằng '\\n'); TimeoutError nếu quá `timeout`"""
+        with self._lock:
+            first = self._prefetched.pop(file_path, None)
+            if file_path in self._queue:
+                self._queue.remove(file_path)
+        self._top_up()
+        try:
+            return self._extract(file_path, first)
+        except (RuntimeError, CancelledError):
+            # Pool bị khởi động lại trong lúc chờ (do file khác timeout): thử lại một lần
+            return self._extract(file_path, None)
+
+    def _extract(self, file_path: str, first) -> str:
+        if first is None:
+            first = self._submit(file_path, 0)
+        pages, total_pages = self._wait(first)
+        buffer = list(pages)
+        rest = [self._submit(file_path, start) for start in range(self.pages_per_task, total_pages, self.pages_per_task)]
+        for future in rest:
+            buffer.extend(self._wait(future)[0])
+        return "".join(page + "\n" for page in buffer)
+
+    def _wait(self, future):
+        """
+        Kết quả của một khối trang. Đồng hồ `timeout` bắt đầu khi pool chuyển khối cho worker
+        (future.running()), nên một file không bị tính giờ khi chờ sau các file khác.
+        """
+        started = None
+        while True:
+            if started is None and (future.running() or future.done()):
+                started = time.monotonic()
+            wait = PDF_QUEUE_POLL_INTERVAL if started is None else max(0.0, started + self.timeout - time.monotonic())
+            try:
+                return future.result(timeout=wait)
+            except FuturesTimeoutError:
+                if started is not None and time.monotonic() >= started + self.timeout:
+                    self._restart_pool()
+                    raise TimeoutError(f"PDF extraction exceeded {self.timeout}s")
+
+    def _restart_pool(self):
+        """Task đang chạy không hủy được, nên dừng các worker process và tạo pool mới khi cần"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            # các file đang đọc dở được đưa lại vào đầu hàng đợi
+            self._queue.extendleft(reversed(list(self._prefetched)))
+            self._prefetched.clear()
+        if pool is None:
+            return
+        for process in list((getattr(pool, '_processes', None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._queue.clear()
+            self._prefetched.clear()
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+#endregion
+
 #region PaperSummarizerRAG Class Definition
 class PaperSummarizerRAG:
     #region Constructor and Initialization
-    def __init__(self, query: str, api_key: str, rag_db_path: str = "./rag_database"):
+    def __init__(self, query: str, api_key: str, rag_db_path: str = "./rag_database",
+                 pdf_backend: str = DEFAULT_PDF_BACKEND):
         """
         Khởi tạo Paper Summarizer với RAG System
         
         Args:
             api_key (str): Gemini API key
             rag_db_path (str): Đường dẫn đến database RAG
+            pdf_backend (str): Backend đọc PDF: 'pymupdf', 'pypdf2' hoặc 'auto'
         """
         self.query = query
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # Khởi tạo embedding model
-        self.embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-        
-        # Khởi tạo ChromaDB cho RAG
-        self.client = chromadb.PersistentClient(path=rag_db_path)
-        self.collection = self.client.get_or_create_collection(
-            name="paper_summaries",
-            metadata={"hnsw:space": "cosine"}
-        )
+        self.model_name = 'gemini-2.5-flash'
+        self.model = genai.GenerativeModel(self.model_name)
+        
+        # Quota Gemini (RATE_LIMITS["gemini"]) lấy từ RateScheduler dùng chung với ChatAgent trong process
+        self.scheduler = RateScheduler.default()
+        # Cache phản hồi LLM trên đĩa (dùng chung với ChatAgent): chạy lại không trả tiền cho prompt cũ
+        self.response_cache = ResponseCache.default() if LLM_CACHE_ENABLED else None
+        # ChromaDB/embedding model và metadata_cache được dùng chung giữa các thread
+        self._rag_lock = threading.Lock()
+        self._metadata_lock = threading.RLock()
+        self._journal_lock = threading.RLock()
+        # LRU: câu truy vấn -> embedding, các vòng cải thiện hay hỏi lại cùng truy vấn
+        self._query_embedding_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        # PDF được đọc trong process pool, không chiếm main thread / GIL
+        self.pdf_extractor = PDFTextExtractor(backend=pdf_backend)
+        # Text đã trích xuất được lưu theo hash nội dung PDF, lần chạy sau đọc lại trong vài ms
+        self.text_store = TextStore()
+        
+        # Embedding model và ChromaDB chỉ được nạp ở lần dùng đầu tiên (xem các property bên dưới),
+        # nên import module / --help không phải chờ torch, sentence-transformers, chromadb
+        self.rag_db_path = rag_db_path
+        self._embedding_model = None
+        self._client = None
+        self._collection = None
+        self._lazy_init_lock = threading.Lock()
         
         # Thống kê xử lý
         self.processing_stats = {
@@ -66,6 +258,38 @@ class PaperSummarizerRAG:
         self.metadata_file_path = f"paper_data/{query.replace(' ', '_').replace(':', '')}/info/metadata_all_papers.json"
         self.metadata_cache = None
         self._load_metadata()
+
+    @property
+    def embedding_model(self):
+        """SentenceTransformer, nạp ở lần encode đầu tiên"""
+        if self._embedding_model is None:
+            with self._lazy_init_lock:
+                if self._embedding_model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+        return self._embedding_model
+
+    @property
+    def client(self):
+        """ChromaDB client cho RAG, mở ở lần truy cập đầu tiên"""
+        if self._client is None:
+            with self._lazy_init_lock:
+                if self._client is None:
+                    import chromadb
+                    self._client = chromadb.PersistentClient(path=self.rag_db_path)
+        return self._client
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            client = self.client
+            with self._lazy_init_lock:
+                if self._collection is None:
+                    self._collection = client.get_or_create_collection(
+                        name="paper_summaries",
+                        metadata={"hnsw:space": "cosine"}
+                    )
+        return self._collection
     #endregion
     
     #region Metadata Management
@@ -87,6 +311,45 @@ class PaperSummarizerRAG:
         except Exception as e:
             print(f"❌ Error loading metadata: {e}")
             self.metadata_cache = {}
+        self._build_metadata_index()
+    
+    def _build_metadata_index(self):
+        """Xây lại toàn bộ index tra cứu metadata_cache"""
+        with self._metadata_lock:
+            # lookup key (normalized path / basename / paper id) -> key trong metadata_cache
+            self._metadata_index = {}
+            # hậu tố đường dẫn (theo từng thành phần) -> key trong metadata_cache
+            self._metadata_suffix_index = {}
+            for key, value in self.metadata_cache.items():
+                self._index_metadata_entry(key, value)
+    
+    def _index_metadata_entry(self, key: str, value: Optional[Dict]):
+        """
+        Thêm một entry vào index. Key xuất hiện trước được ưu tiên,
+        giống thứ tự duyệt của phép so khớp tuyến tính trước đây.
+        """
+        normalized_key = os.path.normpath(key)
+        base_name = os.path.basename(normalized_key)
+        lookup_keys = [normalized_key, base_name, os.path.splitext(base_name)[0]]
+        if isinstance(value, dict):
+            for id_field in ('paperId', 'paper_id', 'id'):
+                if value.get(id_field):
+                    lookup_keys.append(str(value[id_field]))
+            if isinstance(value.get('file_path'), str) and value['file_path']:
+                value_path = os.path.normpath(value['file_path'])
+                lookup_keys.extend([value_path, os.path.basename(value_path)])
+        for lookup_key in lookup_keys:
+            self._metadata_index.setdefault(lookup_key, key)
+        
+        parts = normalized_key.split(os.sep)
+        for i in range(len(parts)):
+            self._metadata_suffix_index.setdefault(os.sep.join(parts[i:]), key)
+    
+    def _set_metadata(self, file_name: str, metadata: Dict):
+        """Cập nhật metadata_cache[file_name] và index tương ứng"""
+        with self._metadata_lock:
+            self.metadata_cache[file_name] = metadata
+            self._index_metadata_entry(file_name, metadata)
         
     def _find_metadata_by_file_path(self, file_path: str) -> Optional[Dict]:
         """
@@ -113,10 +376,19 @@ class PaperSummarizerRAG:
         if file_name in self.metadata_cache:
             return self.metadata_cache[file_name]
         
-        # Tìm theo pattern matching
-        for key, value in self.metadata_cache.items():
-            if file_name in key or key in normalized_path:
-                return value
+        with self._metadata_lock:
+            # Tìm theo index: đường dẫn chuẩn hóa, tên file, paper id
+            for lookup_key in (normalized_path, file_name, os.path.splitext(file_name)[0]):
+                key = self._metadata_index.get(lookup_key)
+                if key is not None:
+                    return self.metadata_cache.get(key)
+            
+            # Fuzzy: key là hậu tố của đường dẫn (chi phí O(độ sâu đường dẫn))
+            parts = normalized_path.split(os.sep)
+            for i in range(len(parts)):
+                key = self._metadata_suffix_index.get(os.sep.join(parts[i:]))
+                if key is not None:
+                    return self.metadata_cache.get(key)
         
         return None
 
@@ -184,18 +456,20 @@ class PaperSummarizerRAG:
     #endregion
     
     #region File Reading Methods    
-    def read_pdf(self, file_path: str) -> str:
-        """Đọc nội dung từ file PDF"""
-        text = ""
+    def read_pdf_record(self, file_path: str) -> Optional[TextRecord]:
+        """Bản ghi TextStore của file PDF (raw, cleaned, các đoạn section); trích xuất qua PDFTextExtractor nếu chưa có"""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
+            return self.text_store.get_or_extract(
+                file_path, self.pdf_extractor.extract, self.clean_text, backend=self.pdf_extractor.backend
+            )
         except Exception as e:
             print(f"Lỗi khi đọc PDF {file_path}: {e}")
-            return ""
-        return text
+            return None
+
+    def read_pdf(self, file_path: str) -> str:
+        """Đọc nội dung từ file PDF: lấy từ TextStore, nếu chưa có thì trích xuất qua PDFTextExtractor"""
+        record = self.read_pdf_record(file_path)
+        return record.raw if record is not None else ""
     
     def read_docx(self, file_path: str) -> str:
         """Đọc nội dung từ file Word"""
@@ -238,6 +512,51 @@ class PaperSummarizerRAG:
     #endregion
     
     #region Text Processing Methods
+    @retry(
+        stop=stop_after_attempt(30),
+        wait=wait_unless_rate_limited(wait_exponential(min=1, max=300)),
+        retry=retry_if_exception(is_transient_error),
+        reraise=True,
+    )
+    def _generate_content(self, prompt: str, temperature: float):
+        """
+        Gọi Gemini khi RateScheduler cho phép (quota chung với các worker thread và ChatAgent).
+        Kết quả được báo lại cho scheduler: 429 kích hoạt cooldown (Retry-After) và giảm
+        concurrency (AIMD); 429 / 5xx được thử lại như ChatAgent.gemini_chat
+        """
+        with self.scheduler.slot("gemini", self.model_name, estimate_tokens(prompt)) as slot:
+            try:
+                response = self.model.generate_content(
+                    prompt,
+                    generation_config=genai.types.GenerationConfig(
+                        max_output_tokens=102400,
+                        temperature=temperature,
+                    )
+                )
+            except Exception as e:
+                status = error_status(e)
+                if status is not None:
+                    retry_after = _sdk_retry_after(e)
+                    headers = {'Retry-After': str(retry_after)} if retry_after is not None else None
+                    slot.observe(status, headers, str(e))
+                raise
+            usage = getattr(response, 'usage_metadata', None)
+            slot.observe(200, used_tokens=getattr(usage, 'prompt_token_count', None))
+            return response
+    
+    def _generate_text(self, prompt: str, temperature: float) -> str:
+        """Text trả về của Gemini, đọc từ ResponseCache nếu prompt này đã được gọi trước đó"""
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = ResponseCache.make_key("gemini", self.model_name, temperature, prompt)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        text = self._generate_content(prompt, temperature).text
+        if cache_key is not None:
+            self.response_cache.put(cache_key, text)
+        return text
+    
     def chunk_text(self, text: str, max_tokens: int = 800000) -> list:
         """Chia văn bản thành các phần nhỏ"""
         max_chars = max_tokens * 4
@@ -289,14 +608,7 @@ class PaperSummarizerRAG:
         """
         
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=102400,
-                    temperature=0.3,
-                )
-            )
-            return response.text.strip()
+            return self._generate_text(prompt, temperature=0.3).strip()
         except Exception as e:
             print(f"Lỗi khi tạo abstract: {e}")
             return ""
@@ -329,14 +641,8 @@ class PaperSummarizerRAG:
         """
         
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=102400,
-                    temperature=0.1,
-                )
-            )
-            keywords = [kw.strip() for kw in response.text.strip().split(',')]
+            response_text = self._generate_text(prompt, temperature=0.1)
+            keywords = [kw.strip() for kw in response_text.strip().split(',')]
             return keywords[:15]  # Giới hạn 15 keywords
         except Exception as e:
             print(f"Lỗi khi trích xuất keywords: {e}")
@@ -344,13 +650,19 @@ class PaperSummarizerRAG:
     #endregion
     
     #region Paper Type Detection Methods
-    def enhanced_detect_paper_type(self, paper_text: str, paper_metadata: dict) -> str:
+    def enhanced_detect_paper_type(self, paper_text: str, paper_metadata: dict,
+                                   record: Optional[TextRecord] = None) -> str:
         """
         Enhanced detection with better text extraction
+        (abstract/introduction come from the stored section spans when `record` is given)
         """
         # Try to extract abstract specifically
-        abstract = self.extract_abstract(paper_text)
-        introduction = self.extract_introduction(paper_text)
+        if record is not None:
+            abstract = record.section('abstract')
+            introduction = record.section('introduction_head')
+        else:
+            abstract = self.extract_abstract(paper_text)
+            introduction = self.extract_introduction(paper_text)
         
         # Use structured content for better detection
         structured_content = f"""
@@ -403,35 +715,14 @@ class PaperSummarizerRAG:
         return detection_prompt
     
     def extract_abstract(self, paper_text: str) -> str:
-        """Extract abstract section from paper text"""
-        # Simple extraction - can be improved with better NLP
-        text_lower = paper_text.lower()
-        
-        # Look for abstract section
-        abstract_start = text_lower.find('abstract')
-        if abstract_start == -1:
-            return paper_text[:800]  # First 800 chars if no abstract found
-        
-        # Find end of abstract (usually next section)
-        abstract_end = text_lower.find('introduction', abstract_start)
-        if abstract_end == -1:
-            abstract_end = abstract_start + 1000
-        
-        return paper_text[abstract_start:abstract_end]
+        """Extract abstract section from paper text (same span as stored in TextStore)"""
+        start, end = abstract_span(paper_text)
+        return paper_text[start:end]
     
     def extract_introduction(self, paper_text: str) -> str:
-        """Extract introduction section from paper text"""
-        text_lower = paper_text.lower()
-        
-        # Look for introduction
-        intro_start = text_lower.find('introduction')
-        if intro_start == -1:
-            intro_start = text_lower.find('1. introduction')
-        if intro_start == -1:
-            return paper_text[1000:2500]  # Skip abstract, take next part
-        
-        # Take first part of introduction
-        return paper_text[intro_start:intro_start + 2000]
+        """Extract the first part of the introduction (same span as stored in TextStore)"""
+        start, end = introduction_head_span(paper_text)
+        return paper_text[start:end]
     #endregion
     
     #region Summary Prompt Generation Methods
@@ -762,37 +1053,24 @@ class PaperSummarizerRAG:
     #endregion
     
     #region Paper Analysis Methods
-    def analyze_paper_with_type_detection(self, citation_key: str, paper_metadata: dict, paper_text: str):
+    def analyze_paper_with_type_detection(self, citation_key: str, paper_metadata: dict, paper_text: str,
+                                          record: Optional[TextRecord] = None):
         """Complete analysis with automatic type detection"""
         # First detect paper type
-        detection_prompt = self.enhanced_detect_paper_type(paper_text, paper_metadata)
+        detection_prompt = self.enhanced_detect_paper_type(paper_text, paper_metadata, record)
         
         # Then get appropriate summary prompt
         # (You would call your AI model here to get the paper type)
-        response = self.model.generate_content(
-                detection_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=102400,
-                    temperature=0.1,
-                )
-            )
+        response_text = self._generate_text(detection_prompt, temperature=0.1)
         
         # paper_type, is_new_direction = response.text.replace("'", "").replace('"', '').replace(" ", '').split(',')[0], response.text.replace("'", "").replace('"', '').replace(" ", '').split(',')[-1]
-        paper_type = response.text.strip().lower()
+        paper_type = response_text.strip().lower()
         # paper_type = response.candidates[0].content.parts.text.strip().lower()
         print(f"Detected paper type: {paper_type}")
         # For now, return both detection and summary prompts
 
         prompt_summarize = self.get_prompt_by_type(paper_type, citation_key, paper_metadata, paper_text)
-        response = self.model.generate_content(
-                prompt_summarize,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=102400,
-                    temperature=0.1,
-                )
-            )
-            
-        return response.text, paper_type
+        return self._generate_text(prompt_summarize, temperature=0.1), paper_type
     #endregion
     
     #region Document Management Methods    
@@ -819,6 +1097,47 @@ class PaperSummarizerRAG:
             return 0, None
     
     #region RAG System Methods
+    def encode_texts(self, texts: List[str], batch_size: int = DEFAULT_EMBED_BATCH_SIZE) -> np.ndarray:
+        """
+        Encode nhiều văn bản theo batch, trả về ma trận float32 đã chuẩn hóa L2 (mỗi hàng một văn bản)
+        """
+        if not texts:
+            return np.zeros((0, self.embedding_model.get_sentence_embedding_dimension()), dtype=np.float32)
+        with self._rag_lock:
+            embeddings = self.embedding_model.encode(
+                list(texts),
+                batch_size=batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def encode_queries(self, queries: List[str], batch_size: int = DEFAULT_EMBED_BATCH_SIZE) -> np.ndarray:
+        """
+        Như encode_texts nhưng cho câu truy vấn: embedding được giữ trong LRU cache,
+        chỉ các truy vấn chưa gặp mới được encode (trong một batch)
+        """
+        embeddings = {}
+        with self._query_cache_lock:
+            for query in queries:
+                if query in self._query_embedding_cache:
+                    self._query_embedding_cache.move_to_end(query)
+                    embeddings[query] = self._query_embedding_cache[query]
+        missing = list(dict.fromkeys(query for query in queries if query not in embeddings))
+        if missing:
+            encoded = self.encode_texts(missing, batch_size)
+            with self._query_cache_lock:
+                for query, embedding in zip(missing, encoded):
+                    embeddings[query] = embedding
+                    self._query_embedding_cache[query] = embedding
+                    self._query_embedding_cache.move_to_end(query)
+                while len(self._query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+                    self._query_embedding_cache.popitem(last=False)
+        if not queries:
+            return self.encode_texts([])
+        return np.stack([embeddings[query] for query in queries])
+
     def save_to_rag(self, file_path: str, summary: str, intriguing_abstract: str, keywords: List[str]) -> str:
         """
         Lưu summary và abstract vào RAG system
@@ -832,65 +1151,103 @@ class PaperSummarizerRAG:
         Returns:
             str: ID của document trong RAG
         """
-        # Tạo ID duy nhất
-        doc_id = self.generate_document_id(file_path)
-        
-        # Tạo embedding cho abstract (dùng để search)
-        abstract_embedding = self.embedding_model.encode(intriguing_abstract).tolist()
-        
-        # Metadata bao gồm cả summary đầy đủ
-        metadata = {
+        return self.save_many_to_rag([{
             "file_path": file_path,
-            "file_name": os.path.basename(file_path),
-            "created_at": datetime.now().isoformat(),
-            "keywords": ", ".join(keywords) if isinstance(keywords, list) else str(keywords), 
-            "summary_length": len(summary),
-            "abstract_length": len(intriguing_abstract),
-            "full_summary": summary  # Lưu summary vào metadata
-        }
+            "summary": summary,
+            "intriguing_abstract": intriguing_abstract,
+            "keywords": keywords
+        }])[0]
+
+    def save_many_to_rag(self, papers: List[Dict[str, Any]],
+                         batch_size: int = DEFAULT_EMBED_BATCH_SIZE) -> List[str]:
+        """
+        Lưu nhiều paper vào RAG system cùng lúc: encode theo batch, ghi ChromaDB nhiều hàng
+        mỗi lần `add`, file keywords chung chỉ đọc/ghi một lần
         
-        # Lưu vào ChromaDB với cả abstract và summary
-        self.collection.add(
-            documents=[intriguing_abstract],  # Dùng abstract để search
-            metadatas=[metadata],
-            embeddings=[abstract_embedding],
-            ids=[doc_id]
-        )
+        Args:
+            papers (List[Dict]): Mỗi phần tử có file_path, summary, intriguing_abstract, keywords
+            batch_size (int): Số paper mỗi batch encode / add
+            
+        Returns:
+            List[str]: ID của từng document trong RAG (cùng thứ tự với papers)
+        """
+        doc_ids = [self.generate_document_id(paper["file_path"]) for paper in papers]
+        if not papers:
+            return doc_ids
         
-        # Vẫn lưu backup vào file để dễ đọc
-        os.makedirs(f"paper_data/{self.query.replace(' ', '_').replace(':', '')}/full_summary", exist_ok=True)
-        summary_file = f"paper_data/{self.query.replace(' ', '_').replace(':', '')}/full_summary/{doc_id}_full_summary.txt"
-        os.makedirs(f"paper_data/{self.query.replace(' ', '_').replace(':', '')}", exist_ok=True)
-        with open(summary_file, 'w', encoding='utf-8') as f:
-            f.write(f"File: {file_path}\n")
-            f.write(f"Created: {datetime.now().isoformat()}\n")
-            f.write(f"Keywords: {', '.join(keywords)}\n")
-            f.write("=" * 50 + "\n")
-            f.write("INTRIGUING ABSTRACT:\n")
-            f.write("=" * 50 + "\n")
-            f.write(intriguing_abstract + "\n\n")
-            f.write("=" * 50 + "\n")
-            f.write("FULL SUMMARY:\n")
-            f.write("=" * 50 + "\n")
-            f.write(summary)
-        
-        # Save all keywords to a single JSON file
-        all_keywords_json = f"paper_data/{self.query.replace(' ', '_').replace(':', '')}/keywords/all_paper_keywords.json"
-        # Load existing data if present
-        if os.path.exists(all_keywords_json):
-            try:
-                with open(all_keywords_json, 'r', encoding='utf-8') as jf:
-                    all_keywords = json.load(jf)
-            except Exception:
+        # Tạo embedding cho abstract (dùng để search)
+        embeddings = self.encode_texts([paper["intriguing_abstract"] for paper in papers], batch_size)
+        
+        query_dir = f"paper_data/{self.query.replace(' ', '_').replace(':', '')}"
+        # ChromaDB không nhận id trùng trong cùng một lần add, giữ bản đầu tiên như add từng hàng
+        seen_ids = set()
+        documents, metadatas, rows, ids = [], [], [], []
+        for row, (paper, doc_id) in enumerate(zip(papers, doc_ids)):
+            if doc_id in seen_ids:
+                continue
+            seen_ids.add(doc_id)
+            keywords = paper["keywords"]
+            # Metadata bao gồm cả summary đầy đủ
+            metadatas.append({
+                "file_path": paper["file_path"],
+                "file_name": os.path.basename(paper["file_path"]),
+                "created_at": datetime.now().isoformat(),
+                "keywords": ", ".join(keywords) if isinstance(keywords, list) else str(keywords), 
+                "summary_length": len(paper["summary"]),
+                "abstract_length": len(paper["intriguing_abstract"]),
+                "full_summary": paper["summary"]  # Lưu summary vào metadata
+            })
+            documents.append(paper["intriguing_abstract"])  # Dùng abstract để search
+            rows.append(row)
+            ids.append(doc_id)
+        
+        # Ghi ChromaDB + file keywords chung phải tuần tự giữa các worker
+        with self._rag_lock:
+            for start in range(0, len(ids), batch_size):
+                stop = start + batch_size
+                self.collection.add(
+                    documents=documents[start:stop],
+                    metadatas=metadatas[start:stop],
+                    embeddings=embeddings[rows[start:stop]],
+                    ids=ids[start:stop]
+                )
+        
+            # Vẫn lưu backup vào file để dễ đọc
+            os.makedirs(f"{query_dir}/full_summary", exist_ok=True)
+            for paper, doc_id in zip(papers, doc_ids):
+                summary_file = f"{query_dir}/full_summary/{doc_id}_full_summary.txt"
+                with open(summary_file, 'w', encoding='utf-8') as f:
+                    f.write(f"File: {paper['file_path']}\n")
+                    f.write(f"Created: {datetime.now().isoformat()}\n")
+                    f.write(f"Keywords: {', '.join(paper['keywords'])}\n")
+                    f.write("=" * 50 + "\n")
+                    f.write("INTRIGUING ABSTRACT:\n")
+                    f.write("=" * 50 + "\n")
+                    f.write(paper["intriguing_abstract"] + "\n\n")
+                    f.write("=" * 50 + "\n")
+                    f.write("FULL SUMMARY:\n")
+                    f.write("=" * 50 + "\n")
+                    f.write(paper["summary"])
+        
+            # Save all keywords to a single JSON file
+            all_keywords_json = f"{query_dir}/keywords/all_paper_keywords.json"
+            os.makedirs(f"{query_dir}/keywords", exist_ok=True)
+            # Load existing data if present
+            if os.path.exists(all_keywords_json):
+                try:
+                    with open(all_keywords_json, 'r', encoding='utf-8') as jf:
+                        all_keywords = json.load(jf)
+                except Exception:
+                    all_keywords = {}
+            else:
                 all_keywords = {}
-        else:
-            all_keywords = {}
-        # Use file_path as key for uniqueness
-        all_keywords[os.path.basename(file_path)] = keywords
-        with open(all_keywords_json, 'w', encoding='utf-8') as jf:
-            json.dump(all_keywords, jf, ensure_ascii=False, indent=2)
+            # Use file_path as key for uniqueness
+            for paper in papers:
+                all_keywords[os.path.basename(paper["file_path"])] = paper["keywords"]
+            with open(all_keywords_json, 'w', encoding='utf-8') as jf:
+                json.dump(all_keywords, jf, ensure_ascii=False, indent=2)
         
-        return doc_id
+        return doc_ids
     
     def search_similar_papers(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
         """
@@ -903,35 +1260,81 @@ class PaperSummarizerRAG:
         Returns:
             List[Dict]: Danh sách kết quả tìm kiếm
         """
-        try:
-            # Tạo embedding cho query
-            query_embedding = self.embedding_model.encode(query).tolist()
+        return self.search_many([query], n_results)[0]
+
+    def search_many(self, queries: List[str], n_results: int = 5,
+                    batch_size: int = DEFAULT_EMBED_BATCH_SIZE) -> List[List[Dict[str, Any]]]:
+        """
+        Tìm kiếm nhiều truy vấn cùng lúc: encode theo batch và gửi nhiều query_embeddings
+        trong một lần `query`
+        
+        Args:
+            queries (List[str]): Các câu truy vấn
+            n_results (int): Số kết quả trả về cho mỗi truy vấn
+            batch_size (int): Số truy vấn mỗi batch
             
-            # Tìm kiếm trong ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                include=['documents', 'metadatas', 'distances']
-            )
+        Returns:
+            List[List[Dict]]: Danh sách kết quả cho từng truy vấn (cùng thứ tự với queries)
+        """
+        all_results = []
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            try:
+                # Tạo embedding cho query
+                query_embeddings = self.encode_queries(batch, batch_size)
+                
+                # Tìm kiếm trong ChromaDB
+                results = self.collection.query(
+                    query_embeddings=query_embeddings,
+                    n_results=n_results,
+                    include=['documents', 'metadatas', 'distances']
+                )
+            except Exception as e:
+                print(f"Lỗi khi tìm kiếm: {e}")
+                all_results.extend([] for _ in batch)
+                continue
             
             # Định dạng kết quả
-            formatted_results = []
-            for i in range(len(results['documents'][0])):
-                metadata = results['metadatas'][0][i]
-                result = {
-                    'abstract': results['documents'][0][i],
-                    'full_summary': metadata.get('full_summary', ''),  # Lấy summary từ metadata
-                    'metadata': metadata,
-                    'similarity_score': 1 - results['distances'][0][i],  # Chuyển distance thành similarity
-                    'doc_id': results['ids'][0][i]
-                }
-                formatted_results.append(result)
-            
-            return formatted_results
+            for q in range(len(batch)):
+                formatted_results = []
+                for i in range(len(results['documents'][q])):
+                    metadata = results['metadatas'][q][i]
+                    formatted_results.append({
+                        'abstract': results['documents'][q][i],
+                        'full_summary': metadata.get('full_summary', ''),  # Lấy summary từ metadata
+                        'metadata': metadata,
+                        'similarity_score': 1 - results['distances'][q][i],  # Chuyển distance thành similarity
+                        'doc_id': results['ids'][q][i]
+                    })
+                all_results.append(formatted_results)
+        
+        return all_results
+
+    def search_fused(self, queries: List[str], n_results: int = 5, rrf_k: int = RRF_K) -> List[Dict[str, Any]]:
+        """
+        Tìm kiếm với nhiều truy vấn và gộp kết quả bằng reciprocal-rank fusion:
+        score(doc) = sum(1 / (rrf_k + rank)) trên các truy vấn trả về doc đó
+        
+        Args:
+            queries (List[str]): Các câu truy vấn (trùng lặp được bỏ qua)
+            n_results (int): Số kết quả lấy cho mỗi truy vấn
+            rrf_k (int): Hằng số k của RRF
             
-        except Exception as e:
-            print(f"Lỗi khi tìm kiếm: {e}")
-            return []
+        Returns:
+            List[Dict]: Kết quả không trùng doc_id, sắp xếp theo 'rrf_score' giảm dần;
+            'similarity_score' là độ tương đồng cao nhất trên các truy vấn
+        """
+        fused = {}
+        for results in self.search_many(list(dict.fromkeys(queries)), n_results):
+            for rank, result in enumerate(results, start=1):
+                doc_id = result['doc_id']
+                if doc_id not in fused:
+                    fused[doc_id] = dict(result, rrf_score=0.0)
+                entry = fused[doc_id]
+                entry['rrf_score'] += 1.0 / (rrf_k + rank)
+                entry['similarity_score'] = max(entry['similarity_score'], result['similarity_score'])
+        # sorted ổn định: cùng điểm thì giữ thứ tự truy vấn / rank như trước
+        return sorted(fused.values(), key=lambda entry: entry['rrf_score'], reverse=True)
     
     def get_full_summary(self, doc_id: str) -> str:
         """
@@ -1074,6 +1477,121 @@ class PaperSummarizerRAG:
             return {}
     #endregion
     
+    #region Checkpoint Journal
+    def get_journal_path(self, checkpoint_file: str) -> str:
+        """Đường dẫn journal JSONL đi kèm với file checkpoint"""
+        return os.path.splitext(checkpoint_file)[0] + '.journal.jsonl'
+    
+    def _append_journal(self, journal_file: str, result: Optional[Dict], 
+                        file_name: str = None, file_metadata: Dict = None):
+        """
+        Ghi thêm một record vào journal (append-only, một dòng JSON cho mỗi paper)
+        
+        Args:
+            journal_file (str): Đường dẫn journal
+            result (Dict): Kết quả xử lý paper (None nếu chỉ cập nhật metadata)
+            file_name (str): Key trong metadata_all_papers.json
+            file_metadata (Dict): Metadata mới của paper
+        """
+        record = {"result": result}
+        if file_name is not None and file_metadata is not None:
+            record["file_name"] = file_name
+            record["metadata"] = file_metadata
+        line = json.dumps(record, ensure_ascii=False)
+        with self._journal_lock:
+            with open(journal_file, 'a', encoding='utf-8') as jf:
+                jf.write(line + "\n")
+                jf.flush()
+    
+    def _replay_journal(self, journal_file: str, processed_results: List[Dict]) -> int:
+        """
+        Replay journal vào processed_results và metadata_cache
+        
+        Returns:
+            int: Số record đã replay
+        """
+        if not os.path.exists(journal_file):
+            return 0
+        replayed = 0
+        # Crash giữa lúc ghi checkpoint và xóa journal: record đã có trong checkpoint thì thay thế, không thêm lần nữa
+        index_by_path = {r.get('file_path'): i for i, r in enumerate(processed_results)
+                         if isinstance(r, dict) and r.get('file_path')}
+        with open(journal_file, 'r', encoding='utf-8') as jf:
+            for line in jf:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Dòng cuối bị cắt ngang khi crash
+                    print(f"⚠️  Skipping truncated journal record in {journal_file}")
+                    continue
+                result = record.get("result")
+                if result is not None:
+                    file_path = result.get('file_path') if isinstance(result, dict) else None
+                    if file_path in index_by_path:
+                        processed_results[index_by_path[file_path]] = result
+                    else:
+                        if file_path:
+                            index_by_path[file_path] = len(processed_results)
+                        processed_results.append(result)
+                if record.get("file_name") is not None and record.get("metadata") is not None:
+                    self._set_metadata(record["file_name"], record["metadata"])
+                replayed += 1
+        return replayed
+    
+    def _journal_summary(self, journal_file: str, file_name: str, future):
+        """
+        Done-callback của summarize_paper: ghi journal ngay khi paper xong (ở worker thread),
+        không chờ các paper đứng trước theo thứ tự đầu vào
+        """
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        file_metadata = result.get('metadata')
+        if result.get("success"):
+            self._append_journal(journal_file, result, file_name, file_metadata)
+        elif file_metadata is not None:
+            # Metadata update alone still has to survive a crash
+            self._append_journal(journal_file, None, file_name, file_metadata)
+
+    def _atomic_json_dump(self, data, path: str, **dump_kwargs):
+        """Ghi JSON vào file tạm rồi rename để không bao giờ để lại file dở dang"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **dump_kwargs)
+        os.replace(tmp_path, path)
+    
+    def compact_checkpoint(self, checkpoint_file: str, processed_results: List[Dict] = None):
+        """
+        Gộp journal vào layout JSON cũ (processed_checkpoint.json + metadata_all_papers.json)
+        rồi xóa journal. Có thể gọi bất kỳ lúc nào (on demand).
+        
+        Args:
+            checkpoint_file (str): Đường dẫn processed_checkpoint.json
+            processed_results (List[Dict]): Kết quả đã có trong bộ nhớ; nếu None sẽ đọc
+                checkpoint hiện tại từ đĩa và replay journal
+        """
+        journal_file = self.get_journal_path(checkpoint_file)
+        with self._journal_lock:
+            if processed_results is None:
+                processed_results = []
+                if os.path.exists(checkpoint_file):
+                    with open(checkpoint_file, 'r', encoding='utf-8') as cp:
+                        processed_results = json.load(cp)
+                self._replay_journal(journal_file, processed_results)
+            os.makedirs(os.path.dirname(checkpoint_file), exist_ok=True)
+            self._atomic_json_dump(processed_results, checkpoint_file, ensure_ascii=False, indent=2)
+            with self._metadata_lock:
+                if self.metadata_cache:
+                    os.makedirs(os.path.dirname(self.metadata_file_path), exist_ok=True)
+                    self._atomic_json_dump(self.metadata_cache, self.metadata_file_path, indent=4)
+            if os.path.exists(journal_file):
+                os.remove(journal_file)
+        return processed_results
+    #endregion
+    
     #region Paper Processing Methods
     def get_supported_files(self, folder_path: str) -> List[str]:
         """
@@ -1124,12 +1642,8 @@ class PaperSummarizerRAG:
         return metadata
         
     def clean_text(self, text):
-        """Remove surrogate characters and other problematic Unicode sequences"""
-        # Remove surrogate characters
-        text = re.sub(r'[\ud800-\udfff]', '', text)
-        # Replace other problematic characters if needed
-        text = text.replace('\ufffd', '')  # Replacement character
-        return text
+        """Remove surrogate characters and other problematic Unicode sequences (same cleaning as TextStore)"""
+        return clean_extracted_text(text)
     
     def summarize_paper(self, file_path: str) -> Dict[str, Any]:
         """
@@ -1142,8 +1656,17 @@ class PaperSummarizerRAG:
         Returns:
             Dict: Thông tin về quá trình tóm tắt và RAG
         """
-        paper_text = self.read_paper(file_path)
-        metadata = self._find_metadata_by_file_path(file_path)
+        # PDF: văn bản đã làm sạch và các section lấy thẳng từ TextStore, không xử lý lại
+        record = None
+        if os.path.splitext(file_path)[1].lower() == '.pdf' and os.path.exists(file_path):
+            record = self.read_pdf_record(file_path)
+            paper_text = record.cleaned if record is not None else ""
+        else:
+            paper_text = self.read_paper(file_path)
+        # Bản sao: worker không sửa trực tiếp dict trong metadata_cache khi main thread đang ghi nó ra JSON,
+        # metadata mới được đưa vào cache qua _set_metadata (có lock)
+        with self._metadata_lock:
+            metadata = dict(self._find_metadata_by_file_path(file_path) or {})
         metadata = self.ensure_metadata_completeness(metadata, file_path)
         citation_key = self.create_citation_key(metadata)
 
@@ -1181,8 +1704,9 @@ class PaperSummarizerRAG:
         
         # if len(chunks) == 1:
         #     # Paper ngắn, tóm tắt trực tiếp
-        paper_text = self.clean_text(paper_text)
-        summary, paper_type = self.analyze_paper_with_type_detection(citation_key, metadata, paper_text)
+        if record is None:
+            paper_text = self.clean_text(paper_text)
+        summary, paper_type = self.analyze_paper_with_type_detection(citation_key, metadata, paper_text, record)
         
         # else:
         #     # Paper dài, tóm tắt từng phần rồi tổng hợp
@@ -1224,7 +1748,8 @@ class PaperSummarizerRAG:
         }
     
     def process_folder(self, folder_path: str, 
-                      skip_existing: bool = True, delay_seconds: float = 1.0, metadata_file='') -> Dict[str, Any]:
+                      skip_existing: bool = True, delay_seconds: float = 0.0, metadata_file='',
+                      max_workers: int = 1) -> Dict[str, Any]:
         """
         Xử lý tất cả papers trong một folder
         
@@ -1232,7 +1757,9 @@ class PaperSummarizerRAG:
             folder_path (str): Đường dẫn thư mục chứa papers
             summary_type (str): Loại tóm tắt
             skip_existing (bool): Bỏ qua file đã được xử lý
-            delay_seconds (float): Thời gian chờ giữa các lần xử lý (để tránh rate limit)
+            delay_seconds (float): Nếu > 0, giới hạn thêm model tối đa 1 request / delay_seconds
+                (rate limit chính do RateScheduler dùng chung đảm nhận, không còn sleep cố định)
+            max_workers (int): Số paper được tóm tắt đồng thời. Kết quả vẫn giữ đúng thứ tự đầu vào.
             
         Returns:
             Dict: Thông tin về quá trình xử lý
@@ -1283,88 +1810,119 @@ class PaperSummarizerRAG:
         
         processed_results = []
         checkpoint_file = f"paper_data/{self.query.replace(' ', '_').replace(':', '')}/keywords/processed_checkpoint.json"
-        # Load checkpoint if exists
+        journal_file = self.get_journal_path(checkpoint_file)
+        # Load checkpoint if exists, then replay records appended since the last compaction
         already_processed_files = set()
-        if os.path.exists(checkpoint_file):
+        if os.path.exists(checkpoint_file) or os.path.exists(journal_file):
             try:
-                with open(checkpoint_file, 'r', encoding='utf-8') as cp:
-                    checkpoint_data = json.load(cp)
-                    # checkpoint_data is a list of dicts with 'file_path' key
-                    processed_results = checkpoint_data
-                    already_processed_files = set([r.get('file_path') for r in processed_results if r.get('file_path') and r.get('title') != 'Not available'])
-                    # Check for missing/null fields and fix from metadata
-                    for entry in processed_results:
-                        file_path = entry.get('file_path')
-                        if not file_path or file_path.endswith('.txt'):
-                            break
-                        # Check for null or missing fields
-                        fields_to_check = ['metadata', 'citation_key', 'file_name', 'keywords', 'summary', 'intriguing_abstract']
-                        for field in fields_to_check:
-                            if field not in entry or entry[field] is None:
-                                print(f"⚠️  Warning: '{field}' is null/missing for {file_path}. Attempting to fix from metadata file.")
-                                if field == 'metadata':
-                                    entry['metadata'] = self._find_metadata_by_file_path(file_path)
-                                elif field == 'citation_key':
-                                    entry['citation_key'] = self.create_citation_key(entry.get('metadata'), file_path)
-                                elif field == 'file_name':
-                                    entry['file_name'] = os.path.basename(file_path)
-                                elif field == 'keywords':
-                                    meta = entry.get('metadata')
-                                    entry['keywords'] = meta.get('keywords', []) if meta else []
-                                elif field == 'summary':
-                                    entry['summary'] = ''
-                                    if 'I apologize' in entry['summary']:
-                                        continue
-                                elif field == 'intriguing_abstract':
-                                    entry['intriguing_abstract'] = ''
-                        # Ensure metadata completeness
-                        entry['metadata'] = self.ensure_metadata_completeness(entry.get('metadata'), file_path)
+                checkpoint_data = []
+                if os.path.exists(checkpoint_file):
+                    with open(checkpoint_file, 'r', encoding='utf-8') as cp:
+                        checkpoint_data = json.load(cp)
+                replayed = self._replay_journal(journal_file, checkpoint_data)
+                if replayed:
+                    print(f"🔁 Replayed {replayed} records from journal: {journal_file}")
+                # checkpoint_data is a list of dicts with 'file_path' key
+                processed_results = checkpoint_data
+                already_processed_files = set([r.get('file_path') for r in processed_results if r.get('file_path') and r.get('title') != 'Not available'])
+                # Check for missing/null fields and fix from metadata
+                for entry in processed_results:
+                    file_path = entry.get('file_path')
+                    if not file_path or file_path.endswith('.txt'):
+                        break
+                    # Check for null or missing fields
+                    fields_to_check = ['metadata', 'citation_key', 'file_name', 'keywords', 'summary', 'intriguing_abstract']
+                    for field in fields_to_check:
+                        if field not in entry or entry[field] is None:
+                            print(f"⚠️  Warning: '{field}' is null/missing for {file_path}. Attempting to fix from metadata file.")
+                            if field == 'metadata':
+                                entry['metadata'] = self._find_metadata_by_file_path(file_path)
+                            elif field == 'citation_key':
+                                entry['citation_key'] = self.create_citation_key(entry.get('metadata'), file_path)
+                            elif field == 'file_name':
+                                entry['file_name'] = os.path.basename(file_path)
+                            elif field == 'keywords':
+                                meta = entry.get('metadata')
+                                entry['keywords'] = meta.get('keywords', []) if meta else []
+                            elif field == 'summary':
+                                entry['summary'] = ''
+                                if 'I apologize' in entry['summary']:
+                                    continue
+                            elif field == 'intriguing_abstract':
+                                entry['intriguing_abstract'] = ''
+                    # Ensure metadata completeness
+                    entry['metadata'] = self.ensure_metadata_completeness(entry.get('metadata'), file_path)
                 print(f"🔄 Resuming from checkpoint: {len(already_processed_files)} files already processed.")
+                if replayed:
+                    self.compact_checkpoint(checkpoint_file, processed_results)
             except Exception as e:
                 print(f"⚠️  Error loading checkpoint: {e}")
         
-        for i, file_path in enumerate(supported_files):
-            file_name = os.path.basename(file_path)
-            file_path = folder_path + '/' + file_path
-            if file_path in already_processed_files:
-                print(f"  ⏭️  Bỏ qua - File đã được lưu trong checkpoint")
-                self.processing_stats['skipped_files'].append(file_path)
-                continue
-            print(f"\n[{i+1}/{len(supported_files)}] Đang xử lý: {file_path}")
-            # Kiểm tra xem file đã được xử lý chưa
-            exising_flag, summary_ifTrue = self.is_paper_already_processed(file_path)
-            if skip_existing and exising_flag>0:
-                print(f"  ⏭️  Bỏ qua - File đã được xử lý trước đó")
-                self.processing_stats['skipped_files'].append(file_path)
-                processed_results.append(summary_ifTrue)
-                # Save checkpoint after skip
-                with open(checkpoint_file, 'w', encoding='utf-8') as cp:
-                    json.dump(processed_results, cp, ensure_ascii=False, indent=2)
-                continue
-            result = self.summarize_paper(file_path)
-            # print(file_name)
-            file_metadata = result['metadata']
-            self.metadata_cache[file_name] = file_metadata
-            with open(self.metadata_file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.metadata_cache, f, indent=4)
-            if result.get("success"):
-                print(f"  ✅ Xử lý thành công - ID: {result['doc_id']}")
-                print(f"     Keywords: {', '.join(result['keywords'][:3])}...")
-                self.processing_stats['processed_successfully'] += 1
-                processed_results.append(result)
-            else:
-                # print(f"  ❌ Lỗi: {result.get('error', 'Không xác định')}")
-                # self.processing_stats['failed_files'].append({
-                #     'file_path': file_path,
-                #     'error': result.get('error', 'Không xác định')
-                # })
-                continue
-            # Save checkpoint after each iteration
-            with open(checkpoint_file, 'w', encoding='utf-8') as cp:
-                json.dump(processed_results, cp, ensure_ascii=False, indent=2)
-            if i < len(supported_files) - 1:  # Không delay cho file cuối cùng
-                time.sleep(delay_seconds)
-        
+        if delay_seconds > 0:
+            self.scheduler.budget("gemini", self.model_name).limit_rpm(60.0 / delay_seconds)
+        
+        # Gửi các paper cần tóm tắt vào thread pool, nhưng thu kết quả theo thứ tự đầu vào
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            jobs = []
+            for i, file_path in enumerate(supported_files):
+                file_name = os.path.basename(file_path)
+                file_path = folder_path + '/' + file_path
+                if file_path in already_processed_files:
+                    print(f"  ⏭️  Bỏ qua - File đã được lưu trong checkpoint")
+                    self.processing_stats['skipped_files'].append(file_path)
+                    continue
+                print(f"\n[{i+1}/{len(supported_files)}] Đang xử lý: {file_path}")
+                # Kiểm tra xem file đã được xử lý chưa
+                exising_flag, summary_ifTrue = self.is_paper_already_processed(file_path)
+                if skip_existing and exising_flag>0:
+                    jobs.append((file_path, file_name, summary_ifTrue, None))
+                    continue
+                if file_path.lower().endswith('.pdf') and os.path.exists(file_path) \
+                        and not self.text_store.contains(file_path):
+                    # PDF bắt đầu được đọc ở process pool trong khi các thread đang gọi LLM
+                    self.pdf_extractor.prefetch(file_path)
+                future = executor.submit(self.summarize_paper, file_path)
+                future.add_done_callback(partial(self._journal_summary, journal_file, file_name))
+                jobs.append((file_path, file_name, None, future))
+            
+            for file_path, file_name, summary_ifTrue, future in jobs:
+                if future is None:
+                    print(f"  ⏭️  Bỏ qua - File đã được xử lý trước đó: {file_path}")
+                    self.processing_stats['skipped_files'].append(file_path)
+                    processed_results.append(summary_ifTrue)
+                    # Journal the skip instead of rewriting the whole checkpoint
+                    self._append_journal(journal_file, summary_ifTrue)
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"  ❌ Lỗi khi xử lý {file_path}: {e}")
+                    self.processing_stats['failed_files'].append({
+                        'file_path': file_path,
+                        'error': str(e)
+                    })
+                    continue
+                # print(file_name)
+                file_metadata = result.get('metadata')
+                if file_metadata is not None:
+                    self._set_metadata(file_name, file_metadata)
+                if result.get("success"):
+                    print(f"  ✅ Xử lý thành công - ID: {result['doc_id']}")
+                    print(f"     Keywords: {', '.join(result['keywords'][:3])}...")
+                    self.processing_stats['processed_successfully'] += 1
+                    processed_results.append(result)
+                else:
+                    # print(f"  ❌ Lỗi: {result.get('error', 'Không xác định')}")
+                    # self.processing_stats['failed_files'].append({
+                    #     'file_path': file_path,
+                    #     'error': result.get('error', 'Không xác định')
+                    # })
+                    continue
+                # the journal record was already appended by _journal_summary when the paper finished
+        
+        self.pdf_extractor.close()
+        if os.path.exists(journal_file):
+            self.compact_checkpoint(checkpoint_file, processed_results)
         self.processing_stats['end_time'] = datetime.now()
         
         # Tạo báo cáo tổng kết
@@ -1406,7 +1964,8 @@ def main():
             folder_path=paper_paths,
             skip_existing=True,  # Skip already processed files
             delay_seconds=0.0,
-            metadata_file = os.path.join(f"{paper_paths}/info", "metadata_all_papers.json")
+            metadata_file = os.path.join(f"{paper_paths}/info", "metadata_all_papers.json"),
+            max_workers=DEFAULT_SUMMARIZE_WORKERS
         )
 if __name__ == "__main__":
     main()
@@ -8,7 +8,6 @@ import re
 from typing import Optional, Dict, List, Tuple
 import pandas as pd
 from datetime import datetime
-import networkx as nx
 import sys
 import os
 
@@ -18,10 +17,21 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.join(current_dir, '../'))
 
 from writing.summarize import PaperSummarizerRAG
+from writing.section_scheduler import (
+    build_subsection_dag, run_dag,
+    SUBSECTION_CONTEXT_PREVIOUS, SUBSECTION_CONTEXT_FOCUS, DEFAULT_SECTION_WORKERS
+)
 import sys
 from dotenv import load_dotenv, find_dotenv
 from pathlib import Path 
 from scripts.prompt import PromptHelper
+from src.modules.preprocessor.graph_store import load_citation_graph
+from src.models.LLM.prompt_packer import pack_paper_text
+from src.models.LLM.ChatAgent import ChatAgent
+import threading
+
+# subsections are written from several worker threads, which all append to the prompt log
+_prompt_log_lock = threading.Lock()
 
 class LiteratureReviewGenerator:
     def __init__(self, query, api_key: str, ablation_study = '', top_k=None):
@@ -55,14 +65,22 @@ class LiteratureReviewGenerator:
         rag_db_path = f"{base_dir}/rag_database"
         os.makedirs(rag_db_path, exist_ok=True)
         
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        self.advanced_model = genai.GenerativeModel('gemini-2.5-pro')
+        self.model_name = 'gemini-2.5-flash'
+        self.advanced_model_name = 'gemini-2.5-pro'
+        self.model = genai.GenerativeModel(self.model_name)
+        self.advanced_model = genai.GenerativeModel(self.advanced_model_name)
+        # subsection prompts go through ChatAgent so their shared outline prefix is cached by Gemini
+        self.chat_agent = ChatAgent()
         self.papers_data = []
         self.citations_map = {}  # Map paper names to citation keys
         self.cited_papers_from_graph = set()  # Track papers cited from graph nodes
         
         self.summarizer = PaperSummarizerRAG(query, api_key, rag_db_path)
         self.max_improvement_iterations = 3  # Maximum iterations for section improvement
+        self.section_workers = DEFAULT_SECTION_WORKERS  # Subsections written concurrently
+        # 'previous': seed a subsection with the previous subsection's text (sequential within a section)
+        # 'focus': seed it with the previous subsection's outline focus (all subsections in parallel)
+        self.subsection_context = SUBSECTION_CONTEXT_PREVIOUS
         
         # Load from top_k output folder
         output_paths_dir = f"paper_data/{self.output_query_dir}/paths"
@@ -83,23 +101,10 @@ class LiteratureReviewGenerator:
             self.community_summary = {}
             self.layer_method_group_json = {}
     def get_paper_text(self, paper_infos):
-        papers_text = ''
-        for info in paper_infos:
-            try:
-                if info['summary'] != info['abstract'] and info['summary'] != '':
-                    papers_text += f"[{info['citation_key']}] {info['title']} ({info['year']})\nSummary: {info['summary']}\n\n"
-                else:
-                    papers_text += f"[{info['citation_key']}] {info['title']} ({info['year']})\nSummary: {info['abstract']}\n\n"
-
-            except:
-                try: 
-                    if info['summary'] != info['abstract'] and info['summary'] != '':
-                        papers_text += f"[{info['citation_key']}] {info['title']} ({info['published_date']})\nSummary: {info['summary']}\n\n"
-                except: papers_text += f"[{info['citation_key']}] {info['title']} ({info['published_date']})\nSummary: {info['abstract']}\n\n"
-        return papers_text
+        # summary -> abstract -> title per paper, within the token budget of the writing model
+        paper_text, _ = pack_paper_text(paper_infos, model=self.model_name)
+        return paper_text
     def load_graph(self, json_path, node_info_path):
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
         with open(node_info_path, 'r', encoding='utf-8') as f:
             node_info = json.load(f)
         id2node_info = {}
@@ -109,13 +114,7 @@ class LiteratureReviewGenerator:
             info['citation_key'] = node['citation_key']
             info['year'] = info['published_date']
             id2node_info[node_id] = info
-        G = nx.DiGraph()
-        for node in data['nodes']:
-            node_id = node['id']
-            info = {**node, **id2node_info[node_id]}
-            G.add_node(node_id, **info)
-        for edge in data['edges']:
-            G.add_edge(edge['source'], edge['target'], **edge)
+        G = load_citation_graph(json_path, id2node_info)
         return G, id2node_info
     def parse_remove_think(self, summary):
         # Remove text between think tags
@@ -270,27 +269,25 @@ class LiteratureReviewGenerator:
             n_results (int): Number of results per query
             
         Returns:
-            List[Dict]: Combined search results
+            List[Dict]: Combined search results, ranked by reciprocal-rank fusion
         """
         all_results = []
-        seen_doc_ids = set()
-        for query in queries:
+        try:
+            # One batched embedding + one Chroma query for all queries, results fused by RRF (deduplicated)
+            results = self.summarizer.search_fused(queries, n_results)
+        except Exception as e:
+            print(f"Error retrieving papers for queries {queries}: {e}")
+            results = []
+        for result in results:
             try:
-                results = self.summarizer.search_similar_papers(query, n_results)
-                
-                # Filter out duplicates and add to results
-                for result in results:
-                    doc_id = result.get('doc_id', '')
-                    if doc_id not in seen_doc_ids:
-                        seen_doc_ids.add(doc_id)
-                        node_id = result.get('metadata').get('file_name').replace('.pdf', '')
-                        result['citation_key'] =  self.id2node_info[node_id].get('citation_key')
-                        result['title'] = self.id2node_info[node_id].get('title')
-                        result['summary'] = self.id2node_info[node_id].get('summary')
-                        result['year'] = self.id2node_info[node_id].get('published_date')
-                        all_results.append(result)
+                node_id = result.get('metadata').get('file_name').replace('.pdf', '')
+                result['citation_key'] =  self.id2node_info[node_id].get('citation_key')
+                result['title'] = self.id2node_info[node_id].get('title')
+                result['summary'] = self.id2node_info[node_id].get('summary')
+                result['year'] = self.id2node_info[node_id].get('published_date')
+                all_results.append(result)
             except Exception as e:
-                print(f"Error retrieving papers for query '{query}': {e}")
+                print(f"Error retrieving paper '{result.get('doc_id', '')}': {e}")
                 continue
         print(f'Collected {len(all_results)} additional papers - reduce to 15 there are too many')
         all_results = all_results[:15]
@@ -310,7 +307,7 @@ class LiteratureReviewGenerator:
                                                         "WEAKNESSES": weaknesses,
                                                         "RETRIEVED_PAPERS": retrieved_papers_text
                                                     })
-        with open('writing_prompts.txt', "a") as f:
+        with _prompt_log_lock, open('writing_prompts.txt', "a") as f:
             f.write(f"FILTER RETRIEVED PAPER PROMPT:\n {prompt}")
 
         try:
@@ -531,6 +528,10 @@ class LiteratureReviewGenerator:
         # Step 3: Get proofs text
         community_summary, development_direction, proof_papers, paper_summaries = self.get_proofs_text(proof_ids, get_nodes_info=True)
         # Step 4: Generate initial subsection content
+        # instructions first, identical for every subsection. At ~665 tokens this prefix is below
+        # GEMINI_CONTEXT_CACHE_MIN_TOKENS, so gemini_chat sends it inline; it only gets a
+        # cachedContent if the instructions grow past the model minimum
+        context_prompt = self.prompt_helper.WRITE_INITIAL_SUBSECTION_CONTEXT
         subsection_prompt = self.prompt_helper.generate_prompt(
             self.prompt_helper.WRITE_INITIAL_SUBSECTION_PROMPT,
             paras={
@@ -541,57 +542,18 @@ class LiteratureReviewGenerator:
                 'DEVELOPMENT_DIRECTION': development_direction,
             }
         )
-        with open('writing_prompts.txt', "a") as f:
-            f.write(f"INITAL SUBSECTION PROMPT:\n {subsection_prompt}")
+        with _prompt_log_lock, open('writing_prompts.txt', "a") as f:
+            f.write(f"INITAL SUBSECTION PROMPT:\n {context_prompt}{subsection_prompt}")
 
         try:
-            response = self.model.generate_content(
-                subsection_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=102400,
-                    temperature=0.4,
-                )
+            response = self.chat_agent.gemini_chat(
+                subsection_prompt, model=self.model_name, temperature=0.4, cached_prefix=context_prompt,
+                allow_truncated=True,
             )
-            # print("DEBUG: PROMPT \n", subsection_prompt)
-            # print("DEBUG: Response: \n", response)
-            # Method 1: Try the quick accessor first
-            try:
-                if hasattr(response, 'text') and response.text:
-                    return self.parse_remove_think(response.text)
-            except ValueError as ve:
-                # This is the "response.text quick accessor requires valid Part" error
-                print(f"   Note: response.text accessor failed, extracting from candidates...")
-            
-            # Method 2: Extract from candidates structure
-            if not hasattr(response, 'candidates') or not response.candidates:
-                print(f"⚠️  Warning: No candidates in response for '{subsection_title}'")
+            if response.startswith('Gemini API Error'):
+                print(f"❌ {response} ('{subsection_title}')")
                 return ""
-            
-            # Get first candidate
-            candidate = response.candidates[0]
-            
-            # Check finish reason
-            finish_reason = candidate.finish_reason
-            if finish_reason == 3:  # SAFETY
-                print(f"⚠️  Content filtered by safety for '{subsection_title}'")
-                return ""
-            elif finish_reason == 2:  # MAX_TOKENS
-                print(f"⚠️  Token limit reached for '{subsection_title}'")
-            
-            # Method 3: Manually extract text from parts
-            if hasattr(candidate, 'content') and candidate.content:
-                if hasattr(candidate.content, 'parts') and candidate.content.parts:
-                    extracted_text = ''
-                    for part in candidate.content.parts:
-                        if hasattr(part, 'text') and part.text:
-                            extracted_text += part.text
-                    
-                    if extracted_text:
-                        print(f"   ✓ Extracted {len(extracted_text)} chars from response")
-                        return self.parse_remove_think(extracted_text)
-            
-            print(f"❌ No valid text in response for '{subsection_title}'")
-            return ""
+            return self.parse_remove_think(response)
             
         except Exception as e:
             print(f"❌ Error writing subsection: {e}")
@@ -602,30 +564,29 @@ class LiteratureReviewGenerator:
         """
         Evaluate the quality of a literature review subsection
         """
+        context_prompt = self.prompt_helper.generate_prompt(
+            self.prompt_helper.EVALUATE_SUBSECTION_CONTEXT,
+            paras={'OUTLINE': outline}
+        )
         evaluation_prompt = self.prompt_helper.generate_prompt(
             self.prompt_helper.EVALUATE_SUBSECTION_PROMPT,
             paras={
                 'PRE_SUBSECTION': pre_subsection,
                 'SUBSECTION_TITLE': subsection_title,
                 'SUBSECTION_FOCUS': subsection_focus,
-                'OUTLINE': outline,
                 'SUBSECTION_CONTENT': subsection_content
             }
         )
-        with open('writing_prompts.txt', "a") as f:
-            f.write(f"EVALUATE SUBSECTION PROMPT:\n {evaluation_prompt}")
+        with _prompt_log_lock, open('writing_prompts.txt', "a") as f:
+            f.write(f"EVALUATE SUBSECTION PROMPT:\n {context_prompt}{evaluation_prompt}")
 
         try:
-            response = self.advanced_model.generate_content(
-                evaluation_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=102400,
-                    temperature=0.2,
-                )
+            response = self.chat_agent.gemini_chat(
+                evaluation_prompt, model=self.advanced_model_name, temperature=0.2, cached_prefix=context_prompt
             )
             
             # Clean up response text
-            response_text = response.text.strip()
+            response_text = response.strip()
             
             # Remove markdown code blocks if present
             if response_text.startswith('```json'):
@@ -703,13 +664,16 @@ class LiteratureReviewGenerator:
         #         additional_info += f"Keywords: {', '.join(paper.get('keyword', []))}"
         #     additional_info += f"Citation Key: {paper.get('citation_key', '')}\n\n"
         additional_info = additional_papers
+        context_prompt = self.prompt_helper.generate_prompt(
+            self.prompt_helper.SUBSECTION_IMPROVE_CONTEXT,
+            paras={"OUTLINE": outline}
+        )
         improvement_prompt = self.prompt_helper.generate_prompt(
             self.prompt_helper.SUBSECTION_IMPROVE_PROMPT,
             paras={
                 "SUBSECTION_TITLE": subsection_title,
                 "SUBSECTION_FOCUS": subsection_focus,
                 "PRE_SUBSECTION": pre_subsection_content,
-                "OUTLINE": outline,
                 "CURRENT_CONTENT": current_content,
                 "OVERALL_SCORE": {evaluation_feedback.get('overall_score', 'N/A')},
                 "SYNTHESIS_SCORE": {evaluation_feedback.get('individual_scores', {}).get('synthesis_quality', 'N/A')},
@@ -721,18 +685,18 @@ class LiteratureReviewGenerator:
                 "ADDITIONAL_INFO": additional_info
             }
         )
-        with open('writing_prompts.txt', "a") as f:
-            f.write(f"SUBSECTION IMPROVEMENT PROMPT:\n {improvement_prompt}")
+        with _prompt_log_lock, open('writing_prompts.txt', "a") as f:
+            f.write(f"SUBSECTION IMPROVEMENT PROMPT:\n {context_prompt}{improvement_prompt}")
 
         try:
-            response = self.model.generate_content(
-                improvement_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=102400,
-                    temperature=0.4,
-                )
+            response = self.chat_agent.gemini_chat(
+                improvement_prompt, model=self.model_name, temperature=0.4, cached_prefix=context_prompt,
+                allow_truncated=True,
             )
-            return response.text
+            if response.startswith('Gemini API Error'):
+                print(f"Error improving subsection: {response}")
+                return current_content
+            return response
             
         except Exception as e:
             print(f"Error improving subsection: {e}")
@@ -831,33 +795,172 @@ class LiteratureReviewGenerator:
             print(f"Error writing initial section overview: {e}")
             return f"Error: Could not generate overview for section '{section_title}' due to {e}"
     #region write literature review section with reflection
-    def write_literature_review_section_with_reflection(self, section_data: Dict, 
-                                                      processed_papers: List[Dict],
-                                                      full_outline_text: str, 
-                                                      pre_section_content: str) -> Tuple[str, Dict[str, str]]:
+    def _subsection_checkpoint_path(self, subsection_number: str, subsection_title: str) -> str:
+        """Checkpoint file of a subsection; its existence marks the subsection as written."""
+        subsection_title = subsection_title.replace('"', "")
+        return os.path.join(
+            self.save_dir, 
+            f"subsection_{subsection_number.replace('.', '_')}_{subsection_title.replace(' ', '_').replace('/', '_').replace(':', '').lower()}_checkpoint.tex"
+        )
+
+    def _strip_subsection_heading(self, content: str) -> str:
+        """Remove a leading \\section/\\subsection line (and its label) written by the LLM."""
+        if content.strip().startswith("\\section"):
+            content = content.replace("\\section", "\\subsection")
+        
+        subsection_prefix = f"\\subsection"
+        if content.strip().startswith(subsection_prefix):
+            # A more robust way would be to parse it, but for simple string manipulation:
+            temp_content = content.strip()
+            
+            # Find the first newline after the potential subsection line
+            first_newline_idx = temp_content.find('\n')
+            
+            if first_newline_idx != -1:
+                # Check if the text before this newline contains the label as well
+                # This is a bit simplistic and might need refinement depending on exact latex structure
+                if "\\label" in temp_content[:first_newline_idx]:
+                    # If the label is on the same line as subsection or immediately after
+                    # find the end of the label line
+                    second_newline_idx = temp_content.find('\n', first_newline_idx + 1)
+                    if second_newline_idx != -1:
+                        content = temp_content[second_newline_idx + 1:]
+                    else:
+                        content = "" # Only the subsection and label were present
+                else: # Only the subsection line
+                    content = temp_content[first_newline_idx + 1:]
+            else: # No newline, meaning only the subsection was in the content
+                content = ""
+        return content
+
+    def _subsection_latex(self, subsection_number: str, subsection_title: str, body: str) -> str:
+        """Subsection heading and label followed by its body."""
+        subsection_title = subsection_title.replace('"', "")
+        return (f"\\subsection{{{subsection_title}}}\n\\label{{sec:{subsection_number.replace('.', '_')}_{subsection_title.lower().replace(' ', '_').replace('and', '_and_')}}}\n\n"
+                + body + '\n')
+
+    def write_subsection_with_reflection(self, subsection_data: Dict, processed_papers: List[Dict],
+                                         full_outline_text: str, pre_subsection_content: str) -> Tuple[str, str]:
         """
-        Write a literature review section with self-reflection and iterative improvement,
-        including all its subsections.
+        Write one subsection with the write -> evaluate -> retrieve -> improve loop,
+        or load it from its checkpoint if it was already written.
         
         Args:
-            section_data (Dict): Contains section_number, section_title, section_focus, subsections.
+            subsection_data (Dict): Contains number, title, subsection_focus, proof_ids.
             processed_papers (List[Dict]): List of processed papers.
             full_outline_text (str): The complete JSON outline as a string for context.
-            pre_section_content (str): Content of the previous main section, if any.
+            pre_subsection_content (str): Context about the previous subsection.
             
         Returns:
-            Tuple[str, Dict[str, str]]: Final improved section content (including all subsections)
-                                       and a dictionary of subsection contents.
+            Tuple[str, str]: Final subsection content (as in the checkpoint) and its body
+                             without the heading, ready to be placed under \\subsection.
         """
+        subsection_number = subsection_data['number']
+        subsection_title = subsection_data['title'].replace('"', "")
+        subsection_focus = subsection_data['subsection_focus']
+        subsection_proof_ids = subsection_data.get('proof_ids', [])
+        
+        print(f"      Writing Subsection {subsection_number}: {subsection_title}")
+        checkpoint_path = self._subsection_checkpoint_path(subsection_number, subsection_title)
+        
+        if os.path.exists(checkpoint_path):
+            print(f"        ⏭️  Loading subsection '{subsection_title}' from checkpoint.")
+            with open(checkpoint_path, 'r', encoding='utf-8') as f:
+                current_subsection_content = f.read()
+            
+            if current_subsection_content and current_subsection_content[0] != "\\":
+                current_subsection_content = self.parse_remove_think(current_subsection_content)
+                with open(checkpoint_path, 'w', encoding='utf-8') as f:
+                    f.write(current_subsection_content)
+            
+            # Only use the checkpoint if it has valid content
+            if current_subsection_content and current_subsection_content.strip():
+                return current_subsection_content, self._strip_subsection_heading(current_subsection_content)
+            print(f"        ⚠️  Invalid checkpoint content, will regenerate...")
+        
+        print(f"        ✍️  Writing initial content for subsection '{subsection_title}'...")
+        current_subsection_content = self.write_initial_subsection(
+            subsection_title, subsection_focus, full_outline_text, subsection_proof_ids, 
+            pre_subsection_content, processed_papers
+        )
+        # Retry up to 3 times if content is empty or None
+        retry_count = 0
+        max_retries = 3
+        while (not current_subsection_content or current_subsection_content == '') and retry_count < max_retries:
+            retry_count += 1
+            print(f"        ⚠️  Empty response, retry {retry_count}/{max_retries}...")
+            current_subsection_content = self.write_initial_subsection(
+                subsection_title, subsection_focus, full_outline_text, subsection_proof_ids, 
+                pre_subsection_content, processed_papers
+            )
         
-        section_number = section_data['section_number']
-        section_title = section_data['section_title']
-        section_focus = section_data['section_focus']
-        section_proof_ids = section_data.get('proof_ids', []) # Top-level proof IDs for the section
-        subsections_data = section_data['subsections']
-        
-        print(f"   Writing Section {section_number}: {section_title}")
+        # If still empty after retries, skip this subsection
+        if not current_subsection_content or current_subsection_content == '':
+            print(f"        ❌ Failed to generate content after {max_retries} retries, skipping subsection")
+            current_subsection_content = f"% TODO: Content generation failed for subsection {subsection_title}\n"
         
+        with open(checkpoint_path, 'w', encoding='utf-8') as f:
+            f.write(current_subsection_content)
+
+        iteration = 0
+        while iteration < self.max_improvement_iterations:
+            iteration += 1
+            print(f"         [{subsection_number}] Iteration {iteration}: Evaluating subsection quality...")
+            
+            evaluation = self.evaluate_subsection_quality(
+                subsection_title, current_subsection_content, subsection_focus, 
+                full_outline_text, pre_subsection_content
+            )
+            
+            print(f"         [{subsection_number}] Overall Score: {evaluation.get('overall_score', 'N/A')}/5")
+            
+            if evaluation.get('is_satisfactory', False):
+                print(f"         [{subsection_number}] Subsection meets quality standards!")
+                break
+            
+            suggested_queries = evaluation.get('suggested_queries', [])
+            weaknesses = evaluation.get('weaknesses')
+            if suggested_queries:
+                print(f"         [{subsection_number}] Retrieving additional papers for subsection: {', '.join(suggested_queries[:5])}")
+                additional_papers = self.retrieve_additional_papers(subsection_title, subsection_focus, current_subsection_content, weaknesses, suggested_queries[:5])
+                print(f"         [{subsection_number}] Found {len(additional_papers)} additional papers for subsection")
+            else:
+                additional_papers = []
+            
+            print(f"         [{subsection_number}] Improving subsection based on feedback...")
+            old_subsection_content = current_subsection_content
+            current_subsection_content = self.improve_subsection_with_additional_papers(
+                subsection_title, old_subsection_content, subsection_focus, 
+                additional_papers, full_outline_text, evaluation, pre_subsection_content
+            )
+            
+            # Retry up to 3 times if improvement returns empty/None
+            retry_count = 0
+            max_retries = 3
+            while (not current_subsection_content or current_subsection_content == '') and retry_count < max_retries:
+                retry_count += 1
+                print(f"         ⚠️  Empty improvement response, retry {retry_count}/{max_retries}...")
+                current_subsection_content = self.improve_subsection_with_additional_papers(
+                    subsection_title, old_subsection_content, subsection_focus, 
+                    additional_papers, full_outline_text, evaluation, pre_subsection_content
+                )
+            
+            # If improvement failed, keep the old content
+            if not current_subsection_content or current_subsection_content == '':
+                print(f"         ⚠️  Improvement failed, keeping original content")
+                current_subsection_content = old_subsection_content
+            
+            with open(checkpoint_path, 'w', encoding='utf-8') as f:
+                f.write(current_subsection_content)
+
+        # Ensure content is not None before processing
+        if not current_subsection_content:
+            print(f"        ⚠️  Warning: Subsection '{subsection_title}' has no content, skipping")
+            return current_subsection_content, ""
+        return current_subsection_content, self._strip_subsection_heading(current_subsection_content)
+
+    def _section_header(self, section_title: str) -> str:
+        """\\section line and label of a main section (the section overview is currently disabled)."""
         # # --- 1. Write and refine section overview ---
         # section_overview_checkpoint_path = os.path.join(
         #     self.save_dir, 
@@ -876,210 +979,119 @@ class LiteratureReviewGenerator:
         #     )
         #     with open(section_overview_checkpoint_path, 'w', encoding='utf-8') as f:
         #         f.write(section_overview_content)
-        
-        # --- 2. Write and refine each subsection ---
         section_overview_content = ''
-        all_subsections_content_for_section = {}
         if not section_overview_content.strip().startswith("\\section"):
             full_section_latex_content = f"\\section{{{section_title}}}\n"
         else:
             full_section_latex_content = ''
         full_section_latex_content += f"\\label{{sec:{section_title.lower().replace(' ', '_').replace('and', '_and_')}}}\n\n"
         full_section_latex_content += section_overview_content + "\n\n" # Add the refined overview
-        
-        pre_subsection_content = "" # To store content of the previous subsection
+        return full_section_latex_content
 
-        for subsection_data in subsections_data:
-            subsection_number = subsection_data['number']
-            subsection_title = subsection_data['title']
-            subsection_focus = subsection_data['subsection_focus']
-            subsection_proof_ids = subsection_data.get('proof_ids', [])
-            
-            print(f"      Writing Subsection {subsection_number}: {subsection_title}")
+    def _pre_subsection_context(self, subsections_data: List[Dict], index: int,
+                                previous_body: str, context_mode: str) -> str:
+        """PRE_SUBSECTION context of subsection `index`: previous text or previous outline focus."""
+        if index == 0:
+            return ""
+        if context_mode == SUBSECTION_CONTEXT_FOCUS:
+            previous = subsections_data[index - 1]
+            return f"{previous['number']} {previous['title']}: {previous['subsection_focus']}"
+        return previous_body
 
-            subsection_title = subsection_title.replace('"', "")
-            checkpoint_path = os.path.join(
-                self.save_dir, 
-                f"subsection_{subsection_number.replace('.', '_')}_{subsection_title.replace(' ', '_').replace('/', '_').replace(':', '').lower()}_checkpoint.tex"
-            )
+    def write_literature_review_section_with_reflection(self, section_data: Dict, 
+                                                      processed_papers: List[Dict],
+                                                      full_outline_text: str, 
+                                                      pre_section_content: str) -> Tuple[str, Dict[str, str]]:
+        """
+        Write a literature review section with self-reflection and iterative improvement,
+        including all its subsections (one after another).
+        
+        Args:
+            section_data (Dict): Contains section_number, section_title, section_focus, subsections.
+            processed_papers (List[Dict]): List of processed papers.
+            full_outline_text (str): The complete JSON outline as a string for context.
+            pre_section_content (str): Content of the previous main section, if any.
             
-            current_subsection_content = ""
-            if os.path.exists(checkpoint_path):
-                print(f"        ⏭️  Loading subsection '{subsection_title}' from checkpoint.")
-                with open(checkpoint_path, 'r', encoding='utf-8') as f:
-                    current_subsection_content = f.read()
-                
-                # Ensure we have valid content
-                if not current_subsection_content:
-                    print(f"        ⚠️  Checkpoint file is empty, regenerating...")
-                    current_subsection_content = ""
-                elif current_subsection_content and current_subsection_content[0] != "\\":
-                    current_subsection_content = self.parse_remove_think(current_subsection_content)
-                    with open(checkpoint_path, 'w', encoding='utf-8') as f:
-                        f.write(current_subsection_content)
-                
-                # Only proceed if we have valid content from checkpoint
-                if current_subsection_content and current_subsection_content.strip():
-                    if current_subsection_content.strip().startswith("\\section"):
-                        current_subsection_content = current_subsection_content.replace("\\section", "\\subsection")
-                    
-                    subsection_prefix = f"\\subsection"
-                    if current_subsection_content.strip().startswith(subsection_prefix):
-                        # Find the end of the subsection line and label to remove it
-                        # This assumes the label immediately follows the subsection title
-                        # and we want to remove both if they are at the very beginning.
-                        
-                        # A more robust way would be to parse it, but for simple string manipulation:
-                        temp_content = current_subsection_content.strip()
-                        
-                        # Find the first newline after the potential subsection line
-                        first_newline_idx = temp_content.find('\n')
-                        
-                        if first_newline_idx != -1:
-                            # Check if the text before this newline contains the label as well
-                            # This is a bit simplistic and might need refinement depending on exact latex structure
-                            if "\\label" in temp_content[:first_newline_idx]:
-                                # If the label is on the same line as subsection or immediately after
-                                # find the end of the label line
-                                second_newline_idx = temp_content.find('\n', first_newline_idx + 1)
-                                if second_newline_idx != -1:
-                                    current_subsection_content = temp_content[second_newline_idx + 1:]
-                                else:
-                                    current_subsection_content = "" # Only the subsection and label were present
-                            else: # Only the subsection line
-                                current_subsection_content = temp_content[first_newline_idx + 1:]
-                        else: # No newline, meaning only the subsection was in the content
-                            current_subsection_content = ""
-
-                    # Now, add the correct subsection line at the beginning
-                    full_section_latex_content += f"\\subsection{{{subsection_title}}}\n\\label{{sec:{subsection_number.replace('.', '_')}_{subsection_title.lower().replace(' ', '_').replace('and', '_and_')}}}\n\n"
-                    full_section_latex_content += current_subsection_content + '\n'
-                    
-                    # Update pre_subsection_content for next iteration
-                    pre_subsection_content = current_subsection_content
+        Returns:
+            Tuple[str, Dict[str, str]]: Final improved section content (including all subsections)
+                                       and a dictionary of subsection contents.
+        """
+        section_number = section_data['section_number']
+        section_title = section_data['section_title']
+        subsections_data = section_data['subsections']
+        
+        print(f"   Writing Section {section_number}: {section_title}")
+        
+        all_subsections_content_for_section = {}
+        full_section_latex_content = self._section_header(section_title)
+        pre_subsection_content = "" # To store content of the previous subsection
 
-                    continue
-                else:
-                    # Checkpoint was empty or invalid, regenerate
-                    print(f"        ⚠️  Invalid checkpoint content, will regenerate...")
-                    current_subsection_content = ""
-            else:
-                print(f"        ✍️  Writing initial content for subsection '{subsection_title}'...")
-                current_subsection_content = self.write_initial_subsection(
-                    subsection_title, subsection_focus, full_outline_text, subsection_proof_ids, 
-                    pre_subsection_content, processed_papers
-                )
-                # Retry up to 3 times if content is empty or None
-                retry_count = 0
-                max_retries = 3
-                while (not current_subsection_content or current_subsection_content == '') and retry_count < max_retries:
-                    retry_count += 1
-                    print(f"        ⚠️  Empty response, retry {retry_count}/{max_retries}...")
-                    current_subsection_content = self.write_initial_subsection(
-                        subsection_title, subsection_focus, full_outline_text, subsection_proof_ids, 
-                        pre_subsection_content, processed_papers
-                    )
-                
-                # If still empty after retries, skip this subsection
-                if not current_subsection_content or current_subsection_content == '':
-                    print(f"        ❌ Failed to generate content after {max_retries} retries, skipping subsection")
-                    current_subsection_content = f"% TODO: Content generation failed for subsection {subsection_title}\n"
-                
-                with open(checkpoint_path, 'w', encoding='utf-8') as f:
-                    f.write(current_subsection_content)
+        for i, subsection_data in enumerate(subsections_data):
+            pre_subsection_content = self._pre_subsection_context(
+                subsections_data, i, pre_subsection_content, self.subsection_context
+            )
+            content, body = self.write_subsection_with_reflection(
+                subsection_data, processed_papers, full_outline_text, pre_subsection_content
+            )
+            all_subsections_content_for_section[subsection_data['title'].replace('"', "")] = content
+            full_section_latex_content += self._subsection_latex(subsection_data['number'], subsection_data['title'], body)
+            pre_subsection_content = body
 
-            iteration = 0
-            while iteration < self.max_improvement_iterations:
-                iteration += 1
-                print(f"         Iteration {iteration}: Evaluating subsection quality...")
-                
-                evaluation = self.evaluate_subsection_quality(
-                    subsection_title, current_subsection_content, subsection_focus, 
-                    full_outline_text, pre_subsection_content
-                )
-                
-                print(f"         Overall Score: {evaluation.get('overall_score', 'N/A')}/5")
-                
-                if evaluation.get('is_satisfactory', False):
-                    print(f"         Subsection meets quality standards!")
-                    break
-                
-                suggested_queries = evaluation.get('suggested_queries', [])
-                weaknesses = evaluation.get('weaknesses')
-                if suggested_queries:
-                    print(f"         Retrieving additional papers for subsection: {', '.join(suggested_queries[:5])}")
-                    additional_papers = self.retrieve_additional_papers(subsection_title, subsection_focus, current_subsection_content, weaknesses, suggested_queries[:5])
-                    print(f"         Found {len(additional_papers)} additional papers for subsection")
-                else:
-                    additional_papers = []
-                
-                print(f"         Improving subsection based on feedback...")
-                old_subsection_content = current_subsection_content
-                current_subsection_content = self.improve_subsection_with_additional_papers(
-                    subsection_title, old_subsection_content, subsection_focus, 
-                    additional_papers, full_outline_text, evaluation, pre_subsection_content
-                )
-                
-                # Retry up to 3 times if improvement returns empty/None
-                retry_count = 0
-                max_retries = 3
-                while (not current_subsection_content or current_subsection_content == '') and retry_count < max_retries:
-                    retry_count += 1
-                    print(f"         ⚠️  Empty improvement response, retry {retry_count}/{max_retries}...")
-                    current_subsection_content = self.improve_subsection_with_additional_papers(
-                        subsection_title, old_subsection_content, subsection_focus, 
-                        additional_papers, full_outline_text, evaluation, pre_subsection_content
-                    )
-                
-                # If improvement failed, keep the old content
-                if not current_subsection_content or current_subsection_content == '':
-                    print(f"         ⚠️  Improvement failed, keeping original content")
-                    current_subsection_content = old_subsection_content
-                
-                with open(checkpoint_path, 'w', encoding='utf-8') as f:
-                    f.write(current_subsection_content)
+        return full_section_latex_content, all_subsections_content_for_section
 
-            # After refining, add the subsection content to the section's full content
-            all_subsections_content_for_section[subsection_title] = current_subsection_content
-            
-            # Ensure content is not None before processing
-            if not current_subsection_content:
-                print(f"        ⚠️  Warning: Subsection '{subsection_title}' has no content, skipping")
-                pre_subsection_content = ""  # Don't use None content as context
-                continue
-            
-            if current_subsection_content.strip().startswith("\\section"):
-                current_subsection_content = current_subsection_content.replace("\\section", "\\subsection")
+    def write_sections_with_scheduler(self, outline_json: List[Dict], processed_papers: List[Dict],
+                                      full_outline_text: str, max_workers: int = None,
+                                      subsection_context: str = None) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        Write all sections of the outline, running independent subsections concurrently.
+        
+        Args:
+            outline_json (List[Dict]): The outline (list of sections with subsections).
+            processed_papers (List[Dict]): List of processed papers.
+            full_outline_text (str): The complete JSON outline as a string for context.
+            max_workers (int): Subsections written at the same time (default self.section_workers).
+            subsection_context (str): 'previous' or 'focus' (default self.subsection_context).
             
-            subsection_prefix = f"\\subsection"
-            if current_subsection_content.strip().startswith(subsection_prefix):                
-                # A more robust way would be to parse it, but for simple string manipulation:
-                temp_content = current_subsection_content.strip()
-                
-                # Find the first newline after the potential subsection line
-                first_newline_idx = temp_content.find('\n')
-                
-                if first_newline_idx != -1:
-                    # Check if the text before this newline contains the label as well
-                    # This is a bit simplistic and might need refinement depending on exact latex structure
-                    if "\\label" in temp_content[:first_newline_idx]:
-                        # If the label is on the same line as subsection or immediately after
-                        # find the end of the label line
-                        second_newline_idx = temp_content.find('\n', first_newline_idx + 1)
-                        if second_newline_idx != -1:
-                            current_subsection_content = temp_content[second_newline_idx + 1:]
-                        else:
-                            current_subsection_content = "" # Only the subsection and label were present
-                    else: # Only the subsection line
-                        current_subsection_content = temp_content[first_newline_idx + 1:]
-                else: # No newline, meaning only the subsection was in the content
-                    current_subsection_content = ""
+        Returns:
+            Tuple[Dict[str, str], Dict[str, str]]: Content of each main section (in outline order)
+                                                   and content of every subsection.
+        """
+        max_workers = max_workers or self.section_workers
+        subsection_context = subsection_context or self.subsection_context
+        deps = build_subsection_dag(outline_json, subsection_context)
+        
+        checkpointed = sum(
+            os.path.exists(self._subsection_checkpoint_path(
+                outline_json[s]['subsections'][i]['number'], outline_json[s]['subsections'][i]['title']))
+            for s, i in deps
+        )
+        print(f"   {len(deps)} subsections ({checkpointed} already checkpointed), "
+              f"{max_workers} workers, context mode '{subsection_context}'")
 
-            # Now, add the correct subsection line at the beginning
-            full_section_latex_content += f"\\subsection{{{subsection_title}}}\n\\label{{sec:{subsection_number.replace('.', '_')}_{subsection_title.lower().replace(' ', '_').replace('and', '_and_')}}}\n\n"
-            full_section_latex_content += current_subsection_content + '\n'
+        def write_node(node, results):
+            s, i = node
+            subsections_data = outline_json[s]['subsections']
+            previous_body = results[(s, i - 1)][1] if (s, i - 1) in results else ""
+            pre_subsection_content = self._pre_subsection_context(
+                subsections_data, i, previous_body, subsection_context
+            )
+            return self.write_subsection_with_reflection(
+                subsections_data[i], processed_papers, full_outline_text, pre_subsection_content
+            )
 
-        return full_section_latex_content, all_subsections_content_for_section
+        results = run_dag(deps, write_node, max_workers)
+
+        sections_content = {}
+        all_subsection_contents = {}
+        for s, section_data in enumerate(outline_json):
+            section_title = section_data['section_title']
+            full_section_latex_content = self._section_header(section_title)
+            for i, subsection_data in enumerate(section_data['subsections']):
+                content, body = results[(s, i)]
+                all_subsection_contents[subsection_data['title'].replace('"', "")] = content
+                full_section_latex_content += self._subsection_latex(subsection_data['number'], subsection_data['title'], body)
+            sections_content[section_title] = full_section_latex_content
+        return sections_content, all_subsection_contents
     
     #endregion
     def parse_outline_text(file_path: str) -> Tuple[List[str], Dict[str, str], Dict[str, str]]:
@@ -1138,9 +1150,13 @@ class LiteratureReviewGenerator:
         return section_title_list, sections_dict, section_definitions
     #region generate complete literature review
     def generate_complete_literature_review(self, paper_paths: str, 
-                                          review_title: str = "Literature Review") -> Dict:
+                                          review_title: str = "Literature Review",
+                                          max_workers: int = None,
+                                          subsection_context: str = None) -> Dict:
         """
-        Generate a complete literature review from multiple papers with self-reflection
+        Generate a complete literature review from multiple papers with self-reflection.
+        Subsections are written concurrently by `write_sections_with_scheduler`
+        (max_workers / subsection_context default to self.section_workers / self.subsection_context).
         """
         print("Starting literature review generation...")
         
@@ -1189,25 +1205,16 @@ class LiteratureReviewGenerator:
         # Step 3: Write individual sections (including subsections) with self-reflection
         print("\n3. Writing literature review sections and subsections with self-reflection...")
         
-        sections_content = {} # Stores the final content of each main section
-        all_subsection_contents = {} # Stores content of all subsections, keyed by full title (e.g., "1.1 Background: ...")
-
-        # Iterate through main sections
-        pre_section_content = "" # Content of the previous main section
-
-        for section_data in outline_json:
-            section_number = section_data['section_number']
-            section_title = section_data['section_title']
-            # if section_number in ['1', '2', '3']:
-            #     continue
-            # Call the updated function to write/refine the section and its subsections
-            full_section_latex_content, subsections_in_this_section = self.write_literature_review_section_with_reflection(
-                section_data, processed_papers_for_content, full_outline_text, pre_section_content
+        # sections_content: final content of each main section
+        # all_subsection_contents: content of all subsections, keyed by subsection title
+        try:
+            sections_content, all_subsection_contents = self.write_sections_with_scheduler(
+                outline_json, processed_papers_for_content, full_outline_text,
+                max_workers=max_workers, subsection_context=subsection_context
             )
-            
-            sections_content[section_title] = full_section_latex_content
-            all_subsection_contents.update(subsections_in_this_section) # Add all subsections from this section
-            pre_section_content = full_section_latex_content # Update for the next main section
+        finally:
+            # the cached outline prefixes are not needed after the subsections are written
+            self.chat_agent.release_context_caches()
 
         # Step 4: Generate LaTeX document
         print("\n4. Generating LaTeX document...")
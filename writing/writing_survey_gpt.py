@@ -8,7 +8,6 @@ import re
 from typing import Optional, Dict, List, Tuple
 import pandas as pd
 from datetime import datetime
-import networkx as nx
 import sys
 import os
 
@@ -22,6 +21,8 @@ import sys
 from dotenv import load_dotenv, find_dotenv
 from pathlib import Path 
 from scripts.prompt import PromptHelper
+from src.modules.preprocessor.graph_store import load_citation_graph
+from src.models.LLM.prompt_packer import pack_paper_text
 from src.models.LLM.ChatAgent import ChatAgent
 
 class LiteratureReviewGenerator:
@@ -65,23 +66,10 @@ class LiteratureReviewGenerator:
             self.community_summary = {}
             self.layer_method_group_json = {}
     def get_paper_text(self, paper_infos):
-        papers_text = ''
-        for info in paper_infos:
-            try:
-                if info['summary'] != info['abstract'] and info['summary'] != '':
-                    papers_text += f"[{info['citation_key']}] {info['title']} ({info['year']})\nSummary: {info['summary']}\n\n"
-                else:
-                    papers_text += f"[{info['citation_key']}] {info['title']} ({info['year']})\nSummary: {info['abstract']}\n\n"
-
-            except:
-                try: 
-                    if info['summary'] != info['abstract'] and info['summary'] != '':
-                        papers_text += f"[{info['citation_key']}] {info['title']} ({info['published_date']})\nSummary: {info['summary']}\n\n"
-                except: papers_text += f"[{info['citation_key']}] {info['title']} ({info['published_date']})\nSummary: {info['abstract']}\n\n"
-        return papers_text
+        # summary -> abstract -> title per paper, within the token budget of the writing model
+        paper_text, _ = pack_paper_text(paper_infos, model=self.CHAT_AGENT_MODEL)
+        return paper_text
     def load_graph(self, json_path, node_info_path):
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
         with open(node_info_path, 'r', encoding='utf-8') as f:
             node_info = json.load(f)
         id2node_info = {}
@@ -91,13 +79,7 @@ class LiteratureReviewGenerator:
             info['citation_key'] = node['citation_key']
             info['year'] = info['published_date']
             id2node_info[node_id] = info
-        G = nx.DiGraph()
-        for node in data['nodes']:
-            node_id = node['id']
-            info = {**node, **id2node_info[node_id]}
-            G.add_node(node_id, **info)
-        for edge in data['edges']:
-            G.add_edge(edge['source'], edge['target'], **edge)
+        G = load_citation_graph(json_path, id2node_info)
         return G, id2node_info
     def parse_remove_think(self, summary):
         # Remove text between think tags
@@ -252,28 +234,25 @@ class LiteratureReviewGenerator:
             n_results (int): Number of results per query
             
         Returns:
-            List[Dict]: Combined search results
+            List[Dict]: Combined search results, ranked by reciprocal-rank fusion
         """
         all_results = []
-        seen_doc_ids = set()
-        for query in queries:
+        try:
+            # One batched embedding + one Chroma query for all queries, results fused by RRF (deduplicated)
+            results = self.summarizer.search_fused(queries, n_results)
+        except Exception as e:
+            print(f"Error retrieving papers for queries {queries}: {e}")
+            results = []
+        for result in results:
             try:
-                results = self.summarizer.search_similar_papers(query, n_results)
-                
-                # Filter out duplicates and add to results
-                for result in results:
-                    doc_id = result.get('doc_id', '')
-                    if doc_id not in seen_doc_ids:
-                        seen_doc_ids.add(doc_id)
-                        node_id = result.get('metadata').get('file_name').replace('.pdf', '')
-                        result['citation_key'] =  self.id2node_info[node_id].get('citation_key')
-                        result['title'] = self.id2node_info[node_id].get('title')
-                        result['summary'] = self.id2node_info[node_id].get('summary')
-                        result['year'] = self.id2node_info[node_id].get('published_date')
-                        all_results.append(result)
-
+                node_id = result.get('metadata').get('file_name').replace('.pdf', '')
+                result['citation_key'] =  self.id2node_info[node_id].get('citation_key')
+                result['title'] = self.id2node_info[node_id].get('title')
+                result['summary'] = self.id2node_info[node_id].get('summary')
+                result['year'] = self.id2node_info[node_id].get('published_date')
+                all_results.append(result)
             except Exception as e:
-                print(f"Error retrieving papers for query '{query}': {e}")
+                print(f"Error retrieving paper '{result.get('doc_id', '')}': {e}")
                 continue
         print(f'Collected {len(all_results)} additional papers - reduce to 15 there are too many')
         all_results = all_results[:15]
@@ -503,6 +482,8 @@ class LiteratureReviewGenerator:
         # Step 3: Get proofs text
         community_summary, development_direction, proof_papers, paper_summaries = self.get_proofs_text(proof_ids, get_nodes_info=True)
         # Step 4: Generate initial subsection content
+        # instructions first: identical for every subsection, so OpenAI serves it from its prompt cache
+        context_prompt = self.prompt_helper.WRITE_INITIAL_SUBSECTION_CONTEXT
         subsection_prompt = self.prompt_helper.generate_prompt(
             self.prompt_helper.WRITE_INITIAL_SUBSECTION_PROMPT,
             paras={
@@ -514,7 +495,7 @@ class LiteratureReviewGenerator:
             }
         )
         with open('writing_prompts.txt', "a") as f:
-            f.write(f"INITAL SUBSECTION PROMPT:\n {subsection_prompt}")
+            f.write(f"INITAL SUBSECTION PROMPT:\n {context_prompt}{subsection_prompt}")
 
         try:
             # response = self.model.generate_content(
@@ -524,7 +505,8 @@ class LiteratureReviewGenerator:
             #         temperature=0.4,
             #     )
             # )
-            response = self.chat_agent.chat(subsection_prompt, model = self.CHAT_AGENT_MODEL, temperature=0.4, provider='gpt')
+            response = self.chat_agent.chat(subsection_prompt, model = self.CHAT_AGENT_MODEL, temperature=0.4, provider='gpt',
+                                            cached_prefix=context_prompt)
             return self.parse_remove_think(response)
         except Exception as e:
             print(f"Error writing initial subsection: {e}")
@@ -534,18 +516,21 @@ class LiteratureReviewGenerator:
         """
         Evaluate the quality of a literature review subsection
         """
+        context_prompt = self.prompt_helper.generate_prompt(
+            self.prompt_helper.EVALUATE_SUBSECTION_CONTEXT,
+            paras={'OUTLINE': outline}
+        )
         evaluation_prompt = self.prompt_helper.generate_prompt(
             self.prompt_helper.EVALUATE_SUBSECTION_PROMPT,
             paras={
                 'PRE_SUBSECTION': pre_subsection,
                 'SUBSECTION_TITLE': subsection_title,
                 'SUBSECTION_FOCUS': subsection_focus,
-                'OUTLINE': outline,
                 'SUBSECTION_CONTENT': subsection_content
             }
         )
         with open('writing_prompts.txt', "a") as f:
-            f.write(f"EVALUATE SUBSECTION PROMPT:\n {evaluation_prompt}")
+            f.write(f"EVALUATE SUBSECTION PROMPT:\n {context_prompt}{evaluation_prompt}")
 
         try:
             # response = self.advanced_model.generate_content(
@@ -555,7 +540,8 @@ class LiteratureReviewGenerator:
             #         temperature=0.2,
             #     )
             # )
-            response = self.chat_agent.chat(evaluation_prompt, model=self.ADVANCED_CHAT_AGENT_MODEL, temperature=0.2, provider='gpt')
+            response = self.chat_agent.chat(evaluation_prompt, model=self.ADVANCED_CHAT_AGENT_MODEL, temperature=0.2, provider='gpt',
+                                            cached_prefix=context_prompt)
             # Clean up response text
             response_text = response.strip()
             
@@ -635,13 +621,16 @@ class LiteratureReviewGenerator:
         #         additional_info += f"Keywords: {', '.join(paper.get('keyword', []))}"
         #     additional_info += f"Citation Key: {paper.get('citation_key', '')}\n\n"
         additional_info = additional_papers
+        context_prompt = self.prompt_helper.generate_prompt(
+            self.prompt_helper.SUBSECTION_IMPROVE_CONTEXT,
+            paras={"OUTLINE": outline}
+        )
         improvement_prompt = self.prompt_helper.generate_prompt(
             self.prompt_helper.SUBSECTION_IMPROVE_PROMPT,
             paras={
                 "SUBSECTION_TITLE": subsection_title,
                 "SUBSECTION_FOCUS": subsection_focus,
                 "PRE_SUBSECTION": pre_subsection_content,
-                "OUTLINE": outline,
                 "CURRENT_CONTENT": current_content,
                 "OVERALL_SCORE": {evaluation_feedback.get('overall_score', 'N/A')},
                 "SYNTHESIS_SCORE": {evaluation_feedback.get('individual_scores', {}).get('synthesis_quality', 'N/A')},
@@ -654,7 +643,7 @@ class LiteratureReviewGenerator:
             }
         )
         with open('writing_prompts.txt', "a") as f:
-            f.write(f"SUBSECTION IMPROVEMENT PROMPT:\n {improvement_prompt}")
+            f.write(f"SUBSECTION IMPROVEMENT PROMPT:\n {context_prompt}{improvement_prompt}")
 
         try:
             # response = self.model.generate_content(
@@ -664,7 +653,8 @@ class LiteratureReviewGenerator:
             #         temperature=0.4,
             #     )
             # )
-            response = self.chat_agent.chat(improvement_prompt, model = self.CHAT_AGENT_MODEL, temperature=0.4, provider='gpt')
+            response = self.chat_agent.chat(improvement_prompt, model = self.CHAT_AGENT_MODEL, temperature=0.4, provider='gpt',
+                                            cached_prefix=context_prompt)
             return response
             
         except Exception as e: